@@ -16,6 +16,10 @@ from routes.audit_trails_routes import audit_trails_bp
 from routes.debitur_routes import debitur_bp
 from routes.division_routes import division_bp
 from routes.user_routes import user_bp
+from routes.job_routes import jobs_bp
+from config.config import init_db_pool, get_pool_stats
+from models.audit import get_audit_stats
+from utils.job_queue import get_job_queue, init_job_queue
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -102,6 +106,20 @@ app.register_blueprint(audit_trails_bp)
 app.register_blueprint(debitur_bp)
 app.register_blueprint(division_bp)
 app.register_blueprint(user_bp)
+app.register_blueprint(jobs_bp)
+
+# Database connection pool
+init_db_pool(app)
+
+# Worker job background (upload async); melanjutkan job yang tertunda
+init_job_queue()
+
+@app.route('/api/db-pool-stats', methods=['GET'])
+def db_pool_stats():
+    if session.get('role_access') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    return jsonify({'success': True, 'stats': get_pool_stats(), 'audit': get_audit_stats(),
+                    'jobs': get_job_queue().stats()})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,604 @@
+"""
+Benchmark throughput upload Excel: process_excel_file (+ BulkLoader) dan jalur /analyze-excel.
+
+Workbook sintetis dibuat sesuai schema template (jumlah baris/kolom, campuran tipe, offset header,
+baris kosong, nilai kotor). Jalur upload dijalankan penuh terhadap koneksi database palsu
+(FakeConnection) yang dipasang sebagai creator pool koneksi, sehingga tidak butuh SQL Server.
+Setiap run berjalan di proses terpisah (spawn) agar peak RSS per run akurat.
+
+Fase yang diukur (waktu eksklusif, fase bersarang tidak dihitung dua kali):
+    metadata          get_column_info / compile plan
+    read              iterasi baris openpyxl
+    header_detection  deteksi header, validasi header, pencarian baris awal data
+    validation        pembentukan chunk frame + validate_dataframe
+    insert            BulkLoader.begin/load (termasuk persiapan parameter)
+    commit            BulkLoader.commit (refresh statistik periode)
+    cache_build       build_sheet_cache di luar read/header (khusus analyze)
+    content_hash      hash sha256 file upload (khusus analyze)
+    sheet_list        pembacaan daftar sheet saat register_upload (khusus analyze)
+    other             sisa waktu end-to-end
+
+Contoh:
+    python benchmarks/upload_benchmark.py --rows 10000 50000 --columns 20 --output bench.json
+    python benchmarks/upload_benchmark.py --rows 50000 --compare bench.json --tolerance 0.15
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource  # Unix saja
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+TABLE_NAME = 'BENCH_UPLOAD'
+SHEET_NAME = 'Data'
+PATHS = ('upload', 'analyze')
+
+# Tipe kolom sintetis: (DATA_TYPE, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE, prefix nama)
+COLUMN_TYPES = {
+    'varchar': ('varchar', 50, None, None, 'name'),
+    'int': ('int', None, 10, 0, 'quantity'),
+    'decimal': ('decimal', None, 18, 2, 'amount'),
+    'date': ('date', None, None, None, 'date'),
+    'bit': ('bit', None, None, None, 'status'),
+}
+DEFAULT_TYPE_MIX = 'varchar=4,int=2,decimal=3,date=2,bit=1'
+DATE_TEXT_FORMAT = '%d/%m/%Y'
+DIRTY_VALUES = {
+    'varchar': [' N/A ', '', '   ', 'null', 'x' * 60],
+    'int': ['1,234', ' 42 ', '-', 'N/A', 'abc'],
+    'decimal': ['1,234.50', ' 3.14 ', '-', 'NULL', 'inf', '12a'],
+    'date': ['', 'N/A', '2024-13-45', '31-01-2024', '01/31/2024'],
+    'bit': ['yes', 'N', 'TRUE', '', 'maybe'],
+}
+
+
+# ----------------------------------------------------------------------
+# Database palsu
+# ----------------------------------------------------------------------
+class FakeDatabase:
+    """State bersama semua koneksi palsu: schema template dan penghitung statement/baris."""
+
+    def __init__(self, table_name, schema_rows, insert_latency_us=0):
+        self.table_name = table_name
+        self.schema_rows = schema_rows
+        self.modify_date = datetime(2024, 1, 1)
+        self.insert_latency = insert_latency_us / 1e6
+        self.statements = 0
+        self.executemany_calls = 0
+        self.rows_inserted = 0
+        self.rows_staged = 0
+        self._staged = {}
+
+    def execute(self, cursor, sql, params):
+        self.statements += 1
+        text = ' '.join(sql.split())
+        upper = text.upper()
+        cursor.rowcount = -1
+
+        if 'INFORMATION_SCHEMA.COLUMNS' in upper:
+            return list(self.schema_rows) if params and str(params[0]).lower() == self.table_name.lower() else []
+        if 'FROM SYS.TABLES' in upper:
+            if params:
+                return [(self.modify_date,)] if str(params[0]).lower() == self.table_name.lower() else []
+            return [(self.table_name, self.modify_date)]
+        staging = re.search(r'INTO (#\w+) FROM', text)
+        if staging:
+            self._staged[staging.group(1)] = 0
+            return []
+        moved = re.match(r'INSERT INTO \S+ \(.*\) SELECT .* FROM (#\w+)', text)
+        if moved:
+            cursor.rowcount = self._staged.pop(moved.group(1), 0)
+            self.rows_inserted += cursor.rowcount
+            return []
+        if upper.startswith('INSERT INTO') and ' VALUES ' in upper:
+            cursor.rowcount = 1
+            self.rows_inserted += 1
+            return []
+        if 'COUNT(' in upper:
+            return [(0,)]
+        if upper == 'SELECT 1':
+            return [(1,)]
+        if upper.startswith('DELETE'):
+            cursor.rowcount = 0
+        return []
+
+    def executemany(self, cursor, sql, seq_of_params):
+        self.executemany_calls += 1
+        n = len(seq_of_params)
+        if self.insert_latency:
+            time.sleep(n * self.insert_latency)
+        target = re.match(r'\s*INSERT INTO (\S+)', sql)
+        if target and target.group(1).startswith('#'):
+            self._staged[target.group(1)] = self._staged.get(target.group(1), 0) + n
+            self.rows_staged += n
+        else:
+            self.rows_inserted += n
+        cursor.rowcount = n
+
+    def stats(self):
+        return {
+            'statements': self.statements,
+            'executemany_calls': self.executemany_calls,
+            'rows_inserted': self.rows_inserted,
+            'rows_staged': self.rows_staged,
+        }
+
+
+class FakeCursor:
+    """Cursor pyodbc minimal: execute/executemany/fetch*, fast_executemany, setinputsizes."""
+
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = -1
+        self.fast_executemany = False
+        self._rows = []
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (tuple, list)):
+            params = tuple(params[0])
+        self._rows = self.db.execute(self, sql, params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self.db.executemany(self, sql, seq_of_params)
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        self._rows = []
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self.autocommit = False
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def install_fake_database(db):
+    """Ganti pool koneksi aplikasi dengan pool yang membuat FakeConnection."""
+    import config.config as db_config
+    from config.db_pool import ConnectionPool
+
+    db_config._pool = ConnectionPool(lambda: FakeConnection(db), min_size=0, max_size=8, pre_ping=False)
+
+
+# ----------------------------------------------------------------------
+# Workbook sintetis
+# ----------------------------------------------------------------------
+def parse_type_mix(spec):
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip().lower()
+        if name not in COLUMN_TYPES:
+            raise ValueError(f"Tipe kolom tidak dikenal: '{name}' (pilihan: {', '.join(COLUMN_TYPES)})")
+        mix.extend([name] * int(weight or 1))
+    return mix
+
+def build_columns(column_count, type_mix):
+    """Kolom data template: kolom pertama primary (id_number), sisanya mengikuti pola type_mix."""
+    mix = parse_type_mix(type_mix)
+    columns = [('id_number', 'varchar')]
+    for i in range(1, column_count):
+        kind = mix[(i - 1) % len(mix)]
+        columns.append((f"{COLUMN_TYPES[kind][4]}_{i:02d}", kind))
+    return columns
+
+def build_schema_rows(columns):
+    """Baris INFORMATION_SCHEMA.COLUMNS (urut ORDINAL_POSITION) untuk FakeDatabase."""
+    rows = [('id', 'int', None, 10, 0, 'NO', None)]
+    for i, (name, kind) in enumerate(columns):
+        data_type, max_length, precision, scale, _ = COLUMN_TYPES[kind]
+        # Sebagian kolom punya DEFAULT agar jalur mask default ikut terukur
+        default = '((0))' if kind in ('int', 'bit') and i % 3 == 0 else None
+        rows.append((name, data_type, max_length, precision, scale, 'YES', default))
+    rows.append(('period_date', 'date', None, None, None, 'YES', None))
+    rows.append(('upload_date', 'datetime', None, None, None, 'YES', '(getdate())'))
+    return rows
+
+def _clean_value(kind, row, rng, date_style):
+    if kind == 'varchar':
+        return f"Debitur {row} {rng.choice('ABCDEFGH')}"
+    if kind == 'int':
+        return rng.randint(0, 1_000_000)
+    if kind == 'decimal':
+        return round(rng.uniform(0, 1e9), 2)
+    if kind == 'date':
+        value = datetime(2015, 1, 1) + timedelta(days=rng.randint(0, 3650))
+        return value.strftime(DATE_TEXT_FORMAT) if date_style == 'text' else value
+    return rng.choice((0, 1))
+
+def generate_workbook(path, columns, rows, header_offset=3, blank_every=0, dirty_ratio=0.01,
+                      date_style='text', seed=42):
+    """Tulis workbook .xlsx (openpyxl write_only) dengan judul di atas header dan data sintetis."""
+    import openpyxl
+
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
+    for i in range(header_offset):
+        ws.append([f'LAPORAN BENCHMARK {TABLE_NAME}' if i == 0 else None])
+    ws.append([name.replace('_', ' ').upper() for name, _ in columns])
+
+    for row in range(rows):
+        if blank_every and row and row % blank_every == 0:
+            ws.append([None] * len(columns))
+        values = [f"ID{row:09d}"]
+        for _, kind in columns[1:]:
+            if dirty_ratio and rng.random() < dirty_ratio:
+                values.append(rng.choice(DIRTY_VALUES[kind]))
+            else:
+                values.append(_clean_value(kind, row, rng, date_style))
+        ws.append(values)
+    wb.save(path)
+
+
+# ----------------------------------------------------------------------
+# Instrumentasi fase
+# ----------------------------------------------------------------------
+class PhaseTimer:
+    """Akumulasi waktu eksklusif per fase; fase bersarang menjeda fase luar."""
+
+    def __init__(self):
+        self.totals = {}
+        self._stack = []
+
+    def _switch(self, now):
+        if self._stack:
+            phase, since = self._stack[-1]
+            self.totals[phase] = self.totals.get(phase, 0.0) + (now - since)
+
+    def enter(self, phase):
+        now = time.perf_counter()
+        self._switch(now)
+        self._stack.append((phase, now))
+
+    def exit(self):
+        now = time.perf_counter()
+        self._switch(now)
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1] = (self._stack[-1][0], now)
+
+    def wrap(self, phase, func):
+        def timed(*args, **kwargs):
+            self.enter(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.exit()
+        timed.__wrapped__ = func
+        return timed
+
+    def wrap_iter(self, rows_iter):
+        while True:
+            self.enter('read')
+            try:
+                row = next(rows_iter)
+            except StopIteration:
+                return
+            finally:
+                self.exit()
+            yield row
+
+    def snapshot(self, total):
+        phases = {name: round(seconds, 4) for name, seconds in sorted(self.totals.items())}
+        phases['other'] = round(max(0.0, total - sum(self.totals.values())), 4)
+        return phases
+
+
+def instrument(timer):
+    """Pasang wrapper timing pada fungsi-fungsi jalur upload dan analyze."""
+    import utils.excel_utils as excel_utils
+    import utils.upload_session as upload_session
+    from utils.bulk_insert import BulkLoader
+
+    def streamed(open_stream):
+        return lambda *args, **kwargs: timer.wrap_iter(open_stream(*args, **kwargs))
+
+    for module in (excel_utils, upload_session):
+        module.open_sheet_stream = streamed(module.open_sheet_stream)
+    for name in ('detect_header_row', 'validate_header_row', 'locate_data_start'):
+        setattr(excel_utils, name, timer.wrap('header_detection', getattr(excel_utils, name)))
+    for name in ('find_primary_header_row', 'locate_data_start'):
+        setattr(upload_session, name, timer.wrap('header_detection', getattr(upload_session, name)))
+    for name in ('get_column_info', 'get_table_plan', 'compile_table_plan'):
+        setattr(excel_utils, name, timer.wrap('metadata', getattr(excel_utils, name)))
+    for name in ('_build_chunk_frame', 'validate_dataframe'):
+        setattr(excel_utils, name, timer.wrap('validation', getattr(excel_utils, name)))
+    upload_session.build_sheet_cache = timer.wrap('cache_build', upload_session.build_sheet_cache)
+    upload_session.get_excel_sheets = timer.wrap('sheet_list', upload_session.get_excel_sheets)
+    upload_session._content_hash = timer.wrap('content_hash', upload_session._content_hash)
+    BulkLoader.begin = timer.wrap('insert', BulkLoader.begin)
+    BulkLoader.load = timer.wrap('insert', BulkLoader.load)
+    BulkLoader.commit = timer.wrap('commit', BulkLoader.commit)
+
+
+# ----------------------------------------------------------------------
+# Run per proses
+# ----------------------------------------------------------------------
+def _peak_working_set_windows():
+    """PeakWorkingSetSize proses ini (byte) lewat GetProcessMemoryInfo; None bila gagal."""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    try:
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not get_info(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    except Exception:
+        return None
+
+def _peak_rss_mb():
+    """Peak RSS proses ini dalam MB; None bila tidak tersedia di platform ini."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux: KiB, macOS: byte
+        return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+    if sys.platform == 'win32':
+        peak = _peak_working_set_windows()
+        return round(peak / (1024 * 1024), 1) if peak is not None else None
+    return None
+
+def _summarize_result(result):
+    keys = ('success', 'message', 'inserted_rows', 'rows_processed', 'validation_warnings',
+            'insert_mode', 'insert_seconds', 'rows_per_sec', 'total_errors')
+    return {key: result[key] for key in keys if key in result}
+
+def run_path(path, file_path, schema_rows, rows, insert_latency_us=0, periode_date='2024-01-01'):
+    """
+    Jalankan satu jalur di proses ini (dipanggil di child process).
+    path='upload': process_excel_file langsung dari file (upload tanpa analyze).
+    path='analyze': register_upload + sheet().analysis() (/analyze-excel), lalu process_excel_file
+    memakai sheet cache hasil analyze (alur UI: analyze kemudian upload).
+    """
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    db = FakeDatabase(TABLE_NAME, schema_rows, insert_latency_us)
+    install_fake_database(db)
+
+    timer = PhaseTimer()
+    instrument(timer)
+    from utils.excel_utils import process_excel_file
+    from utils.upload_session import register_upload
+
+    report = {'path': path}
+    rss_start = _peak_rss_mb()
+
+    if path == 'analyze':
+        from werkzeug.datastructures import FileStorage
+
+        upload_dir = tempfile.mkdtemp(prefix='ssot_bench_upload_')
+        try:
+            started = time.perf_counter()
+            with open(file_path, 'rb') as stream:
+                upload_session = register_upload(
+                    FileStorage(stream=stream, filename=os.path.basename(file_path)), upload_dir
+                )
+            sheet_cache = upload_session.sheet(SHEET_NAME)
+            analysis = sheet_cache.analysis() if sheet_cache.layout else {'error': sheet_cache.layout_error}
+            analyze_seconds = time.perf_counter() - started
+            report['analyze'] = {
+                'seconds': round(analyze_seconds, 4),
+                'phases': timer.snapshot(analyze_seconds),
+                'total_rows': analysis.get('total_rows'),
+                'header_row': analysis.get('header_row'),
+                'data_start_row': analysis.get('data_start_row'),
+                'columnar_cache': sheet_cache.columns is not None,
+            }
+
+            timer.totals.clear()
+            started = time.perf_counter()
+            result = process_excel_file(upload_session.file_path, TABLE_NAME, sheet_name=SHEET_NAME,
+                                        periode_date=periode_date, sheet_cache=sheet_cache)
+            upload_seconds = time.perf_counter() - started
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+    else:
+        started = time.perf_counter()
+        result = process_excel_file(file_path, TABLE_NAME, sheet_name=SHEET_NAME, periode_date=periode_date)
+        upload_seconds = time.perf_counter() - started
+
+    report['upload'] = {
+        'seconds': round(upload_seconds, 4),
+        'phases': timer.snapshot(upload_seconds),
+        'rows_per_sec': round(rows / upload_seconds, 1) if upload_seconds > 0 else None,
+        'result': _summarize_result(result),
+    }
+    report['fake_db'] = db.stats()
+    report['peak_rss_mb'] = _peak_rss_mb()
+    report['rss_at_start_mb'] = rss_start
+    return report
+
+
+def _run_isolated(*args, **kwargs):
+    """Satu run di proses spawn baru (peak RSS tidak tercampur run lain)."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_path, *args, **kwargs).result()
+
+def _median_run(runs):
+    """Run dengan waktu upload median; min/median/max dicatat untuk semua repeat."""
+    ordered = sorted(runs, key=lambda r: r['upload']['seconds'])
+    chosen = dict(ordered[len(ordered) // 2])
+    seconds = [r['upload']['seconds'] for r in runs]
+    chosen['repeats'] = {
+        'count': len(runs),
+        'upload_seconds_min': min(seconds),
+        'upload_seconds_median': round(statistics.median(seconds), 4),
+        'upload_seconds_max': max(seconds),
+        'peak_rss_mb_max': max((r['peak_rss_mb'] for r in runs if r['peak_rss_mb'] is not None), default=None),
+    }
+    return chosen
+
+
+# ----------------------------------------------------------------------
+# Perbandingan regresi
+# ----------------------------------------------------------------------
+def _scenario_key(scenario):
+    return f"{scenario['path']}:{scenario['rows']}x{scenario['columns']}"
+
+def compare_results(current, baseline, tolerance):
+    """Bandingkan dengan hasil sebelumnya; Returns list pesan regresi (kosong bila aman)."""
+    previous = {_scenario_key(s): s for s in baseline.get('scenarios', [])}
+    regressions = []
+    for scenario in current['scenarios']:
+        key = _scenario_key(scenario)
+        old = previous.get(key)
+        if old is None:
+            print(f"  {key:<28} (tidak ada di baseline)")
+            continue
+        checks = [('upload.seconds', old['upload']['seconds'], scenario['upload']['seconds'])]
+        if old.get('peak_rss_mb') is not None and scenario['peak_rss_mb'] is not None:
+            checks.append(('peak_rss_mb', old['peak_rss_mb'], scenario['peak_rss_mb']))
+        if 'analyze' in scenario and 'analyze' in old:
+            checks.append(('analyze.seconds', old['analyze']['seconds'], scenario['analyze']['seconds']))
+        for metric, before, after in checks:
+            change = (after - before) / before if before else 0.0
+            flag = 'REGRESI' if change > tolerance else ''
+            print(f"  {key:<28} {metric:<16} {before:>10.3f} -> {after:>10.3f} ({change:+.1%}) {flag}")
+            if flag:
+                regressions.append(f"{key} {metric} {change:+.1%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark upload Excel terhadap database palsu')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000], help='jumlah baris data per skenario')
+    parser.add_argument('--columns', type=int, default=20, help='jumlah kolom data (termasuk kolom primary)')
+    parser.add_argument('--type-mix', default=DEFAULT_TYPE_MIX, help=f'bobot tipe kolom, default {DEFAULT_TYPE_MIX}')
+    parser.add_argument('--header-offset', type=int, default=3, help='jumlah baris judul di atas header')
+    parser.add_argument('--blank-every', type=int, default=500, help='sisipkan baris kosong setiap N baris (0 = tidak)')
+    parser.add_argument('--dirty-ratio', type=float, default=0.01, help='porsi sel berisi nilai kotor')
+    parser.add_argument('--date-style', choices=('text', 'native'), default='text', help='tanggal sebagai teks atau sel tanggal')
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=list(PATHS), help='jalur yang diukur')
+    parser.add_argument('--repeat', type=int, default=1, help='jumlah run per skenario (diambil median)')
+    parser.add_argument('--insert-latency-us', type=float, default=0, help='simulasi latensi driver per baris (mikrodetik)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='tulis hasil JSON ke file ini')
+    parser.add_argument('--compare', help='file JSON hasil sebelumnya untuk deteksi regresi')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='batas perlambatan relatif sebelum dianggap regresi')
+    parser.add_argument('--keep-files', action='store_true', help='jangan hapus workbook sintetis')
+    args = parser.parse_args(argv)
+
+    import numpy
+    import openpyxl
+    import pandas
+
+    columns = build_columns(args.columns, args.type_mix)
+    schema_rows = build_schema_rows(columns)
+    workdir = tempfile.mkdtemp(prefix='ssot_bench_')
+    results = {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pandas': pandas.__version__,
+            'numpy': numpy.__version__,
+            'openpyxl': openpyxl.__version__,
+        },
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'scenarios': [],
+    }
+
+    try:
+        for rows in args.rows:
+            file_path = os.path.join(workdir, f'bench_{rows}x{args.columns}.xlsx')
+            started = time.perf_counter()
+            generate_workbook(file_path, columns, rows, args.header_offset, args.blank_every,
+                              args.dirty_ratio, args.date_style, args.seed)
+            print(f"Workbook {rows} baris x {args.columns} kolom dibuat "
+                  f"({os.path.getsize(file_path) / 1e6:.1f} MB, {time.perf_counter() - started:.1f} detik)")
+
+            for path in args.paths:
+                runs = [_run_isolated(path, file_path, schema_rows, rows, args.insert_latency_us)
+                        for _ in range(max(1, args.repeat))]
+                scenario = _median_run(runs)
+                scenario.update({'rows': rows, 'columns': args.columns,
+                                 'file_size_bytes': os.path.getsize(file_path)})
+                results['scenarios'].append(scenario)
+
+                upload = scenario['upload']
+                line = (f"  {path:<8} upload {upload['seconds']:.2f} detik, {upload['rows_per_sec']} baris/detik, "
+                        f"peak RSS {scenario['peak_rss_mb'] if scenario['peak_rss_mb'] is not None else 'n/a'} MB")
+                if 'analyze' in scenario:
+                    line += f", analyze {scenario['analyze']['seconds']:.2f} detik"
+                print(line)
+                print('           fase: ' + ', '.join(f"{k}={v:.3f}" for k, v in upload['phases'].items()))
+                if not upload['result'].get('success'):
+                    print(f"           upload gagal: {upload['result'].get('message')}")
+    finally:
+        if args.keep_files:
+            print(f"Workbook disimpan di {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"Hasil ditulis ke {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"Perbandingan dengan {args.compare} (toleransi {args.tolerance:.0%}):")
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regresi: " + '; '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,22 @@
 import os
-import pyodbc
+import atexit
+import logging
+import threading
 
+import pyodbc
 from dotenv import load_dotenv
+from flask import g, has_app_context
+
+from config.db_pool import ConnectionPool, pool_settings_from_env
 
 load_dotenv()
 
-def get_db_connection():
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _create_raw_connection():
     return pyodbc.connect(
         driver='{ODBC Driver 17 for SQL Server}',  # Use the correct driver
         server=os.getenv("DB_HOST"),
@@ -13,4 +24,57 @@ def get_db_connection():
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         port=os.getenv("DB_PORT")
-    )
\ No newline at end of file
+    )
+
+def get_db_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_create_raw_connection, **pool_settings_from_env())
+                atexit.register(_pool.dispose)
+    return _pool
+
+def get_db_connection():
+    """
+    Checkout koneksi dari pool. Pemanggil tetap memanggil conn.close()
+    seperti biasa; koneksi akan dikembalikan ke pool, bukan ditutup.
+    Jika dipanggil di dalam app context, koneksi juga dicatat di flask.g
+    sehingga koneksi yang lupa ditutup tetap dikembalikan saat teardown.
+    """
+    conn = get_db_pool().connect()
+    if has_app_context():
+        g.setdefault('_db_leases', []).append(conn)
+    return conn
+
+def get_request_connection():
+    """
+    Satu koneksi bersama untuk seluruh request (per app context).
+    Jangan panggil close() pada koneksi ini; koneksi dikembalikan otomatis saat teardown.
+    """
+    if not has_app_context():
+        return get_db_connection()
+    conn = g.get('_db_request_conn')
+    if conn is None or conn.closed:
+        conn = get_db_pool().connect()
+        g._db_request_conn = conn
+    return conn
+
+def _release_request_connections(exc=None):
+    conn = g.pop('_db_request_conn', None)
+    if conn is not None:
+        conn.close()
+
+    leaked = [c for c in g.pop('_db_leases', []) if not c.closed]
+    if leaked:
+        logger.warning(f"{len(leaked)} koneksi database belum ditutup di akhir request, dikembalikan ke pool")
+    for c in leaked:
+        c.close()
+
+def get_pool_stats():
+    return get_db_pool().stats()
+
+def init_db_pool(app):
+    """Daftarkan teardown per-request dan panaskan pool sampai DB_POOL_MIN_SIZE."""
+    app.teardown_appcontext(_release_request_connections)
+    get_db_pool().warm_up()
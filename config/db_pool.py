@@ -0,0 +1,294 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Dilempar ketika tidak ada koneksi yang tersedia dalam batas waktu checkout."""
+
+
+class PooledConnection:
+    """
+    Proxy tipis di atas koneksi pyodbc.
+    close() tidak menutup koneksi fisik, melainkan mengembalikannya ke pool,
+    sehingga kode lama (conn.close() di blok finally) tetap berjalan tanpa perubahan.
+    """
+
+    def __init__(self, pool, raw):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_released', False)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    @property
+    def closed(self):
+        return self._released
+
+    def close(self):
+        if self._released:
+            return
+        object.__setattr__(self, '_released', True)
+        self._pool.release(self._raw)
+
+    def invalidate(self):
+        """Buang koneksi fisik (misal setelah error koneksi) alih-alih mengembalikannya ke pool."""
+        if self._released:
+            return
+        object.__setattr__(self, '_released', True)
+        self._pool.discard(self._raw)
+
+    def __getattr__(self, name):
+        if self._released:
+            raise RuntimeError("Koneksi sudah dikembalikan ke pool")
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        if self._released:
+            raise RuntimeError("Koneksi sudah dikembalikan ke pool")
+        setattr(self._raw, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool koneksi thread-safe dengan:
+    - min_size koneksi yang dijaga tetap hangat
+    - max_size sebagai batas atas koneksi fisik
+    - idle eviction untuk koneksi yang terlalu lama menganggur
+    - pre-ping (SELECT 1) sebelum koneksi idle diserahkan ke pemanggil
+    - metrik checkout, wait, create, failure
+    """
+
+    def __init__(self, creator, min_size=1, max_size=10, idle_timeout=300,
+                 checkout_timeout=30, pre_ping=True, pre_ping_interval=30):
+        if max_size < 1:
+            raise ValueError("max_size minimal 1")
+        self._creator = creator
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.pre_ping = pre_ping
+        self.pre_ping_interval = pre_ping_interval
+
+        self._idle = deque()  # (raw_connection, last_used_monotonic)
+        self._size = 0        # jumlah koneksi fisik (idle + checked out)
+        self._cond = threading.Condition()
+        self._metrics = {
+            'checkouts': 0,
+            'checkins': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'timeouts': 0,
+            'creates': 0,
+            'create_failures': 0,
+            'ping_failures': 0,
+            'evictions': 0,
+            'discards': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+    def connect(self):
+        raw = self._acquire()
+        return PooledConnection(self, raw)
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+        wait_started = None
+
+        while True:
+            with self._cond:
+                self._evict_idle_locked()
+
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    candidate = (raw, last_used)
+                elif self._size < self.max_size:
+                    self._size += 1
+                    candidate = None
+                else:
+                    if not waited:
+                        waited = True
+                        wait_started = time.monotonic()
+                        self._metrics['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics['timeouts'] += 1
+                        self._metrics['wait_time_total'] += time.monotonic() - wait_started
+                        raise PoolTimeoutError(
+                            f"Tidak ada koneksi database tersedia setelah {self.checkout_timeout} detik "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            # Operasi jaringan dilakukan di luar lock
+            if candidate is None:
+                raw = self._create()
+            else:
+                raw, last_used = candidate
+                if not self._is_alive(raw, last_used):
+                    self._close_raw(raw)
+                    with self._cond:
+                        self._size -= 1
+                        self._metrics['ping_failures'] += 1
+                        self._cond.notify()
+                    continue
+
+            with self._cond:
+                self._metrics['checkouts'] += 1
+                if waited:
+                    self._metrics['wait_time_total'] += time.monotonic() - wait_started
+            return raw
+
+    def _create(self):
+        try:
+            raw = self._creator()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._metrics['create_failures'] += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._metrics['creates'] += 1
+        return raw
+
+    def _is_alive(self, raw, last_used):
+        if not self.pre_ping:
+            return True
+        if time.monotonic() - last_used < self.pre_ping_interval:
+            return True
+        cursor = None
+        try:
+            cursor = raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except Exception as e:
+            logger.warning(f"Pre-ping koneksi database gagal, koneksi dibuang: {e}")
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def release(self, raw):
+        """Kembalikan koneksi ke pool. Transaksi yang belum di-commit akan di-rollback."""
+        try:
+            raw.rollback()
+            if raw.autocommit:
+                raw.autocommit = False
+        except Exception as e:
+            logger.warning(f"Reset koneksi gagal, koneksi dibuang: {e}")
+            self.discard(raw)
+            return
+
+        with self._cond:
+            self._metrics['checkins'] += 1
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, raw):
+        self._close_raw(raw)
+        with self._cond:
+            self._size -= 1
+            self._metrics['discards'] += 1
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+    def _evict_idle_locked(self):
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        # Koneksi paling lama menganggur ada di sisi kiri deque
+        while self._idle and self._size > self.min_size:
+            raw, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._metrics['evictions'] += 1
+            self._close_raw(raw)
+
+    def warm_up(self):
+        """Buka koneksi sampai min_size agar request pertama tidak membayar biaya connect."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw = self._create()
+            except Exception as e:
+                logger.warning(f"Warm up pool database gagal: {e}")
+                return
+            with self._cond:
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+
+    def dispose(self):
+        """Tutup semua koneksi idle (dipanggil saat shutdown)."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for raw, _ in idle:
+            self._close_raw(raw)
+
+    @staticmethod
+    def _close_raw(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._metrics)
+            data.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        data['wait_time_total'] = round(data['wait_time_total'], 4)
+        return data
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def pool_settings_from_env():
+    return {
+        'min_size': _env_int('DB_POOL_MIN_SIZE', 1),
+        'max_size': _env_int('DB_POOL_MAX_SIZE', 10),
+        'idle_timeout': _env_int('DB_POOL_IDLE_TIMEOUT', 300),
+        'checkout_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pre_ping': os.getenv('DB_POOL_PRE_PING', '1').lower() not in ('0', 'false', 'no'),
+        'pre_ping_interval': _env_int('DB_POOL_PRE_PING_INTERVAL', 30),
+    }
@@ -1,23 +1,58 @@
+import os
+import json
+import queue
+import atexit
 import logging
-from config.config import get_db_connection
-from flask import session, request
+import threading
+import time
+from datetime import datetime
+from config.config import get_db_connection, get_db_pool
+from utils.audit_rollup import apply_audit_rollup, prepare_audit_rollup
+from flask import session, request, has_request_context
 
 logger = logging.getLogger(__name__)
 
-def insert_audit_trail(action, deskripsi=None):
+AUDIT_ASYNC = os.getenv('AUDIT_ASYNC', 'true').lower() not in ('0', 'false', 'no')
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 200))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv('AUDIT_FLUSH_INTERVAL_MS', 500))
+AUDIT_QUEUE_MAX = int(os.getenv('AUDIT_QUEUE_MAX', 10000))
+AUDIT_SPILL_FILE = os.getenv('AUDIT_SPILL_FILE', os.path.join('logs', 'audit_spill.jsonl'))
+AUDIT_SHUTDOWN_TIMEOUT = float(os.getenv('AUDIT_SHUTDOWN_TIMEOUT', 10))
+
+# SQL Server: maks 2100 parameter per statement -> 5 kolom x 400 baris
+_MAX_ROWS_PER_STATEMENT = 400
+_AUDIT_COLUMNS = ('changed_at', 'changed_by', 'action', 'deskripsi', 'ip_address')
+# Jeda sebelum mencoba replay spill file lagi setelah DB gagal (detik)
+_SPILL_RETRY_INTERVAL = 30
+
+
+def _write_audit_rows(events):
+    """
+    Multi-row INSERT ke SSOT_AUDIT_TRAILS dalam satu transaksi, sekaligus increment
+    rollup harian (SSOT_AUDIT_DAILY_ROLLUP) untuk dashboard analytics.
+    """
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        username = session.get('username', 'anonymous')
-        ip_address = request.remote_addr if request else None
-        query = '''
-            INSERT INTO SSOT_AUDIT_TRAILS (changed_by, action, deskripsi, ip_address)
-            VALUES (?, ?, ?, ?)
-        '''
-        cursor.execute(query, (username, action, deskripsi, ip_address))
+        prepare_audit_rollup(cursor)
+        for start in range(0, len(events), _MAX_ROWS_PER_STATEMENT):
+            chunk = events[start:start + _MAX_ROWS_PER_STATEMENT]
+            placeholders = ', '.join(['(?, ?, ?, ?, ?)'] * len(chunk))
+            params = [event[col] for event in chunk for col in _AUDIT_COLUMNS]
+            cursor.execute(
+                f"INSERT INTO SSOT_AUDIT_TRAILS ({', '.join(_AUDIT_COLUMNS)}) VALUES {placeholders}",
+                params
+            )
+        apply_audit_rollup(cursor, events)
         conn.commit()
-    except Exception as e:
-        logger.warning(f"Gagal insert audit trail: {e}")
+    except Exception:
+        try:
+            conn.rollback()
+        except:
+            pass
+        raise
     finally:
         try:
             cursor.close()
@@ -27,3 +62,221 @@ def insert_audit_trail(action, deskripsi=None):
             conn.close()
         except:
             pass
+
+
+class AuditTrailWriter:
+    """
+    Sink audit trail asinkron: event masuk queue (ukuran terbatas) dan ditulis worker thread
+    secara batch setiap flush_interval atau setiap batch_size event.
+    Bila queue penuh atau DB tidak bisa diakses, event ditulis ke spill file (JSON lines)
+    dan di-replay ke DB ketika koneksi kembali normal.
+    """
+
+    def __init__(self, batch_size=AUDIT_BATCH_SIZE, flush_interval_ms=AUDIT_FLUSH_INTERVAL_MS,
+                 max_queue=AUDIT_QUEUE_MAX, spill_path=AUDIT_SPILL_FILE):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(10, flush_interval_ms) / 1000.0
+        self.spill_path = spill_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._last_db_failure = 0.0
+        self._stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'spilled': 0, 'replayed': 0, 'write_failures': 0}
+
+    def start(self):
+        # Pool dibuat lebih dulu agar atexit (LIFO) menjalankan shutdown writer sebelum pool di-dispose
+        get_db_pool()
+        self._thread = threading.Thread(target=self._run, name='audit-trail-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+        return self
+
+    def enqueue(self, event):
+        self._stats['enqueued'] += 1
+        if self._stop.is_set():
+            self._spill([event])
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            logger.warning("Queue audit trail penuh, event ditulis ke spill file")
+            self._spill([event])
+
+    def shutdown(self, timeout=AUDIT_SHUTDOWN_TIMEOUT):
+        """Hentikan worker dan flush sisa event (ke DB, atau ke spill file bila gagal)."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        leftover = self._drain(block=False)
+        if leftover:
+            self._spill(leftover)
+
+    def stats(self):
+        return dict(self._stats, queued=self._queue.qsize())
+
+    def _run(self):
+        self._replay_spill()
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+            elif os.path.exists(self.spill_path):
+                self._replay_spill()
+        # Shutdown: tulis semua event yang masih tersisa
+        while True:
+            batch = self._drain(block=False, limit=self.batch_size)
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _collect_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self, block=False, limit=None):
+        items = []
+        while limit is None or len(items) < limit:
+            try:
+                items.append(self._queue.get(block=block))
+            except queue.Empty:
+                break
+        return items
+
+    def _flush(self, batch):
+        try:
+            _write_audit_rows(batch)
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._last_db_failure = 0.0
+        except Exception as e:
+            self._stats['write_failures'] += 1
+            self._last_db_failure = time.monotonic()
+            logger.warning(f"Gagal insert audit trail ({len(batch)} event), ditulis ke spill file: {e}")
+            self._spill(batch)
+            return
+        if os.path.exists(self.spill_path):
+            self._replay_spill()
+
+    def _spill(self, events):
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+                with open(self.spill_path, 'a', encoding='utf-8') as f:
+                    for event in events:
+                        record = dict(event, changed_at=event['changed_at'].isoformat())
+                        f.write(json.dumps(record, default=str) + '\n')
+            self._stats['spilled'] += len(events)
+        except Exception as e:
+            logger.error(f"Gagal menulis spill file audit trail, {len(events)} event hilang: {e}")
+
+    def _replay_spill(self):
+        """
+        Kirim ulang event dari spill file ke DB. Setelah setiap batch berhasil, file .replay
+        ditulis ulang hanya dengan event yang belum terkirim, sehingga proses yang mati di tengah
+        replay tidak mengirim ulang batch yang sudah masuk. Sisa yang gagal tetap di file .replay
+        dan diproses lebih dulu pada replay berikutnya.
+        """
+        if self._last_db_failure and time.monotonic() - self._last_db_failure < _SPILL_RETRY_INTERVAL:
+            return
+        replay_path = self.spill_path + '.replay'
+        with self._spill_lock:
+            # File .replay yang tertinggal (proses berhenti saat replay) diproses lebih dulu
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        events = []
+        lines = []
+        with open(replay_path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    record['changed_at'] = datetime.fromisoformat(record['changed_at'])
+                    events.append(record)
+                    lines.append(line)
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Baris spill audit trail tidak valid dilewati: {e}")
+
+        sent = 0
+        try:
+            for start in range(0, len(events), self.batch_size):
+                _write_audit_rows(events[start:start + self.batch_size])
+                sent = min(start + self.batch_size, len(events))
+                self._stats['replayed'] += sent - start
+                if sent < len(events):
+                    _rewrite_lines(replay_path, lines[sent:])
+        except Exception as e:
+            self._last_db_failure = time.monotonic()
+            logger.warning(f"Replay spill audit trail gagal, {len(events) - sent} event menunggu replay berikutnya: {e}")
+            return
+
+        logger.info(f"Replay spill audit trail selesai: {sent} event")
+        try:
+            os.remove(replay_path)
+        except OSError:
+            pass
+
+
+def _rewrite_lines(path, lines):
+    """Tulis ulang file JSON lines secara atomic (file sementara lalu os.replace)."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+    os.replace(tmp_path, path)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_audit_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditTrailWriter().start()
+    return _writer
+
+def get_audit_stats():
+    return _writer.stats() if _writer is not None else None
+
+def insert_audit_trail(action, deskripsi=None, username=None, ip_address=None):
+    """
+    Catat audit trail. Username, IP, dan waktu diambil saat pemanggilan (di thread request);
+    penulisan ke database dilakukan asinkron secara batch oleh AuditTrailWriter.
+    Set AUDIT_ASYNC=false untuk kembali ke insert sinkron per event.
+    """
+    try:
+        if username is None:
+            username = session.get('username', 'anonymous') if has_request_context() else 'anonymous'
+        if ip_address is None and has_request_context():
+            ip_address = request.remote_addr
+        event = {
+            'changed_at': datetime.now(),
+            'changed_by': username,
+            'action': action,
+            'deskripsi': deskripsi,
+            'ip_address': ip_address,
+        }
+        if AUDIT_ASYNC:
+            get_audit_writer().enqueue(event)
+        else:
+            _write_audit_rows([event])
+    except Exception as e:
+        logger.warning(f"Gagal insert audit trail: {e}")
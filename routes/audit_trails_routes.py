@@ -1,4 +1,5 @@
 from io import BytesIO
+from datetime import date, timedelta
 from flask import Blueprint, render_template, request, jsonify, send_file, session, redirect, url_for
 import logging
 
@@ -6,6 +7,7 @@ import openpyxl
 
 from models.audit import insert_audit_trail
 from config.config import get_db_connection
+from utils.pagination import cached_count, decode_cursor, encode_cursor, filter_signature
 
 audit_trails_bp = Blueprint('audit_trails', __name__)
 logger = logging.getLogger(__name__)
@@ -23,37 +25,109 @@ def audit_trails_page():
         role_access=session.get('role_access')
     )
 
+def _audit_filters(changed_at=None, changed_by=None, action=None):
+    """
+    Filter audit trail (dipakai list dan download). Tanggal menjadi range [hari, hari+1)
+    agar index pada changed_at tetap terpakai. Returns (list klausa SQL, params).
+    """
+    where_clauses = []
+    params = []
+    if changed_at:
+        day = date.fromisoformat(changed_at[:10])
+        where_clauses.append('changed_at >= ? AND changed_at < ?')
+        params += [day, day + timedelta(days=1)]
+    if changed_by:
+        where_clauses.append('changed_by = ?')
+        params.append(changed_by)
+    if action:
+        where_clauses.append('action = ?')
+        params.append(action)
+    return where_clauses, params
+
+def _approximate_audit_count(cursor):
+    """Jumlah baris dari metadata partisi (tanpa scan tabel). None bila tidak bisa dibaca."""
+    try:
+        cursor.execute("""
+            SELECT SUM(row_count)
+            FROM sys.dm_db_partition_stats
+            WHERE object_id = OBJECT_ID('dbo.SSOT_AUDIT_TRAILS') AND index_id IN (0, 1)
+        """)
+        row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+    except Exception as e:
+        logger.warning(f"Approximate count audit trails tidak tersedia: {e}")
+        return None
+
 @audit_trails_bp.route('/api/audit-trails', methods=['GET'])
 def api_audit_trails():
+    """
+    GET /api/audit-trails
+    Query params:
+    - changed_at (YYYY-MM-DD), changed_by, action: filter (sama dengan download)
+    - page, page_size: paging OFFSET (kompatibel dengan client lama)
+    - cursor: keyset pagination pada (changed_at, id); kirim cursor kosong untuk halaman
+      pertama lalu next_cursor dari respons sebelumnya
+    - include_total: hitung total (default true untuk mode page, false untuk mode cursor),
+      hasil count di-cache per filter
+    - approx_total=true: total tanpa filter diambil dari sys.dm_db_partition_stats (perkiraan)
+    """
     if 'username' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     # insert_audit_trail('view_audit_trails_api', f"User '{session.get('username')}' accessed audit trails API.")
     changed_at = request.args.get('changed_at')
+    changed_by = request.args.get('changed_by')
+    action = request.args.get('action')
     page = int(request.args.get('page', 1))
     page_size = int(request.args.get('page_size', 50))
-    offset = (page - 1) * page_size
+    cursor_token = request.args.get('cursor')
+    keyset = cursor_token is not None
+    include_total = request.args.get('include_total', 'false' if keyset else 'true').lower() == 'true'
+    approx_total = request.args.get('approx_total', 'false').lower() == 'true'
     conn = None
     cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        params = []
-        where = ''
-        if changed_at:
-            where = 'WHERE CAST(changed_at AS DATE) = ?'
-            params.append(changed_at)
-        count_query = f"SELECT COUNT(*) FROM SSOT_AUDIT_TRAILS {where}"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()[0]
+        where_clauses, params = _audit_filters(changed_at, changed_by, action)
+        signature = filter_signature('SSOT_AUDIT_TRAILS', changed_at or '', changed_by or '', action or '')
+
+        total = None
+        total_is_approximate = False
+        if include_total:
+            if approx_total and not where_clauses:
+                total = _approximate_audit_count(cursor)
+                total_is_approximate = total is not None
+            if total is None:
+                where = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ''
+                count_query = f"SELECT COUNT(*) FROM SSOT_AUDIT_TRAILS {where}"
+                total = cached_count(cursor, f"audit:{signature}", count_query, params)
+
+        conditions = list(where_clauses)
+        paging_clause = ''
+        paging_params = []
+        if keyset:
+            if cursor_token:
+                last_changed_at, last_id = decode_cursor(cursor_token, signature)
+                # CAST ke DATETIME: nilai dari Python dibulatkan sama seperti kolom (presisi 1/300 detik)
+                conditions.append(
+                    '(changed_at < CAST(? AS DATETIME) OR (changed_at = CAST(? AS DATETIME) AND id < ?))'
+                )
+                params += [last_changed_at, last_changed_at, last_id]
+        else:
+            paging_clause = 'OFFSET ? ROWS FETCH NEXT ? ROWS ONLY'
+            paging_params = [(page - 1) * page_size, page_size]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        top_clause = 'TOP (?)' if keyset else ''
+        top_params = [page_size] if keyset else []
+
         query = f"""
-            SELECT id, changed_at, changed_by, action, deskripsi, ip_address
+            SELECT {top_clause} id, changed_at, changed_by, action, deskripsi, ip_address
             FROM SSOT_AUDIT_TRAILS
             {where}
             ORDER BY changed_at DESC, id DESC
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+            {paging_clause}
         """
-        params_page = params + [offset, page_size]
-        cursor.execute(query, params_page)
+        cursor.execute(query, top_params + params + paging_params)
         rows = cursor.fetchall()
         data = []
         for row in rows:
@@ -64,7 +138,20 @@ def api_audit_trails():
                 'action': row[3],
                 'deskripsi': row[4]
             })
-        return jsonify({'success': True, 'data': data, 'total': total})
+
+        next_cursor = None
+        if len(rows) == page_size and rows[-1][1] is not None:
+            next_cursor = encode_cursor([rows[-1][1], rows[-1][0]], signature)
+
+        return jsonify({
+            'success': True,
+            'data': data,
+            'total': total,
+            'total_is_approximate': total_is_approximate,
+            'page': page,
+            'page_size': page_size,
+            'next_cursor': next_cursor
+        })
     except Exception as e:
         logger.error(f"Error fetching audit trails: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
@@ -90,17 +177,7 @@ def api_download_audit_trails():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        params = []
-        where_clauses = []
-        if changed_at:
-            where_clauses.append('CAST(changed_at AS DATE) = ?')
-            params.append(changed_at)
-        if changed_by:
-            where_clauses.append('changed_by = ?')
-            params.append(changed_by)
-        if action:
-            where_clauses.append('action = ?')
-            params.append(action)
+        where_clauses, params = _audit_filters(changed_at, changed_by, action)
         where = ''
         if where_clauses:
             where = 'WHERE ' + ' AND '.join(where_clauses)
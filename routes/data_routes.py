@@ -1,13 +1,15 @@
 from flask import (
     Blueprint, render_template, request, jsonify,
-    session, redirect, url_for, send_file
+    session, redirect, url_for, Response, stream_with_context
 )
-from io import BytesIO
-import openpyxl
 
 
 from config.config import get_db_connection
 from models.audit import insert_audit_trail
+from utils.schema_cache import get_numeric_columns
+from utils.reference_rate import get_reference_rate_mapping
+from utils.pagination import cached_count, date_filter, decode_cursor, encode_cursor, filter_signature
+from utils.xlsx_stream import EXPORT_FETCH_SIZE, XLSX_MIMETYPE, iter_cursor_batches, stream_xlsx
 
 data_bp = Blueprint('data', __name__)
 
@@ -31,85 +33,85 @@ def data_page():
 def api_data():
     """
     Endpoint untuk datatable monthly data dengan filter tanggal, pagination, dan limit
-    Query params: tanggal_data, page, page_size
+    Query params: tanggal_data, page, page_size, cursor, include_total
+    - Tanpa `cursor`: pagination OFFSET per page (kompatibel dengan halaman data).
+    - Dengan `cursor` (kosong untuk halaman pertama): keyset pagination pada
+      (Tanggal_Data, Facility_No) DESC; respons berisi next_cursor untuk halaman berikutnya.
+    - include_total: hitung total (default true untuk mode page, false untuk mode cursor),
+      hasil count di-cache per filter.
     """
     if 'username' not in session:
         return jsonify({'success': False, 'message': 'Please log in first.'})
     
+    conn = None
+    cursor = None
     try:
         tanggal_data = request.args.get('tanggal_data')
         page = int(request.args.get('page', 1))
         page_size = int(request.args.get('page_size', 50))
+        cursor_token = request.args.get('cursor')
+        keyset = cursor_token is not None
+        include_total = request.args.get('include_total', 'false' if keyset else 'true').lower() == 'true'
 
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Filter tanggal
-        where_clause = ""
-        params = []
-        if tanggal_data:
-            if len(tanggal_data) == 7:  
-                where_clause = "WHERE CONVERT(VARCHAR(7), m.Tanggal_Data, 120) = ?"
-                params.append(tanggal_data)
-            else:
-                where_clause = "WHERE m.Tanggal_Data = ?"
-                params.append(tanggal_data)
-
-        # Hitung total
-        count_query = f"SELECT COUNT(*) FROM SSOT_FINAL_MONTHLY m {where_clause}"
-        cursor.execute(count_query, params)
-        total_records = cursor.fetchone()[0]
-
-        # Ambil data + JOIN
-        offset = (page - 1) * page_size
+        # Filter tanggal: bulan (YYYY-MM) menjadi range [awal bulan, awal bulan berikutnya)
+        filter_clause, filter_params = date_filter('m.Tanggal_Data', tanggal_data)
+        signature = filter_signature('SSOT_FINAL_MONTHLY', tanggal_data or '')
+
+        # Hitung total (opsional, di-cache per filter)
+        total_records = None
+        if include_total:
+            where_clause = f"WHERE {filter_clause}" if filter_clause else ""
+            count_query = f"SELECT COUNT(*) FROM SSOT_FINAL_MONTHLY m {where_clause}"
+            total_records = cached_count(cursor, f"monthly:{signature}", count_query, filter_params)
+
+        conditions = [filter_clause] if filter_clause else []
+        params = list(filter_params)
+        paging_clause = ""
+        paging_params = []
+        if keyset:
+            if cursor_token:
+                last_tanggal, last_facility = decode_cursor(cursor_token, signature)
+                conditions.append("(m.Tanggal_Data < ? OR (m.Tanggal_Data = ? AND m.Facility_No < ?))")
+                params += [last_tanggal, last_tanggal, last_facility]
+        else:
+            paging_clause = "OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+            paging_params = [(page - 1) * page_size, page_size]
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        top_clause = "TOP (?)" if keyset else ""
+
+        # Mapping reference rate (in-process) menggantikan LEFT JOIN ke tabel master
+        rate_mapping = get_reference_rate_mapping(cursor)
+
+        # Ambil data
         data_query = f"""
-            SELECT 
+            SELECT {top_clause}
                 m.*,
-                ISNULL(
-                    CASE 
-                        WHEN m.IsSyariah = 'N' THEN 
-                            CASE 
-                                WHEN k.interest_reference_rate IS NULL THEN 'FIXED'
-                                ELSE k.interest_reference_rate_group
-                            END
-                        WHEN m.IsSyariah = 'Y' THEN s.interest_reference_rate_group
-                    END, 
-                    m.Interest_Reference_Rate
-                ) AS Interest_Reference_Rate_Group,
-                
-                CASE
-                    WHEN m.IsSyariah = 'N' THEN 
-                        CASE 
-                            WHEN k.interest_reference_rate_ssot IS NULL THEN 'FIXED'
-                            ELSE k.interest_reference_rate_ssot
-                        END
-                    WHEN m.IsSyariah = 'Y' THEN
-                        CASE 
-                            WHEN s.interest_reference_rate_ssot IS NULL THEN
-                                ISNULL(s.interest_reference_rate_group, m.Interest_Reference_Rate)
-                            ELSE s.interest_reference_rate_ssot
-                        END
-                END AS Interest_Reference_Rate_SSOT
-                
+                m.Interest_Reference_Rate AS Interest_Reference_Rate_Group,
+                m.Interest_Reference_Rate AS Interest_Reference_Rate_SSOT
             FROM SSOT_FINAL_MONTHLY m
-            LEFT JOIN MasterInterestReferenceRateKonven k
-                ON m.IsSyariah = 'N'
-                AND (REPLACE(m.Interest_Reference_Rate, ' ', '') = REPLACE(k.interest_reference_rate, ' ', '')
-                OR m.Interest_Reference_Rate = k.interest_reference_rate_group)
-            LEFT JOIN MasterInterestReferenceRateSyariah s
-                ON m.IsSyariah = 'Y'
-                AND (REPLACE(m.Interest_Reference_Rate, ' ', '') = REPLACE(s.interest_reference_rate_group, ' ', '')
-                OR m.Interest_Reference_Rate = s.interest_reference_rate_group)
             {where_clause}
-            ORDER BY m.Tanggal_Data DESC
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+            ORDER BY m.Tanggal_Data DESC, m.Facility_No DESC
+            {paging_clause}
         """
 
-        cursor.execute(data_query, params + [offset, page_size])
+        top_params = [page_size] if keyset else []
+        cursor.execute(data_query, top_params + params + paging_params)
         rows = cursor.fetchall()
         columns = [desc[0] for desc in cursor.description]
 
         data = [dict(zip(columns, row)) for row in rows]
+        for item in data:
+            item['Interest_Reference_Rate_Group'], item['Interest_Reference_Rate_SSOT'] = rate_mapping.resolve(
+                item.get('IsSyariah'), item.get('Interest_Reference_Rate')
+            )
+
+        next_cursor = None
+        if len(data) == page_size:
+            last = data[-1]
+            next_cursor = encode_cursor([last['Tanggal_Data'], last['Facility_No']], signature)
 
         insert_audit_trail('view_monthly_data',
             f"User '{session.get('username')}' viewed monthly data, page {page}.")
@@ -119,7 +121,8 @@ def api_data():
             'data': data,
             'total': total_records,
             'page': page,
-            'page_size': page_size
+            'page_size': page_size,
+            'next_cursor': next_cursor
         })
 
     except Exception as e:
@@ -139,22 +142,18 @@ def api_download_data():
     if 'username' not in session:
         return jsonify({'success': False, 'message': 'Please log in first.'})
     
+    conn = None
+    cursor = None
+    streaming = False
     try:
         tanggal_data = request.json.get('tanggal_data')
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        where_clause = ""
-        params = []
-        if tanggal_data:
-            if len(tanggal_data) == 7:
-                where_clause = "WHERE CONVERT(VARCHAR(7), m.Tanggal_Data, 120) = ?"
-                params.append(tanggal_data)
-            else:
-                where_clause = "WHERE m.Tanggal_Data = ?"
-                params.append(tanggal_data)
-
-        # Query lengkap + JOIN
+        filter_clause, params = date_filter('m.Tanggal_Data', tanggal_data)
+        where_clause = f"WHERE {filter_clause}" if filter_clause else ""
+
+        # Query lengkap; reference rate group/SSOT dihitung dari mapping in-process
         query = f"""
             SELECT 
                 m.Tanggal_Data,
@@ -195,31 +194,8 @@ def api_download_data():
                 m.Currency,
                 m.Interest_Rate,
                 m.Interest_Type,
-                ISNULL(
-                    CASE 
-                        WHEN m.IsSyariah = 'N' THEN 
-                            CASE 
-                                WHEN k.interest_reference_rate IS NULL THEN 'FIXED'
-                                ELSE k.interest_reference_rate_group
-                            END
-                        WHEN m.IsSyariah = 'Y' THEN s.interest_reference_rate_group
-                    END, 
-                    m.Interest_Reference_Rate
-                ) AS Interest_Reference_Rate_Group,
-                
-                CASE
-                    WHEN m.IsSyariah = 'N' THEN 
-                        CASE 
-                            WHEN k.interest_reference_rate_ssot IS NULL THEN 'FIXED'
-                            ELSE k.interest_reference_rate_ssot
-                        END
-                    WHEN m.IsSyariah = 'Y' THEN
-                        CASE 
-                            WHEN s.interest_reference_rate_ssot IS NULL THEN
-                                ISNULL(s.interest_reference_rate_group, m.Interest_Reference_Rate)
-                            ELSE s.interest_reference_rate_ssot
-                        END
-                END AS Interest_Reference_Rate_SSOT,
+                m.Interest_Reference_Rate AS Interest_Reference_Rate_Group,
+                m.Interest_Reference_Rate AS Interest_Reference_Rate_SSOT,
                 m.Maturity_Date,
                 m.Start_Date_Facility,
                 m.Category,
@@ -245,20 +221,16 @@ def api_download_data():
                 m.Flag_Penugasan,
                 m.load_date
             FROM SSOT_FINAL_MONTHLY m
-            LEFT JOIN MasterInterestReferenceRateKonven k
-                ON m.IsSyariah = 'N'
-                AND (REPLACE(m.Interest_Reference_Rate, ' ', '') = REPLACE(k.interest_reference_rate, ' ', '')
-                OR m.Interest_Reference_Rate = k.interest_reference_rate_group)
-            LEFT JOIN MasterInterestReferenceRateSyariah s
-                ON m.IsSyariah = 'Y'
-                AND (REPLACE(m.Interest_Reference_Rate, ' ', '') = REPLACE(s.interest_reference_rate_group, ' ', '')
-                OR m.Interest_Reference_Rate = s.interest_reference_rate_group)
             {where_clause}
             ORDER BY m.Tanggal_Data DESC
         """
 
+        rate_mapping = get_reference_rate_mapping(cursor)
+
+        # Kolom numeric dari schema cache
+        numeric_columns = get_numeric_columns('SSOT_FINAL_MONTHLY')
+
         cursor.execute(query, params)
-        rows = cursor.fetchall()
         columns = [desc[0] for desc in cursor.description]
 
         # Kolom yang dihapus
@@ -271,54 +243,42 @@ def api_download_data():
 
         keep_indices = [i for i, col in enumerate(columns) if col not in remove_cols]
         filtered_columns = [columns[i] for i in keep_indices]
-        filtered_rows = [[row[i] for i in keep_indices] for row in rows]
-
-        # Kolom numeric
-        cursor.execute("""
-            SELECT COLUMN_NAME
-            FROM INFORMATION_SCHEMA.COLUMNS
-            WHERE TABLE_NAME = 'SSOT_FINAL_MONTHLY'
-            AND DATA_TYPE = 'numeric'
-        """)
-        numeric_columns = {row[0] for row in cursor.fetchall()}
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Monthly Data"
-
-        ws.append(filtered_columns)
-        for row in filtered_rows:
-            ws.append(row)
-
-        from openpyxl.styles import numbers
-        for col_idx, col_name in enumerate(filtered_columns, start=1):
-            if col_name in numeric_columns:
-                for row_idx in range(2, len(filtered_rows) + 2):
-                    ws.cell(row=row_idx, column=col_idx).number_format = numbers.FORMAT_NUMBER_COMMA_SEPARATED1
-
-        # Auto width
-        for col_idx, col_name in enumerate(filtered_columns, start=1):
-            max_len = len(str(col_name))
-            for row in filtered_rows:
-                val = row[col_idx - 1]
-                if val:
-                    max_len = max(max_len, len(str(val)))
-            ws.column_dimensions[openpyxl.utils.get_column_letter(col_idx)].width = min(max_len + 2, 50)
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        filename = f"monthly_data_{tanggal_data}.xlsx"
 
+        syariah_idx = columns.index('IsSyariah')
+        group_idx = columns.index('Interest_Reference_Rate_Group')
+        ssot_idx = columns.index('Interest_Reference_Rate_SSOT')
+
+        def to_export_row(row):
+            values = list(row)
+            # Kolom group berisi Interest_Reference_Rate mentah dari query
+            values[group_idx], values[ssot_idx] = rate_mapping.resolve(values[syariah_idx], values[group_idx])
+            return [values[i] for i in keep_indices]
+
+        filename = f"monthly_data_{tanggal_data}.xlsx"
+        username = session.get('username')
         insert_audit_trail('download_monthly_data',
-            f"User '{session.get('username')}' downloaded Excel.")
+            f"User '{username}' downloaded Excel.")
+
+        def generate():
+            # Koneksi ditutup di sini (bukan di finally endpoint) karena data dikirim bertahap
+            try:
+                batches = iter_cursor_batches(
+                    cursor, EXPORT_FETCH_SIZE, to_export_row
+                )
+                yield from stream_xlsx(filtered_columns, batches, sheet_title="Monthly Data",
+                                       numeric_columns=numeric_columns)
+            except Exception as e:
+                insert_audit_trail('download_monthly_data_failed',
+                    f"User '{username}' failed: {str(e)}", username=username)
+                raise
+            finally:
+                cursor.close()
+                conn.close()
 
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        response = Response(stream_with_context(generate()), mimetype=XLSX_MIMETYPE)
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        streaming = True
+        return response
 
     except Exception as e:
         insert_audit_trail('download_monthly_data_failed',
@@ -326,5 +286,6 @@ def api_download_data():
         return jsonify({'success': False, 'message': str(e)})
 
     finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+        if not streaming:
+            if cursor: cursor.close()
+            if conn: conn.close()
@@ -1,11 +1,15 @@
-from io import BytesIO
-from flask import Blueprint, jsonify, send_file, session
+import os
+from flask import Blueprint, Response, jsonify, request, send_file, session, stream_with_context
+import json
 import logging
 
-import openpyxl
-
 from models.audit import insert_audit_trail
 from config.config import get_db_connection
+from utils.debitur_snapshot import (
+    DebiturSnapshot, get_debitur_export, get_debitur_snapshot, get_sync_delta, record_sync
+)
+from utils.pagination import decode_cursor, encode_cursor
+from utils.xlsx_stream import XLSX_MIMETYPE
 
 debitur_bp = Blueprint('debitur', __name__)
 logger = logging.getLogger(__name__)
@@ -21,53 +25,10 @@ def api_debitur_aktif():
         return jsonify({'success': False, 'message': 'Please log in first.'})
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Default: periode terakhir (EOD_DATE)
-        cursor.execute("""
-            SELECT MAX(PBK_EOD_DATE) FROM [10.10.4.12].SMIDWHARIUM.dbo.PBK_T_INF_COR_FACILITY_ACCOUNT
-            WHERE FACILITY_STATUS = 'AC'
-        """)
-        last_eod_date = cursor.fetchone()[0]
-
-        # Query data dari function
-        cursor.execute("""
-            SELECT TOP 1000
-                PBK_EOD_DATE,
-                NOMOR_CIF,
-                CUST_NAME,
-                FACILITY_NO
-            FROM Func_GetCustomerData(?)
-            ORDER BY NOMOR_CIF
-        """, (last_eod_date,))
-        rows = cursor.fetchall()
-
-        # Format data
-        data = []
-        for idx, row in enumerate(rows):
-            data.append({
-                'pbk_eod_date': row[0].strftime('%Y-%m-%d') if row[0] else None,
-                'kode_debitur': row[1],
-                'nama_debitur': row[2],
-                'facility_no': row[3],
-                'status': 'AKTIF',
-                'tanggal_dibuat': row[0].strftime('%Y-%m-%d') if row[0] else None,
-                'last_update': row[0].strftime('%Y-%m-%d') if row[0] else None,
-            })
-
-        # Stats
-        cursor.execute("""
-            SELECT COUNT(DISTINCT NOMOR_CIF)
-            FROM Func_GetCustomerData(?)
-        """, (last_eod_date,))
-        total_records = cursor.fetchone()[0]
-
-        stats = {
-            'total': total_records,
-            'active': total_records,
-            'last_update': last_eod_date.strftime('%Y-%m-%d') if last_eod_date else None
-        }
+        # Snapshot per EOD: linked server hanya di-query saat EOD berubah
+        snapshot = get_debitur_snapshot()
+        data = snapshot.records(limit=1000)
+        stats = snapshot.stats()
         
         insert_audit_trail('view_debitur_aktif', f"User '{session.get('username')}' viewed debitur aktif preview.")
         return jsonify({'success': True, 'data': data, 'stats': stats})
@@ -75,61 +36,47 @@ def api_debitur_aktif():
     except Exception as e:
         insert_audit_trail('view_debitur_aktif_failed', f"User '{session.get('username')}' failed to view debitur aktif preview: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+
+def _is_truthy(value):
+    return str(value or '').strip().lower() in ('1', 'true', 'yes')
+
+def _ndjson_lines(snapshot, delta, stats, batch_size=1000):
+    """Full resync: satu baris meta lalu satu baris JSON per debitur, dikirim per batch."""
+    yield json.dumps({'type': 'meta', 'stats': stats, 'delta': delta.summary()}) + '\n'
+    rows = snapshot.rows
+    for start in range(0, len(rows), batch_size):
+        yield ''.join(json.dumps(DebiturSnapshot.to_record(row)) + '\n' for row in rows[start:start + batch_size])
+
+def _changes_page(delta, offset, limit):
+    limit = min(limit, 10000) if limit and limit > 0 else None
+    changes, next_offset = delta.page(offset, limit)
+    next_cursor = encode_cursor([next_offset], delta.sync_id) if next_offset is not None else None
+    return changes, next_cursor
 
 @debitur_bp.route('/api/sync-debitur', methods=['POST'])
 def api_sync_debitur():
     """
     POST /api/sync-debitur
-    Refresh data debitur aktif dari database
+    Refresh data debitur aktif dari database (snapshot dimuat ulang dari linked server).
+    Respons berisi jumlah perubahan terhadap sync sebelumnya (added/removed/changed per
+    CIF + fasilitas) dan halaman pertama perubahan; halaman berikutnya lewat
+    GET /api/sync-debitur/changes?sync_id=...&cursor=...
+    full=1 (query/form): full resync, seluruh data di-stream sebagai NDJSON.
     """
     if 'username' not in session:
         return jsonify({'success': False, 'message': 'Please log in first.'})
     # insert_audit_trail('view_sync_debitur', f"User '{session.get('username')}' viewed sync debitur aktif page.")
     
+    conn = None
+    cursor = None
     try:
+        # Refresh eksplisit: snapshot dimuat ulang dari linked server (request bersamaan digabung)
+        snapshot = get_debitur_snapshot(force_refresh=True)
+        delta = record_sync(snapshot)
+        stats = snapshot.stats(total=snapshot.row_count)
+        
         conn = get_db_connection()
         cursor = conn.cursor()
-
-        # Ambil periode terbaru
-        cursor.execute("""
-            SELECT MAX(PBK_EOD_DATE) FROM [10.10.4.12].SMIDWHARIUM.dbo.PBK_T_INF_COR_FACILITY_ACCOUNT
-            WHERE FACILITY_STATUS = 'AC'
-        """)
-        last_eod_date = cursor.fetchone()[0]
-
-        # Query data dari function
-        cursor.execute("""
-            SELECT
-                PBK_EOD_DATE,
-                NOMOR_CIF,
-                CUST_NAME,
-                FACILITY_NO
-            FROM Func_GetCustomerData(?)
-            ORDER BY NOMOR_CIF
-        """, (last_eod_date,))
-        rows = cursor.fetchall()
-
-        data = []
-        for idx, row in enumerate(rows):
-            data.append({
-                'pbk_eod_date': row[0].strftime('%Y-%m-%d') if row[0] else None,
-                'kode_debitur': row[1],
-                'nama_debitur': row[2],
-                'facility_no': row[3],
-                'status': 'AKTIF',
-                'tanggal_dibuat': row[0].strftime('%Y-%m-%d') if row[0] else None,
-                'last_update': row[0].strftime('%Y-%m-%d') if row[0] else None,
-            })
-
-        stats = {
-            'total': len(data),
-            'active': len(data),
-            'last_update': last_eod_date.strftime('%Y-%m-%d') if last_eod_date else None
-        }
-        
         cursor.execute("""
             MERGE INTO SSOT_LAST_SYNC AS target
             USING (SELECT ? AS sync_type) AS source
@@ -142,7 +89,18 @@ def api_sync_debitur():
         conn.commit()
         
         # insert_audit_trail('sync_debitur_aktif', f"User '{session.get('username')}' synchronized debitur aktif data.")
-        return jsonify({'success': True, 'data': data, 'stats': stats})
+        if _is_truthy(request.values.get('full')):
+            return Response(stream_with_context(_ndjson_lines(snapshot, delta, stats)),
+                            mimetype='application/x-ndjson')
+        
+        changes, next_cursor = _changes_page(delta, 0, request.values.get('limit', type=int))
+        return jsonify({
+            'success': True,
+            'stats': stats,
+            'delta': delta.summary(),
+            'changes': changes,
+            'next_cursor': next_cursor
+        })
 
     except Exception as e:
         # insert_audit_trail('sync_debitur_aktif_failed', f"User '{session.get('username')}' failed to synchronize debitur aktif data: {str(e)}")
@@ -150,6 +108,35 @@ def api_sync_debitur():
     finally:
         if cursor: cursor.close()
         if conn: conn.close()
+
+@debitur_bp.route('/api/sync-debitur/changes', methods=['GET'])
+def api_sync_debitur_changes():
+    """
+    GET /api/sync-debitur/changes?sync_id=...&cursor=...&limit=...
+    Halaman berikutnya dari daftar perubahan hasil POST /api/sync-debitur.
+    """
+    if 'username' not in session:
+        return jsonify({'success': False, 'message': 'Please log in first.'})
+    
+    try:
+        delta = get_sync_delta(request.args.get('sync_id', '').strip())
+        if delta is None:
+            return jsonify({'success': False, 'message': 'Hasil sync sudah kedaluwarsa, silakan refresh ulang.'})
+        
+        token = request.args.get('cursor')
+        try:
+            offset = max(0, int(decode_cursor(token, delta.sync_id)[0])) if token else 0
+        except TypeError:
+            raise ValueError('Cursor tidak valid')
+        changes, next_cursor = _changes_page(delta, offset, request.args.get('limit', type=int))
+        return jsonify({
+            'success': True,
+            'delta': delta.summary(),
+            'changes': changes,
+            'next_cursor': next_cursor
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
         
 @debitur_bp.route('/api/last-sync', methods=['GET'])
 def api_last_sync():
@@ -174,74 +161,33 @@ def api_last_sync():
         if cursor: cursor.close()
         if conn: conn.close()
 
-@debitur_bp.route('/api/download-debitur-excel', methods=['POST'])
+@debitur_bp.route('/api/download-debitur-excel', methods=['GET', 'POST'])
 def api_download_debitur_excel():
     """
-    POST /api/download-debitur-excel
-    Generate dan download file Excel debitur aktif
+    GET/POST /api/download-debitur-excel
+    Download file Excel debitur aktif. File dibuat sekali per EOD (streaming writer) dan disimpan
+    di disk; download berikutnya dikirim langsung dari file dengan ETag, conditional GET dan Range.
     """
     if 'username' not in session:
         return jsonify({'success': False, 'message': 'Please log in first.'})
     # insert_audit_trail('view_download_debitur_excel', f"User '{session.get('username')}' viewed download debitur aktif Excel page.")
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Ambil periode terbaru
-        cursor.execute("""
-            SELECT MAX(PBK_EOD_DATE) FROM [10.10.4.12].SMIDWHARIUM.dbo.PBK_T_INF_COR_FACILITY_ACCOUNT
-            WHERE FACILITY_STATUS = 'AC'
-        """)
-        last_eod_date = cursor.fetchone()[0]
-
-        # Query semua data
-        cursor.execute("""
-            SELECT
-                PBK_EOD_DATE,
-                NOMOR_CIF,
-                CUST_NAME,
-                FACILITY_NO
-            FROM Func_GetCustomerData(?)
-            ORDER BY NOMOR_CIF
-        """, (last_eod_date,))
-        rows = cursor.fetchall()
-
-        # Generate Excel file in memory
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Debitur Aktif"
-
-        # Header
-        ws.append(['Tanggal Data', 'Kode Debitur', 'Nama Debitur', 'Nomor Fasilitas'])
-
-        # Data
-        for row in rows:
-            ws.append([
-                row[0].strftime('%Y-%m-%d') if row[0] else '',
-                row[1],
-                row[2],
-                row[3]
-            ])
-
-        # Save to BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        filename = f"debitur_aktif_{last_eod_date.strftime('%Y%m%d')}.xlsx" if last_eod_date else "debitur_aktif.xlsx"
+        # Data dari snapshot EOD terbaru (tanpa query ulang ke linked server)
+        snapshot = get_debitur_snapshot()
+        export = get_debitur_export(snapshot)
         # insert_audit_trail('download_debitur_excel', f"User '{session.get('username')}' downloaded debitur aktif Excel file.")
         
         return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            os.path.abspath(export.path),
+            mimetype=XLSX_MIMETYPE,
             as_attachment=True,
-            download_name=filename
+            download_name=export.filename,
+            etag=export.etag,
+            conditional=True,
+            max_age=0
         )
 
     except Exception as e:
         # insert_audit_trail('download_debitur_excel_failed', f"User '{session.get('username')}' failed to download debitur aktif Excel file: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
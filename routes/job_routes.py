@@ -0,0 +1,23 @@
+from flask import Blueprint, jsonify, session
+from utils.job_queue import get_job_queue
+import logging
+
+jobs_bp = Blueprint('jobs', __name__)
+logger = logging.getLogger(__name__)
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Status dan progress per fase dari job background (mis. upload async)."""
+    if 'username' not in session:
+        return jsonify({'success': False, 'message': 'Please log in first.'}), 401
+
+    try:
+        job = get_job_queue().get(job_id)
+        if job is None or (job['created_by'] != session.get('username') and session.get('role_access') != 'admin'):
+            return jsonify({'success': False, 'message': 'Job tidak ditemukan'}), 404
+
+        return jsonify({'success': True, 'job': job})
+
+    except Exception as e:
+        logger.error(f"Error in get_job_status: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
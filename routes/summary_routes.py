@@ -2,15 +2,23 @@ from flask import Blueprint, render_template, request, jsonify, session, redirec
 from datetime import datetime, timedelta
 import logging
 import os
+import time
 from dateutil.relativedelta import relativedelta
 
 from models.audit import insert_audit_trail
 from config.config import get_db_connection
+from utils.audit_rollup import get_action_totals, get_monthly_activity
+from utils.cache import TTLCache
 from utils.db_utils import check_master_uploader_by_date
+from utils.summary_engine import count_rows_for_period, get_latest_period_date, get_template_catalog
 
 summary_bp = Blueprint('summary', __name__)
 logger = logging.getLogger(__name__)
 
+ANALYTICS_LOGIN_ACTION = 'login'
+ANALYTICS_DOWNLOAD_ACTION = 'download_monthly_data'
+_analytics_cache = TTLCache(60, max_entries=32)
+
 @summary_bp.route('/summary', methods=['GET'])
 def summary_page():
     if 'username' not in session:
@@ -26,6 +34,45 @@ def summary_page():
         role_access=session.get('role_access')
     )
 
+def _build_analytics_dashboard(cursor, year):
+    # 1-3. Total user, download (dari rollup audit harian), dan upload
+    cursor.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM MasterUsers),
+            (SELECT COUNT(*) FROM MasterUploader)
+    """)
+    total_users, total_uploads = cursor.fetchone()
+    total_downloads = get_action_totals(cursor, [ANALYTICS_DOWNLOAD_ACTION])[ANALYTICS_DOWNLOAD_ACTION]
+
+    # 4-5. Login, download, dan upload per bulan dalam satu query (predicate range tanggal)
+    monthly, upload_monthly = get_monthly_activity(cursor, year, [ANALYTICS_LOGIN_ACTION, ANALYTICS_DOWNLOAD_ACTION])
+    login_monthly = monthly[ANALYTICS_LOGIN_ACTION]
+    download_monthly = monthly[ANALYTICS_DOWNLOAD_ACTION]
+
+    month_names = ['January', 'February', 'March', 'April', 'May', 'June',
+                   'July', 'August', 'September', 'October', 'November', 'December']
+    login_monthly_data = [{'month': m, 'count': login_monthly.get(i, 0)} for i, m in enumerate(month_names, 1)]
+    traffic_monthly_data = [
+        {
+            'month': m,
+            'downloads': download_monthly.get(i, 0),
+            'uploads': upload_monthly.get(i, 0)
+        }
+        for i, m in enumerate(month_names, 1)
+    ]
+
+    return {
+        'success': True,
+        'summary': {
+            'total_users': total_users,
+            'total_downloads': total_downloads,
+            'total_uploads': total_uploads
+        },
+        'login_monthly': login_monthly_data,
+        'traffic_monthly': traffic_monthly_data,
+        'year': year
+    }
+
 @summary_bp.route('/api/analytics-dashboard', methods=['GET'])
 def api_analytics_dashboard():
     if 'username' not in session:
@@ -38,124 +85,15 @@ def api_analytics_dashboard():
         # Get year parameter (default: current year)
         year = request.args.get('year', str(datetime.now().year), type=int)
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # 1. Total User Count (from MasterUsers)
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM MasterUsers
-        """)
-        total_users = cursor.fetchone()[0]
-
-        # 2. Total File Download Count (from SSOT_AUDIT_TRAILS where action = 'download_monthly_data')
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM SSOT_AUDIT_TRAILS
-            WHERE action = 'download_monthly_data'
-        """)
-        total_downloads = cursor.fetchone()[0]
-
-        # 3. Total File Upload Count (from MasterUploader)
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM MasterUploader
-        """)
-        total_uploads = cursor.fetchone()[0]
-
-        # 4. User Login Per Month for the specified year (Line Chart data)
-        cursor.execute("""
-            SELECT
-                MONTH(changed_at) as month,
-                COUNT(*) as login_count
-            FROM SSOT_AUDIT_TRAILS
-            WHERE action = 'login'
-            AND YEAR(changed_at) = ?
-            GROUP BY MONTH(changed_at)
-            ORDER BY MONTH(changed_at)
-        """, (year,))
-
-        login_data = cursor.fetchall()
-        login_monthly = {}
-        for row in login_data:
-            month = row[0]
-            count = row[1]
-            month_name = datetime(year, month, 1).strftime('%B')
-            login_monthly[month_name] = count
-
-        # Fill missing months with 0
-        month_names = ['January', 'February', 'March', 'April', 'May', 'June',
-                       'July', 'August', 'September', 'October', 'November', 'December']
-        login_monthly_data = [{'month': m, 'count': login_monthly.get(m, 0)} for m in month_names]
-
-        # 5. Download and Upload Per Month for the specified year (Double Bar Chart data)
-        # Download data from SSOT_AUDIT_TRAILS
-        cursor.execute("""
-            SELECT
-                MONTH(changed_at) as month,
-                COUNT(*) as download_count
-            FROM SSOT_AUDIT_TRAILS
-            WHERE action = 'download_monthly_data'
-            AND YEAR(changed_at) = ?
-            GROUP BY MONTH(changed_at)
-            ORDER BY MONTH(changed_at)
-        """, (year,))
-
-        download_data = cursor.fetchall()
-        download_monthly = {}
-        for row in download_data:
-            month = row[0]
-            count = row[1]
-            month_name = datetime(year, month, 1).strftime('%B')
-            download_monthly[month_name] = count
-
-        # Upload data from MasterUploader
-        cursor.execute("""
-            SELECT
-                MONTH(upload_date) as month,
-                COUNT(*) as upload_count
-            FROM MasterUploader
-            WHERE YEAR(upload_date) = ?
-            GROUP BY MONTH(upload_date)
-            ORDER BY MONTH(upload_date)
-        """, (year,))
-
-        upload_data = cursor.fetchall()
-        upload_monthly = {}
-        for row in upload_data:
-            month = row[0]
-            count = row[1]
-            month_name = datetime(year, month, 1).strftime('%B')
-            upload_monthly[month_name] = count
-
-        # Combine download and upload data
-        traffic_monthly = {}
-        for m in month_names:
-            traffic_monthly[m] = {
-                'downloads': download_monthly.get(m, 0),
-                'uploads': upload_monthly.get(m, 0)
-            }
-
-        traffic_monthly_data = [
-            {
-                'month': m,
-                'downloads': traffic_monthly[m]['downloads'],
-                'uploads': traffic_monthly[m]['uploads']
-            }
-            for m in month_names
-        ]
+        # Cache per (tahun, bucket menit): data dashboard paling lama tertinggal satu menit
+        cache_key = (year, int(time.time() // 60))
+        result = _analytics_cache.get(cache_key)
+        if result is None:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            result = _analytics_cache.set(cache_key, _build_analytics_dashboard(cursor, year))
 
-        return jsonify({
-            'success': True,
-            'summary': {
-                'total_users': total_users,
-                'total_downloads': total_downloads,
-                'total_uploads': total_uploads
-            },
-            'login_monthly': login_monthly_data,
-            'traffic_monthly': traffic_monthly_data,
-            'year': year
-        })
+        return jsonify(result)
 
     except Exception as e:
         logger.error(f"Error fetching analytics dashboard data: {str(e)}")
@@ -190,42 +128,13 @@ def api_summary():
         """)
         templates = cursor.fetchall()
 
+        # Keberadaan tabel + kolom PERIOD_DATE untuk semua template dalam satu query katalog
+        catalog = get_template_catalog(cursor, [t[0] for t in templates])
+        period_tables = [name for name, has_period in catalog.items() if has_period]
+
         if not tanggal_data or not tanggal_data.strip():
             # Find the maximum (most recent) month where at least one template has data
-            max_period_date = None
-
-            for template in templates:
-                template_name = template[0]
-
-                try:
-                    # Check if template table exists
-                    count_query = f"""
-                        SELECT COUNT(*)
-                        FROM INFORMATION_SCHEMA.TABLES
-                        WHERE TABLE_NAME = ? AND TABLE_SCHEMA = 'dbo'
-                    """
-                    cursor.execute(count_query, (template_name,))
-                    table_exists = cursor.fetchone()[0] > 0
-
-                    if table_exists:
-                        # Get the maximum period_date (most recent data) from this template
-                        period_query = f"""
-                            SELECT MAX(CAST(PERIOD_DATE AS DATE))
-                            FROM [{template_name}]
-                            WHERE PERIOD_DATE IS NOT NULL
-                        """
-                        cursor.execute(period_query)
-                        result = cursor.fetchone()
-
-                        if result and result[0]:
-                            template_max_date = result[0]
-                            # Update max_period_date if this template has a more recent date
-                            if max_period_date is None or template_max_date > max_period_date:
-                                max_period_date = template_max_date
-
-                except Exception as e:
-                    logger.warning(f"Error checking max date for template {template_name}: {str(e)}")
-                    continue
+            max_period_date = get_latest_period_date(cursor, period_tables)
 
             # Use the max date found, fallback to current month
             if max_period_date:
@@ -239,73 +148,37 @@ def api_summary():
 
         # Check master uploader data for the given date
         master_uploader_data = check_master_uploader_by_date(tanggal_data)
+        upload_dates = {}
+        for uploader in master_uploader_data:
+            upload_dates.setdefault(uploader['template'], uploader['upload_date'])
 
-        # Pagination
+        # Pagination (sebelum menghitung data, hanya template di halaman ini yang di-query)
         page = int(request.args.get('page', 1))
         page_size = int(request.args.get('page_size', 50))
+        start = (page - 1) * page_size
+        end = start + page_size
+        page_templates = templates[start:end]
 
-        data = []
+        counts = count_rows_for_period(
+            cursor, [t[0] for t in page_templates if catalog.get(t[0])], tanggal_data
+        )
 
-        # Process each template
-        for template in templates:
+        paged_data = []
+        for template in page_templates:
             template_name = template[0]
             division_name = template[1]
+            jumlah_data = counts.get(template_name, 0)
 
-            # Get upload date from master uploader data
-            upload_date = None
-            for uploader in master_uploader_data:
-                if uploader['template'] == template_name:
-                    upload_date = uploader['upload_date']
-                    break
-
-            # Get data count from template table
-            jumlah_data = 0
-            status = 'BELUM TERSEDIA'
-
-            try:
-                # Check if template table exists
-                count_query = f"""
-                    SELECT COUNT(*)
-                    FROM INFORMATION_SCHEMA.TABLES
-                    WHERE TABLE_NAME = ? AND TABLE_SCHEMA = 'dbo'
-                """
-                cursor.execute(count_query, (template_name,))
-                table_exists = cursor.fetchone()[0] > 0
-
-                if table_exists:
-                    # Get data count for the specified date
-                    data_query = f"""
-                        SELECT COUNT(*)
-                        FROM [{template_name}]
-                        WHERE CAST(PERIOD_DATE AS DATE) = CAST(? AS DATE)
-                    """
-                    cursor.execute(data_query, (tanggal_data,))
-                    jumlah_data = cursor.fetchone()[0]
-
-                    # Set status
-                    if jumlah_data > 0:
-                        status = 'TERSEDIA'
-                    else:
-                        status = 'BELUM TERSEDIA'
-
-            except Exception as table_error:
-                logger.warning(f"Error checking template {template_name}: {str(table_error)}")
-                status = 'BELUM TERSEDIA'
-                jumlah_data = 0
-
-            data.append({
+            paged_data.append({
                 'period_date': tanggal_data,
                 'template_name': template_name,
                 'division_name': division_name,
-                'upload_date': upload_date,
+                'upload_date': upload_dates.get(template_name),
                 'jumlah_data': jumlah_data,
-                'status': status
+                'status': 'TERSEDIA' if jumlah_data > 0 else 'BELUM TERSEDIA'
             })
 
-        total_records = len(data)
-        start = (page - 1) * page_size
-        end = start + page_size
-        paged_data = data[start:end]
+        total_records = len(templates)
 
         return jsonify({
             'success': True,
@@ -3,12 +3,11 @@ import io
 import re
 from flask import Blueprint, current_app, make_response, request, jsonify, session
 from datetime import date, datetime
-from werkzeug.utils import secure_filename
-import os
 import logging
 
-from utils.file_utils import allowed_file
-from utils.excel_utils import get_excel_sheets
+from utils.upload_session import upload_session_from_request
+from utils.period_stats import get_period_counts
+from utils.schema_cache import invalidate_table
 from models.audit import insert_audit_trail
 from config.config import get_db_connection
 
@@ -36,9 +35,14 @@ def check_period():
 
         conn = get_db_connection()
         cursor = conn.cursor()
-        query = f"SELECT COUNT(*) FROM {table_name} WHERE period_date = ?"
-        cursor.execute(query, (periode_date,))
-        count = cursor.fetchone()[0]
+        # Point lookup ke SSOT_TEMPLATE_PERIOD_STATS; COUNT(*) langsung bila statistik belum tersedia
+        counts, unavailable = get_period_counts(cursor, [table_name], periode_date)
+        if unavailable:
+            query = f"SELECT COUNT(*) FROM {table_name} WHERE period_date = ?"
+            cursor.execute(query, (periode_date,))
+            count = cursor.fetchone()[0]
+        else:
+            count = counts.get(table_name, 0)
         
         insert_audit_trail('check_period', f"User '{session.get('username')}' checked period '{periode_date}' in table '{table_name}'.")
         return jsonify({'success': True, 'exists': count > 0})
@@ -381,44 +385,19 @@ def get_excel_sheets_endpoint():
         return jsonify({'success': False, 'message': 'Please log in first.'})
     
     try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'message': 'Tidak ada file yang dipilih'})
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({'success': False, 'message': 'Tidak ada file yang dipilih'})
-        
-        if not allowed_file(file.filename):
-            return jsonify({'success': False, 'message': 'File harus berformat Excel (.xlsx atau .xls)'})
+        # File disimpan sekali per konten; token dipakai ulang oleh /analyze-excel dan /upload
+        upload_session, error = upload_session_from_request(request, current_app.config['UPLOAD_FOLDER'])
+        if error:
+            return jsonify({'success': False, 'message': error})
         
-        # Simpan file temporary
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"sheets_{timestamp}_{filename}"
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        try:
-            # Dapatkan daftar sheet
-            sheets = get_excel_sheets(file_path)
-            
-            if sheets is None:
-                return jsonify({'success': False, 'message': 'Gagal membaca daftar sheet dari file Excel'})
-            
-            insert_audit_trail('get_excel_sheets', f"User '{session.get('username')}' uploaded file '{filename}' and retrieved sheets.")
-            return jsonify({
-                'success': True,
-                'sheets': sheets,
-                'message': f'Ditemukan {len(sheets)} sheet dalam file Excel'
-            })
-            
-        finally:
-            # Hapus file temporary
-            try:
-                os.remove(file_path)
-            except:
-                pass
+        sheets = upload_session.sheets
+        insert_audit_trail('get_excel_sheets', f"User '{session.get('username')}' uploaded file '{upload_session.filename}' and retrieved sheets.")
+        return jsonify({
+            'success': True,
+            'sheets': sheets,
+            'upload_token': upload_session.token,
+            'message': f'Ditemukan {len(sheets)} sheet dalam file Excel'
+        })
         
     except Exception as e:
         insert_audit_trail('get_excel_sheets_failed', f"User '{session.get('username')}' failed to retrieve sheets from uploaded file: {str(e)}")
@@ -584,6 +563,7 @@ def duplicate_table(table_name):
         
         cursor.execute(create_query)
         conn.commit()
+        invalidate_table(new_table_name)
         
         insert_audit_trail('duplicate_table', f"User '{session.get('username')}' duplicated table '{table_name}' to '{new_table_name}'.")
         return jsonify({
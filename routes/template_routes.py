@@ -3,6 +3,8 @@ from flask import Blueprint, flash, render_template, request, jsonify, session,
 import logging
 
 from utils.db_utils import get_master_divisions_tables
+from utils.period_stats import delete_period_stats
+from utils.schema_cache import invalidate_table
 from models.audit import insert_audit_trail
 from config.config import get_db_connection
 
@@ -279,6 +281,7 @@ def create_table():
                 
                 # Commit hanya jika verifikasi berhasil
                 conn.commit()
+                invalidate_table(table_name)
                 logger.info(f"Template {table_name} created and verified successfully with {column_count} columns")
                 insert_audit_trail('create_table', f"User '{session.get('username')}' created table '{table_name}'.")
                 
@@ -369,8 +372,10 @@ def delete_table():
                 if table_exists:
                     cursor.execute(f"DROP TABLE [{table_name}]")
                     logger.info(f"Dropped table {table_name}")
+                delete_period_stats(cursor, table_name)
                 
                 conn.commit()
+                invalidate_table(table_name)
                 insert_audit_trail('delete_table', f"User '{session.get('username')}' deleted table '{table_name}'.")
                 return jsonify({
                     'success': True, 
@@ -387,7 +392,9 @@ def delete_table():
                 
                 if table_exists:
                     cursor.execute(f"DROP TABLE [{table_name}]")
+                    delete_period_stats(cursor, table_name)
                     conn.commit()
+                    invalidate_table(table_name)
                     insert_audit_trail('delete_table', f"User '{session.get('username')}' deleted table '{table_name}'.")
                     logger.info(f"Dropped table {table_name}")
                     return jsonify({
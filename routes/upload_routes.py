@@ -1,18 +1,94 @@
 from flask import Blueprint, current_app, render_template, request, jsonify, session, redirect, url_for, flash
-import pandas as pd
 from config.config import get_db_connection
+from utils.excel_utils import process_excel_file
+from utils.upload_session import get_upload_session, promote_upload, register_upload, upload_session_from_request
+from utils.job_queue import get_job_queue, register_job_handler
+from utils.batch_upload import process_batch_upload
 from utils.file_utils import allowed_file
-from utils.excel_utils import find_data_start_row, find_primary_header_row, get_excel_sheets, process_excel_file
 from utils.db_utils import get_automatic_columns, get_column_info, get_data_count_by_period, get_template_tables, safe_insert_single_record
 from models.audit import insert_audit_trail
 import os
+import json
 from datetime import datetime
-from werkzeug.utils import secure_filename
 import logging
 
 upload_bp = Blueprint('upload', __name__)
 logger = logging.getLogger(__name__)
 
+def _record_upload(username, division, table_name, sheet_name, file_path, periode_date, filename, ip_address=None):
+    """Simpan riwayat upload ke MasterUploader; kegagalan tidak menggagalkan proses utama."""
+    try:
+        print("Attempting to insert to MasterUploader...")
+        
+        # Gunakan fungsi safe_insert_single_record
+        columns = ['username', 'division', 'template', 'sheets', 'file_upload', 'period_date', 'upload_date']
+        values = [
+            username,
+            division,
+            table_name,
+            sheet_name,
+            file_path,
+            periode_date,
+            datetime.now()
+        ]
+        
+        # Debug data sebelum insert
+        print("Data to be inserted to MasterUploader:")
+        for col, val in zip(columns, values):
+            print(f"  {col}: {type(val).__name__} = {repr(val)}")
+        
+        insert_success = safe_insert_single_record('MasterUploader', columns, values)
+        insert_audit_trail('upload', f"User '{username}' uploaded file '{filename}'.",
+                           username=username, ip_address=ip_address)
+        
+        if not insert_success:
+            logger.warning("Failed to insert to MasterUploader, but continuing with main process")
+            
+    except Exception as e:
+        insert_audit_trail('upload_failed', f"User '{username}' failed to upload file '{filename}': {str(e)}",
+                           username=username, ip_address=ip_address)
+        logger.error(f"Gagal insert ke MasterUploader: {str(e)}")
+        # Don't fail the entire process if MasterUploader insert fails
+        logger.warning("Continuing with main process despite MasterUploader insert failure")
+
+def _run_upload_job(payload, progress):
+    """
+    Handler job 'upload': sama dengan /upload sinkron, dengan progress per fase.
+    Insert dan catatan MasterUploader di-checkpoint sehingga job yang diulang setelah restart
+    tidak insert ulang data maupun menambah baris MasterUploader duplikat.
+    """
+    periode_date = payload.get('periode_date')
+    if periode_date:
+        periode_date = datetime.strptime(periode_date[:10], '%Y-%m-%d').date()
+    
+    result = progress.completed('insert')
+    if result is None:
+        result = _run_upload_insert(payload, progress, periode_date)
+        progress.checkpoint('insert', result)
+    
+    if not progress.completed('record_upload'):
+        _record_upload(payload.get('username'), payload.get('division'), payload['table_name'],
+                       payload.get('sheet_name'), payload['file_path'], periode_date, payload.get('filename'),
+                       ip_address=payload.get('ip_address'))
+        progress.checkpoint('record_upload')
+    return result
+
+def _run_upload_insert(payload, progress, periode_date):
+    # Pakai file dan cache parse dari upload session bila masih ada, jika tidak dari salinan permanen
+    file_path = payload['file_path']
+    sheet_cache = None
+    upload_session = get_upload_session(payload.get('upload_token'))
+    if upload_session is not None and os.path.exists(upload_session.file_path):
+        file_path = upload_session.file_path
+        sheet_cache = upload_session.cached_sheet(payload.get('sheet_name'))
+    
+    result = process_excel_file(file_path, payload['table_name'], payload.get('primary_header'),
+                                payload.get('sheet_name'), periode_date, sheet_cache=sheet_cache,
+                                progress=progress)
+    return result
+
+register_job_handler('upload', _run_upload_job)
+
 @upload_bp.route('/upload', methods=['GET', 'POST'])
 def upload_file():
     if 'username' not in session:
@@ -59,24 +135,14 @@ def upload_file():
     
     elif request.method == 'POST':
         try:
-            if 'file' not in request.files:
-                return jsonify({'success': False, 'message': 'Tidak ada file yang dipilih'})
-            
-            file = request.files['file']
             table_name = request.form.get('table_name', '').strip()
             primary_header = request.form.get('primary_header', '').strip() or None
             sheet_name = request.form.get('sheet_name', '').strip() or None
             periode_date = request.form.get('periode_date', '').strip() or None
             
-            if file.filename == '':
-                return jsonify({'success': False, 'message': 'Tidak ada file yang dipilih'})
-            
             if not table_name:
                 return jsonify({'success': False, 'message': 'Nama tabel harus dipilih'})
             
-            if not allowed_file(file.filename):
-                return jsonify({'success': False, 'message': 'File harus berformat Excel (.xlsx atau .xls)'})
-            
             # Validasi format tanggal periode
             if periode_date:
                 try:
@@ -88,56 +154,152 @@ def upload_file():
             upload_folder = current_app.config['UPLOAD_FOLDER']
             os.makedirs(upload_folder, exist_ok=True)
             
-            filename = secure_filename(file.filename)
+            # Pakai file dari upload session (get-excel-sheets / analyze-excel) bila ada
+            upload_session, error = upload_session_from_request(request, upload_folder)
+            if error:
+                return jsonify({'success': False, 'message': error})
+            
+            # Salinan permanen untuk MasterUploader; session file tetap dipakai untuk proses
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{filename}"
-            file_path = os.path.join(upload_folder, filename)
-            file.save(file_path)
+            filename = f"{timestamp}_{upload_session.filename}"
+            file_path = promote_upload(upload_session, os.path.join(upload_folder, filename))
+            sheet_cache = upload_session.cached_sheet(sheet_name)
+            
+            # Mode async: proses dijalankan job worker, client polling /api/jobs/<id>
+            if request.form.get('async', '').strip().lower() in ('1', 'true', 'yes'):
+                job_id = get_job_queue().enqueue('upload', {
+                    'file_path': file_path,
+                    'filename': filename,
+                    'upload_token': upload_session.token,
+                    'table_name': table_name,
+                    'primary_header': primary_header,
+                    'sheet_name': sheet_name,
+                    'periode_date': periode_date,
+                    'username': session.get('username'),
+                    'division': session.get('division'),
+                    'ip_address': request.remote_addr
+                }, created_by=session.get('username'))
+                insert_audit_trail('upload_queued', f"User '{session.get('username')}' queued upload file '{filename}' (job {job_id}).")
+                return jsonify({
+                    'success': True,
+                    'job_id': job_id,
+                    'status': 'queued',
+                    'status_url': url_for('jobs.get_job_status', job_id=job_id)
+                })
             
             print(f"Periode Date: {periode_date}")
             # Proses file
-            result = process_excel_file(file_path, table_name, primary_header, sheet_name, periode_date)
+            result = process_excel_file(upload_session.file_path, table_name, primary_header, sheet_name, periode_date,
+                                        sheet_cache=sheet_cache)
+            
+            _record_upload(session.get('username'), session.get('division'), table_name, sheet_name,
+                           file_path, periode_date, filename)
             
-            # Simpan ke tabel MasterUploader dengan error handling yang lebih baik
+            return jsonify(result)
+        
+        except Exception as e:
+            logger.error(f"Error in upload_file: {str(e)}")
+            return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+    return redirect(url_for('upload.upload_file'))
+
+@upload_bp.route('/upload-batch', methods=['POST'])
+def upload_batch():
+    """
+    Upload banyak file sekaligus.
+    Form data:
+        files: satu atau lebih file Excel
+        mapping: JSON {"<nama file>": {"<nama sheet>": "<nama template>"}}
+        periode_date: YYYY-MM (opsional, berlaku untuk semua sheet)
+    Returns manifest hasil per sheet.
+    """
+    if 'username' not in session:
+        return jsonify({'success': False, 'message': 'Please log in first.'})
+
+    try:
+        primary_header = request.form.get('primary_header', '').strip() or None
+        periode_date = request.form.get('periode_date', '').strip() or None
+
+        if periode_date:
+            try:
+                periode_date = datetime.strptime(periode_date, '%Y-%m').date().replace(day=1)
+            except ValueError:
+                return jsonify({'success': False, 'message': 'Format tanggal periode tidak valid. Gunakan format YYYY-MM'})
+
+        try:
+            mapping = json.loads(request.form.get('mapping', '') or '{}')
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Format mapping sheet ke template tidak valid'})
+        if not isinstance(mapping, dict) or not mapping:
+            return jsonify({'success': False, 'message': 'Mapping sheet ke template harus diisi'})
+
+        files = [f for f in request.files.getlist('files') if f and f.filename]
+        if not files:
+            return jsonify({'success': False, 'message': 'Tidak ada file yang dipilih'})
+
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        os.makedirs(upload_folder, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        items = []
+        for file in files:
+            sheet_mapping = mapping.get(file.filename)
+            if not isinstance(sheet_mapping, dict) or not sheet_mapping:
+                return jsonify({'success': False, 'message': f'Mapping untuk file "{file.filename}" tidak ditemukan'})
+            if not allowed_file(file.filename):
+                return jsonify({'success': False, 'message': f'File "{file.filename}" harus berformat Excel (.xlsx atau .xls)'})
+
+            upload_session = register_upload(file, upload_folder)
+            for sheet_name, table_name in sheet_mapping.items():
+                if sheet_name not in upload_session.sheets:
+                    return jsonify({'success': False, 'message': f'Sheet "{sheet_name}" tidak ditemukan dalam file "{file.filename}"'})
+                if not table_name:
+                    return jsonify({'success': False, 'message': f'Template untuk sheet "{sheet_name}" harus dipilih'})
+
+            filename = f"{timestamp}_{upload_session.filename}"
+            file_path = promote_upload(upload_session, os.path.join(upload_folder, filename))
+            for sheet_name, table_name in sheet_mapping.items():
+                items.append({
+                    'file_path': upload_session.file_path,
+                    'stored_path': file_path,
+                    'filename': file.filename,
+                    'sheet_name': sheet_name,
+                    'table_name': str(table_name).strip()
+                })
+
+        manifest = process_batch_upload(items, periode_date, primary_header)
+
+        # Catat setiap sheet ke MasterUploader
+        columns = ['username', 'division', 'template', 'sheets', 'file_upload', 'period_date', 'upload_date']
+        for item in items:
             try:
-                print("Attempting to insert to MasterUploader...")
-                
-                # Gunakan fungsi safe_insert_single_record
-                columns = ['username', 'division', 'template', 'sheets', 'file_upload', 'period_date', 'upload_date']
                 values = [
                     session.get('username'),
                     session.get('division'),
-                    table_name,
-                    sheet_name,
-                    file_path,
+                    item['table_name'],
+                    item['sheet_name'],
+                    item['stored_path'],
                     periode_date,
                     datetime.now()
                 ]
-                
-                # Debug data sebelum insert
-                print("Data to be inserted to MasterUploader:")
-                for col, val in zip(columns, values):
-                    print(f"  {col}: {type(val).__name__} = {repr(val)}")
-                
-                insert_success = safe_insert_single_record('MasterUploader', columns, values)
-                insert_audit_trail('upload', f"User '{session.get('username')}' uploaded file '{filename}'.")
-                
-                if not insert_success:
+                if not safe_insert_single_record('MasterUploader', columns, values):
                     logger.warning("Failed to insert to MasterUploader, but continuing with main process")
-                    
             except Exception as e:
-                insert_audit_trail('upload_failed', f"User '{session.get('username')}' failed to upload file '{filename}': {str(e)}")
                 logger.error(f"Gagal insert ke MasterUploader: {str(e)}")
-                # Don't fail the entire process if MasterUploader insert fails
-                logger.warning("Continuing with main process despite MasterUploader insert failure")
-            
-            return jsonify(result)
-        
-        except Exception as e:
-            logger.error(f"Error in upload_file: {str(e)}")
-            return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
-    return redirect(url_for('upload.upload_file'))
+        succeeded = sum(1 for entry in manifest if entry.get('success'))
+        insert_audit_trail('upload_batch', f"User '{session.get('username')}' uploaded {len(files)} file(s), "
+                                           f"{succeeded}/{len(manifest)} sheet berhasil.")
+
+        return jsonify({
+            'success': succeeded == len(manifest),
+            'message': f'{succeeded} dari {len(manifest)} sheet berhasil diproses',
+            'results': manifest
+        })
+
+    except Exception as e:
+        logger.error(f"Error in upload_batch: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
 @upload_bp.route('/analyze-excel', methods=['POST'])
 def analyze_excel():
@@ -147,86 +309,31 @@ def analyze_excel():
         return jsonify({'success': False, 'message': 'Please log in first.'})
     
     try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'message': 'Tidak ada file yang dipilih'})
-        
-        file = request.files['file']
         sheet_name = request.form.get('sheet_name', '').strip() or None
         
-        if file.filename == '':
-            return jsonify({'success': False, 'message': 'Tidak ada file yang dipilih'})
+        # File disimpan sekali per konten; hasil parse sheet di-cache untuk /upload berikutnya
+        upload_session, error = upload_session_from_request(request, current_app.config['UPLOAD_FOLDER'])
+        if error:
+            return jsonify({'success': False, 'message': error})
         
-        if not allowed_file(file.filename):
-            return jsonify({'success': False, 'message': 'File harus berformat Excel (.xlsx atau .xls)'})
+        available_sheets = upload_session.sheets
+        if sheet_name and sheet_name not in available_sheets:
+            return jsonify({'success': False, 'message': f'Sheet "{sheet_name}" tidak ditemukan dalam file Excel'})
+        sheet_used = sheet_name or (available_sheets[0] if available_sheets else 'Sheet pertama')
         
-        # Simpan file temporary
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"analyze_{timestamp}_{filename}"
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        sheet_cache = upload_session.sheet(sheet_name)
+        if sheet_cache.layout is None:
+            return jsonify({'success': False, 'message': f'Error: {sheet_cache.layout_error}'})
         
-        try:
-            # Dapatkan daftar sheet terlebih dahulu
-            available_sheets = get_excel_sheets(file_path)
-            
-            # Baca file Excel dengan sheet yang spesifik atau default
-            if sheet_name:
-                try:
-                    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
-                    sheet_used = sheet_name
-                except ValueError:
-                    return jsonify({'success': False, 'message': f'Sheet "{sheet_name}" tidak ditemukan dalam file Excel'})
-            else:
-                df = pd.read_excel(file_path, header=None)
-                sheet_used = available_sheets[0] if available_sheets else 'Sheet pertama'
-            
-            # Auto-detect header
-            header_row, detected_primary = find_primary_header_row(df)
-            
-            # Get headers
-            excel_headers = []
-            for val in df.iloc[header_row]:
-                if pd.notna(val):
-                    excel_headers.append(str(val).strip())
-                else:
-                    excel_headers.append("")
-            
-            # Find data start row
-            data_start_row = find_data_start_row(df, header_row, detected_primary)
-            total_data_rows = len(df) - data_start_row
-            
-            # Sample data
-            sample_data = []
-            for i in range(data_start_row, min(data_start_row + 3, len(df))):
-                row_sample = []
-                for j in range(min(len(excel_headers), len(df.columns))):
-                    val = df.iloc[i, j]
-                    row_sample.append(str(val) if pd.notna(val) else "")
-                sample_data.append(row_sample)
-            
-            result = {
-                'success': True,
-                'analysis': {
-                    'total_rows': total_data_rows,
-                    'total_columns': len(df.columns),
-                    'header_row': header_row + 1,
-                    'data_start_row': data_start_row + 1,
-                    'detected_primary_header': detected_primary,
-                    'headers': excel_headers,
-                    'sample_data': sample_data,
-                    'data_rows_available': len(df) - data_start_row,
-                    'available_sheets': available_sheets,
-                    'sheet_used': sheet_used
-                }
-            }
-            insert_audit_trail('analyze_excel', f"User '{session.get('username')}' analyze excel.")
-        finally:
-            # Hapus file temporary
-            try:
-                os.remove(file_path)
-            except:
-                pass
+        analysis = sheet_cache.analysis()
+        analysis['available_sheets'] = available_sheets
+        analysis['sheet_used'] = sheet_used
+        result = {
+            'success': True,
+            'upload_token': upload_session.token,
+            'analysis': analysis
+        }
+        insert_audit_trail('analyze_excel', f"User '{session.get('username')}' analyze excel.")
         
         return jsonify(result)
         
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from utils.column_plan import ColumnPlan, compile_table_plan
+from utils.column_validator import validate_dataframe
+
+# Default na_values pd.read_excel: dulu otomatis menjadi NaN sebelum sheet dibaca via openpyxl
+PANDAS_NA_TOKENS = ['nan', 'NaN', '-nan', '-NaN', 'None', '<NA>', '#NA', '#N/A', '#N/A N/A',
+                    'N/A', 'NA', 'NULL', 'null', 'n/a', '1.#IND', '-1.#IND', '1.#QNAN', '-1.#QNAN', '']
+
+
+def _column(name, data_type, **extra):
+    info = {'name': name, 'data_type': data_type, 'max_length': None, 'precision': None,
+            'scale': None, 'is_nullable': True, 'default_value': None}
+    info.update(extra)
+    return info
+
+COLUMNS_INFO = {
+    'amount': _column('amount', 'decimal', precision=18, scale=2),
+    'qty': _column('qty', 'int'),
+    'name': _column('name', 'varchar', max_length=50),
+}
+
+
+def test_pandas_na_tokens_become_null_in_validate_dataframe():
+    tokens = PANDAS_NA_TOKENS + [' nan ']
+    df = pd.DataFrame({'amount': tokens, 'qty': tokens, 'name': tokens}, dtype=object)
+
+    result, errors, _ = validate_dataframe(df, compile_table_plan(COLUMNS_INFO))
+
+    assert errors == []
+    for column in COLUMNS_INFO:
+        assert result[column].isna().all(), column
+
+
+@pytest.mark.parametrize('token', PANDAS_NA_TOKENS)
+@pytest.mark.parametrize('column', sorted(COLUMNS_INFO))
+def test_pandas_na_tokens_become_null_cellwise(column, token):
+    value, is_valid, error = ColumnPlan(column, COLUMNS_INFO[column]).validate(token)
+
+    assert is_valid, error
+    assert value is None
@@ -0,0 +1,211 @@
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+AUDIT_ROLLUP_TABLE = 'SSOT_AUDIT_DAILY_ROLLUP'
+# SQL Server: maks 2100 parameter per statement -> 3 kolom x 500 baris
+_MAX_ROWS_PER_MERGE = 500
+
+_state_lock = threading.Lock()
+_table_ready = False
+# True bila increment rollup pernah gagal di proses ini; dibangun ulang sebelum dibaca
+_rollup_dirty = False
+
+
+def _rollup_select():
+    return f"""
+        INSERT INTO {AUDIT_ROLLUP_TABLE} (action, activity_date, event_count)
+        SELECT action, CAST(changed_at AS DATE), COUNT_BIG(*)
+        FROM SSOT_AUDIT_TRAILS
+        WHERE action IS NOT NULL AND changed_at IS NOT NULL
+        GROUP BY action, CAST(changed_at AS DATE)
+    """
+
+def ensure_rollup_table(cursor):
+    """
+    Buat SSOT_AUDIT_DAILY_ROLLUP bila belum ada (sekali per proses). Tabel baru langsung
+    di-backfill dari SSOT_AUDIT_TRAILS di batch yang sama, sehingga tabel yang sudah ada
+    selalu dianggap lengkap dan selanjutnya cukup di-increment oleh audit writer.
+    Commit sendiri (dipanggil tanpa transaksi yang masih terbuka); flag baru diset setelah commit.
+    """
+    global _table_ready
+    if _table_ready:
+        return
+    cursor.execute(f"""
+        IF OBJECT_ID('dbo.{AUDIT_ROLLUP_TABLE}', 'U') IS NULL
+        BEGIN
+            CREATE TABLE dbo.{AUDIT_ROLLUP_TABLE} (
+                action NVARCHAR(255) NOT NULL,
+                activity_date DATE NOT NULL,
+                event_count BIGINT NOT NULL
+            );
+            CREATE UNIQUE CLUSTERED INDEX UX_{AUDIT_ROLLUP_TABLE}
+                ON dbo.{AUDIT_ROLLUP_TABLE} (action, activity_date);
+            {_rollup_select()};
+        END
+    """)
+    cursor.connection.commit()
+    _table_ready = True
+
+def _event_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+def apply_audit_rollup(cursor, events):
+    """
+    Tambahkan jumlah event (per action + tanggal) ke tabel rollup. Dijalankan di transaksi
+    insert audit trail (setelah prepare_audit_rollup) memakai savepoint: bila gagal hanya
+    increment yang dibatalkan dan rollup ditandai dirty (dibangun ulang sebelum dibaca).
+    """
+    global _rollup_dirty
+    if not _table_ready:
+        # Tabel belum bisa dipastikan ada (lihat prepare_audit_rollup): event tidak terhitung
+        with _state_lock:
+            _rollup_dirty = True
+        return False
+    counts = Counter(
+        (event['action'], _event_date(event['changed_at']))
+        for event in events
+        if event.get('action') and event.get('changed_at')
+    )
+    if not counts:
+        return True
+    try:
+        cursor.execute("SAVE TRANSACTION ssot_audit_rollup")
+        items = list(counts.items())
+        for start in range(0, len(items), _MAX_ROWS_PER_MERGE):
+            chunk = items[start:start + _MAX_ROWS_PER_MERGE]
+            placeholders = ', '.join(['(?, ?, ?)'] * len(chunk))
+            params = [value for (action, day), count in chunk for value in (action, day, count)]
+            cursor.execute(f"""
+                MERGE {AUDIT_ROLLUP_TABLE} WITH (HOLDLOCK) AS target
+                USING (VALUES {placeholders}) AS source (action, activity_date, event_count)
+                ON target.action = source.action AND target.activity_date = source.activity_date
+                WHEN MATCHED THEN
+                    UPDATE SET event_count = target.event_count + source.event_count
+                WHEN NOT MATCHED THEN
+                    INSERT (action, activity_date, event_count)
+                    VALUES (source.action, source.activity_date, source.event_count);
+            """, params)
+        return True
+    except Exception as e:
+        logger.warning(f"Gagal update {AUDIT_ROLLUP_TABLE}: {e}")
+        try:
+            cursor.execute("ROLLBACK TRANSACTION ssot_audit_rollup")
+        except Exception:
+            pass
+        with _state_lock:
+            _rollup_dirty = True
+        return False
+
+def rebuild_audit_rollup(cursor):
+    """Hitung ulang seluruh rollup dari SSOT_AUDIT_TRAILS (backfill manual / setelah increment gagal)."""
+    global _rollup_dirty
+    ensure_rollup_table(cursor)
+    cursor.execute(f"DELETE FROM {AUDIT_ROLLUP_TABLE} WITH (TABLOCKX)")
+    cursor.execute(_rollup_select())
+    cursor.connection.commit()
+    with _state_lock:
+        _rollup_dirty = False
+    logger.info(f"Rebuild {AUDIT_ROLLUP_TABLE} selesai")
+
+def prepare_audit_rollup(cursor):
+    """
+    Pastikan tabel rollup ada di transaksi tersendiri, sebelum event baru di-insert
+    (backfill tabel baru tidak boleh ikut menghitung event yang akan di-increment).
+    Returns True bila tabel siap.
+    """
+    if _table_ready:
+        return True
+    try:
+        ensure_rollup_table(cursor)
+        return True
+    except Exception as e:
+        logger.warning(f"Gagal menyiapkan {AUDIT_ROLLUP_TABLE}: {e}")
+        try:
+            cursor.connection.rollback()
+        except Exception:
+            pass
+        return False
+
+def _ensure_rollup_ready(cursor):
+    """Returns True bila rollup bisa dipakai untuk dibaca."""
+    if not prepare_audit_rollup(cursor):
+        return False
+    if not _rollup_dirty:
+        return True
+    try:
+        rebuild_audit_rollup(cursor)
+        return True
+    except Exception as e:
+        logger.warning(f"{AUDIT_ROLLUP_TABLE} tidak bisa dipakai, data dihitung langsung: {e}")
+        try:
+            cursor.connection.rollback()
+        except Exception:
+            pass
+        return False
+
+def get_monthly_activity(cursor, year, actions):
+    """
+    Jumlah event per bulan untuk action audit tertentu plus upload (MasterUploader) dalam
+    satu query dengan predicate range tanggal (index-friendly).
+    Returns (dict {action: {month: count}}, dict {month: upload_count}).
+    """
+    actions = list(actions)
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    placeholders = ', '.join(['?'] * len(actions))
+    if _ensure_rollup_ready(cursor):
+        audit_sql = f"""
+            SELECT action, MONTH(activity_date), SUM(event_count)
+            FROM {AUDIT_ROLLUP_TABLE}
+            WHERE action IN ({placeholders}) AND activity_date >= ? AND activity_date < ?
+            GROUP BY action, MONTH(activity_date)
+        """
+    else:
+        audit_sql = f"""
+            SELECT action, MONTH(changed_at), COUNT_BIG(*)
+            FROM SSOT_AUDIT_TRAILS
+            WHERE action IN ({placeholders}) AND changed_at >= ? AND changed_at < ?
+            GROUP BY action, MONTH(changed_at)
+        """
+    cursor.execute(f"""
+        SELECT 0, action, month, event_count FROM ({audit_sql}) AS audit (action, month, event_count)
+        UNION ALL
+        SELECT 1, NULL, MONTH(upload_date), COUNT_BIG(*)
+        FROM MasterUploader
+        WHERE upload_date >= ? AND upload_date < ?
+        GROUP BY MONTH(upload_date)
+    """, actions + [start, end, start, end])
+
+    monthly = {action: {} for action in actions}
+    uploads = {}
+    for source, action, month, count in cursor.fetchall():
+        if source == 1:
+            uploads[month] = int(count or 0)
+        elif action in monthly:
+            monthly[action][month] = int(count or 0)
+    return monthly, uploads
+
+def get_action_totals(cursor, actions):
+    """Total event sepanjang waktu per action dari rollup (fallback: SSOT_AUDIT_TRAILS)."""
+    actions = list(actions)
+    placeholders = ', '.join(['?'] * len(actions))
+    if _ensure_rollup_ready(cursor):
+        cursor.execute(f"""
+            SELECT action, SUM(event_count) FROM {AUDIT_ROLLUP_TABLE}
+            WHERE action IN ({placeholders}) GROUP BY action
+        """, actions)
+    else:
+        cursor.execute(f"""
+            SELECT action, COUNT_BIG(*) FROM SSOT_AUDIT_TRAILS
+            WHERE action IN ({placeholders}) GROUP BY action
+        """, actions)
+    totals = {action: 0 for action in actions}
+    totals.update({action: int(count or 0) for action, count in cursor.fetchall() if action in totals})
+    return totals
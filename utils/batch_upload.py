@@ -0,0 +1,305 @@
+import os
+import time
+import uuid
+import pickle
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.db_utils import get_column_info
+from utils.bulk_insert import BulkLoader
+from utils.helpers import process_default_value
+from utils.excel_utils import (
+    MAX_REPORTED_ERRORS, iter_validated_chunks, prepare_sheet_layout, validation_failure
+)
+
+logger = logging.getLogger(__name__)
+
+# Jumlah proses untuk parse + validasi sheet (openpyxl CPU-bound, dibatasi GIL bila memakai thread)
+BATCH_UPLOAD_PARSE_WORKERS = int(os.getenv('BATCH_UPLOAD_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+# Jumlah bulk insert yang berjalan bersamaan (masing-masing memakai satu koneksi pool)
+BATCH_UPLOAD_DB_PARALLELISM = int(os.getenv('BATCH_UPLOAD_DB_PARALLELISM', 2))
+# Folder file spill: chunk hasil validasi ditulis worker ke disk, bukan dikirim ke proses utama
+BATCH_UPLOAD_SPILL_DIR = os.getenv('BATCH_UPLOAD_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'ssot_batch_upload'))
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """
+    Process pool bersama untuk parse sheet. Memakai start method 'spawn' agar proses worker
+    tidak mewarisi thread/koneksi pool database dari proses aplikasi.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                _parse_pool = ProcessPoolExecutor(
+                    max_workers=BATCH_UPLOAD_PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _parse_pool
+
+def shutdown_parse_pool(broken_pool=None):
+    """
+    Hentikan process pool parse. broken_pool: hanya reset bila pool aktif masih pool yang rusak
+    (worker mati, mis. kehabisan memori) agar pool baru tidak ikut dimatikan request lain.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None and (broken_pool is None or _parse_pool is broken_pool):
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+
+def _submit_parse_jobs(jobs):
+    """Submit parse_sheet ke pool; pool yang sudah rusak dari batch sebelumnya dibuat ulang sekali."""
+    for attempt in range(2):
+        parse_pool = get_parse_pool()
+        try:
+            return parse_pool, {parse_pool.submit(parse_sheet, *args): idx for idx, args in jobs}
+        except BrokenProcessPool:
+            if attempt:
+                raise
+            logger.warning("Batch upload: process pool parse rusak, dibuat ulang")
+            shutdown_parse_pool(parse_pool)
+
+
+def _remove_spill(path):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def iter_spilled_chunks(path):
+    """Baca ulang chunk (DataFrame hasil validasi, mask default) dari file spill satu per satu."""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+def parse_sheet(file_path, sheet_name, columns_info, primary_header=None):
+    """
+    Parse + validasi satu sheet tanpa akses database (dijalankan di proses worker).
+    columns_info harus berupa dict biasa agar bisa di-pickle.
+    Chunk hasil validasi ditulis berurutan ke file spill (pickle per chunk) sehingga memori
+    proses utama tidak bertambah sesuai ukuran batch; yang dikembalikan hanya path + counter.
+
+    Returns dict:
+        failure: respons gagal (format process_excel_file) atau None
+        spill_path: file spill berisi chunk (None bila gagal)
+        rows_processed, total_errors, validation_errors, parse_seconds
+    """
+    started = time.perf_counter()
+    layout, rows_iter, error = prepare_sheet_layout(file_path, sheet_name, columns_info, primary_header)
+    if error:
+        return {'failure': error, 'spill_path': None, 'rows_processed': 0, 'total_errors': 0,
+                'validation_errors': [], 'parse_seconds': time.perf_counter() - started}
+
+    os.makedirs(BATCH_UPLOAD_SPILL_DIR, exist_ok=True)
+    spill_path = os.path.join(BATCH_UPLOAD_SPILL_DIR, f"{uuid.uuid4().hex}.chunks")
+    rows_processed = 0
+    column_count = 0
+    total_errors = 0
+    validation_errors = []
+    try:
+        with open(spill_path, 'wb') as spill:
+            for validated_df, chunk_errors, default_masks in iter_validated_chunks(layout, rows_iter, columns_info):
+                rows_processed += len(validated_df)
+                column_count = len(validated_df.columns)
+                total_errors += len(chunk_errors)
+                if len(validation_errors) < MAX_REPORTED_ERRORS:
+                    validation_errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(validation_errors)])
+                pickle.dump((validated_df, default_masks), spill, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        _remove_spill(spill_path)
+        raise
+
+    failure = validation_failure(layout, sheet_name, rows_processed, column_count,
+                                 total_errors, validation_errors)
+    if failure:
+        _remove_spill(spill_path)
+        spill_path = None
+    return {
+        'failure': failure,
+        'spill_path': spill_path,
+        'rows_processed': rows_processed,
+        'total_errors': total_errors,
+        'validation_errors': validation_errors,
+        'parse_seconds': time.perf_counter() - started
+    }
+
+
+def _insert_template(table_name, periode_date, parsed_sheets):
+    """
+    Bulk insert semua sheet untuk satu template dalam satu transaksi
+    (data periode lama dihapus sekali, lalu setiap sheet dimuat berurutan dari file spill,
+    chunk per chunk).
+    """
+    period_value = periode_date or process_default_value("date")
+    loader = BulkLoader(table_name, periode_date, replace_existing=True,
+                        columns_info=get_column_info(table_name, exclude_automatic=False))
+    inserted_per_sheet = []
+    try:
+        with loader:
+            for parsed in parsed_sheets:
+                before = loader.inserted_rows
+                for validated_df, default_masks in iter_spilled_chunks(parsed['spill_path']):
+                    validated_df["period_date"] = period_value
+                    validated_df["upload_date"] = None
+                    default_masks["upload_date"] = True
+                    loader.load(validated_df, default_masks)
+                inserted_per_sheet.append(loader.inserted_rows - before)
+            loader.commit()
+    finally:
+        for parsed in parsed_sheets:
+            _remove_spill(parsed.pop('spill_path', None))
+
+    logger.info(f"Batch upload {table_name}: {loader.inserted_rows} baris ({loader.rows_per_sec} baris/detik)")
+    return loader.result(), inserted_per_sheet
+
+
+def _manifest_entry(item, parsed=None, **extra):
+    entry = {
+        'file': item['filename'],
+        'sheet': item['sheet_name'],
+        'template': item['table_name'],
+    }
+    if parsed is not None:
+        entry['rows_processed'] = parsed['rows_processed']
+        entry['validation_warnings'] = parsed['total_errors']
+        entry['parse_seconds'] = round(parsed['parse_seconds'], 3)
+    entry.update(extra)
+    return entry
+
+def process_batch_upload(items, periode_date=None, primary_header=None):
+    """
+    Proses banyak sheet (dari satu atau beberapa file) sekaligus.
+
+    Args:
+        items: list dict {'file_path', 'filename', 'sheet_name', 'table_name'}
+        periode_date: periode untuk semua sheet
+
+    Parse + validasi berjalan paralel di process pool; chunk hasil validasi disimpan worker di
+    file spill (proses utama hanya memegang path + counter). Setelah semua sheet untuk satu
+    template selesai divalidasi, insert template tersebut dijalankan di thread pool dengan paralelisme
+    maksimal BATCH_UPLOAD_DB_PARALLELISM. Sheet dengan template yang sama dimuat dalam satu
+    transaksi; bila salah satu sheet gagal validasi, template tersebut tidak diinsert.
+
+    Returns list manifest per sheet (urutan sama dengan items).
+    """
+    started = time.perf_counter()
+    manifest = [None] * len(items)
+
+    # Metadata kolom diambil sekali per template di proses utama (dict biasa untuk pickling)
+    columns_by_table = {}
+    pending_by_table = {}
+    for idx, item in enumerate(items):
+        table_name = item['table_name']
+        if table_name not in columns_by_table:
+            try:
+                columns_info = get_column_info(table_name)
+                columns_by_table[table_name] = {name: dict(info) for name, info in columns_info.items()}
+            except Exception as e:
+                logger.warning(f"Batch upload: metadata tabel '{table_name}' gagal diambil: {e}")
+                columns_by_table[table_name] = None
+        if not columns_by_table[table_name]:
+            manifest[idx] = _manifest_entry(
+                item, success=False, status='failed',
+                message=f"Tabel '{table_name}' tidak ditemukan di database."
+            )
+            continue
+        pending_by_table.setdefault(table_name, []).append(idx)
+
+    parse_pool, parse_futures = _submit_parse_jobs([
+        (idx, (items[idx]['file_path'], items[idx]['sheet_name'], columns_by_table[table_name], primary_header))
+        for table_name, indexes in pending_by_table.items() for idx in indexes
+    ])
+
+    parsed_results = {}
+    remaining = {table_name: len(indexes) for table_name, indexes in pending_by_table.items()}
+    insert_futures = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, BATCH_UPLOAD_DB_PARALLELISM),
+                            thread_name_prefix='batch-insert') as insert_pool:
+        for future in as_completed(parse_futures):
+            idx = parse_futures[future]
+            item = items[idx]
+            try:
+                parsed_results[idx] = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # Worker mati di tengah parse: sheet yang belum selesai gagal, pool dibuat ulang
+                    # untuk batch berikutnya
+                    message = 'Proses parse berhenti tidak normal (kemungkinan file terlalu besar/kehabisan memori)'
+                    shutdown_parse_pool(parse_pool)
+                else:
+                    message = f'Gagal memproses file Excel: {e}'
+                logger.exception("Batch upload: parse sheet '%s' gagal: %s", item['sheet_name'], e)
+                parsed_results[idx] = {
+                    'failure': {'success': False, 'message': message},
+                    'spill_path': None, 'rows_processed': 0, 'total_errors': 0,
+                    'validation_errors': [], 'parse_seconds': 0.0
+                }
+
+            table_name = item['table_name']
+            remaining[table_name] -= 1
+            if remaining[table_name]:
+                continue
+
+            # Semua sheet template ini sudah divalidasi
+            indexes = pending_by_table[table_name]
+            failed = [i for i in indexes if parsed_results[i]['failure']]
+            for i in failed:
+                failure = parsed_results[i]['failure']
+                manifest[i] = _manifest_entry(items[i], parsed_results[i], status='failed', **failure)
+            if failed:
+                failed_sheets = ', '.join(f"{items[i]['filename']}:{items[i]['sheet_name']}" for i in failed)
+                for i in indexes:
+                    if i not in failed:
+                        manifest[i] = _manifest_entry(
+                            items[i], parsed_results[i], success=False, status='skipped',
+                            message=f"Tidak diinsert karena sheet lain untuk template '{table_name}' gagal: {failed_sheets}"
+                        )
+                        _remove_spill(parsed_results[i].pop('spill_path', None))
+                continue
+
+            insert_future = insert_pool.submit(
+                _insert_template, table_name, periode_date, [parsed_results[i] for i in indexes]
+            )
+            insert_futures[insert_future] = table_name
+
+        for future in as_completed(insert_futures):
+            table_name = insert_futures[future]
+            indexes = pending_by_table[table_name]
+            try:
+                result, inserted_per_sheet = future.result()
+            except Exception as e:
+                logger.exception("Batch upload: insert ke '%s' gagal: %s", table_name, e)
+                for i in indexes:
+                    manifest[i] = _manifest_entry(
+                        items[i], parsed_results[i], success=False, status='failed',
+                        message=f'Gagal insert ke tabel {table_name}: {e}'
+                    )
+                continue
+
+            for i, inserted in zip(indexes, inserted_per_sheet):
+                manifest[i] = _manifest_entry(
+                    items[i], parsed_results[i], success=True, status='inserted',
+                    inserted_rows=inserted,
+                    message=f"Berhasil insert {inserted} baris ke {table_name}",
+                    transaction={
+                        'inserted_rows': result.get('inserted_rows'),
+                        'rows_per_sec': result.get('rows_per_sec'),
+                    }
+                )
+
+    logger.info(f"Batch upload selesai: {len(items)} sheet dalam {time.perf_counter() - started:.2f} detik")
+    return manifest
@@ -0,0 +1,401 @@
+import os
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyodbc
+
+from config.config import get_db_connection
+from utils.helpers import DATABASE_DEFAULT_MARKER, normalize_value
+from utils.period_stats import refresh_period_stats_safely
+
+logger = logging.getLogger(__name__)
+
+BULK_INSERT_BATCH_SIZE = int(os.getenv('BULK_INSERT_BATCH_SIZE', 1000))
+# Grup baris di atas ambang ini dimuat lewat staging table + INSERT ... SELECT
+BULK_INSERT_STAGING_THRESHOLD = int(os.getenv('BULK_INSERT_STAGING_THRESHOLD', 50000))
+
+# Tipe parameter pyodbc per DATA_TYPE SQL Server, dipakai untuk setinputsizes
+# agar fast_executemany tidak menebak tipe dari baris pertama (yang bisa NULL)
+_SQL_PARAM_TYPES = {
+    'VARCHAR': pyodbc.SQL_WVARCHAR,
+    'NVARCHAR': pyodbc.SQL_WVARCHAR,
+    'CHAR': pyodbc.SQL_WVARCHAR,
+    'NCHAR': pyodbc.SQL_WVARCHAR,
+    'INT': pyodbc.SQL_INTEGER,
+    'BIGINT': pyodbc.SQL_BIGINT,
+    'SMALLINT': pyodbc.SQL_SMALLINT,
+    'TINYINT': pyodbc.SQL_TINYINT,
+    'BIT': pyodbc.SQL_BIT,
+    'DECIMAL': pyodbc.SQL_DOUBLE,
+    'NUMERIC': pyodbc.SQL_DOUBLE,
+    'FLOAT': pyodbc.SQL_DOUBLE,
+    'REAL': pyodbc.SQL_DOUBLE,
+    'MONEY': pyodbc.SQL_DOUBLE,
+    'DATE': pyodbc.SQL_TYPE_DATE,
+    'DATETIME': pyodbc.SQL_TYPE_TIMESTAMP,
+    'DATETIME2': pyodbc.SQL_TYPE_TIMESTAMP,
+    'SMALLDATETIME': pyodbc.SQL_TYPE_TIMESTAMP,
+}
+
+def _input_size(column_info):
+    """Bangun entri setinputsizes dari metadata kolom; None berarti biarkan pyodbc menebak."""
+    if not column_info:
+        return None
+    data_type = (column_info.get('data_type') or '').upper()
+    sql_type = _SQL_PARAM_TYPES.get(data_type)
+    if sql_type is None:
+        return None
+    if sql_type == pyodbc.SQL_WVARCHAR:
+        max_len = column_info.get('max_length')
+        size = max_len if isinstance(max_len, int) and 0 < max_len <= 4000 else 0
+        return (sql_type, size, 0)
+    if sql_type == pyodbc.SQL_TYPE_TIMESTAMP:
+        return (sql_type, 23, 3)
+    return (sql_type, 0, 0)
+
+def _to_param(value):
+    """Konversi skalar numpy/pandas menjadi tipe Python yang bisa di-bind pyodbc."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, str):
+        return value.replace('\x00', '')
+    return value
+
+def _column_params(series):
+    """
+    Siapkan array parameter untuk satu kolom sekaligus (bukan per baris).
+    Semantik sama dengan normalize_value: NaN/'N/A'/'-' menjadi 0 untuk kolom numerik, None selain itu.
+    """
+    dtype = str(series.dtype)
+    if 'int' in dtype or 'float' in dtype:
+        values = series.to_numpy()
+        if 'float' in dtype:
+            values = np.where(np.isnan(values), 0, values)
+        return values.tolist()
+    if dtype == 'bool':
+        return series.astype(int).tolist()
+    if dtype.startswith('datetime64'):
+        return [None if pd.isna(v) else v.to_pydatetime() for v in series]
+    if dtype == 'object':
+        return _object_params(series.to_numpy(dtype=object))
+    return [_to_param(normalize_value(v, dtype)) for v in series.to_numpy(dtype=object)]
+
+# Teks yang dinormalisasi menjadi NULL oleh normalize_value (setelah strip kutip/kurung, uppercase)
+_NULL_PARAM_TEXT = ['N/A', '', 'NONE', 'NULL']
+
+def _object_params(values):
+    """
+    Versi kolumnar normalize_value + _to_param untuk kolom object (hasil validasi):
+    NA menjadi None; string diproses dengan operasi string vektor (teks NULL / '-' menjadi None,
+    karakter NUL dibuang); skalar numpy / Timestamp dikonversi ke tipe Python.
+    """
+    out = values.copy()
+    na = pd.isna(values)
+    out[na] = None
+
+    is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+    if is_str.any():
+        text = pd.Series(values[is_str], dtype=object)
+        stripped = text.str.strip()
+        nullish = (stripped.str.strip("'\"() ").str.upper().isin(_NULL_PARAM_TEXT) | stripped.eq('-')) \
+            & text.ne(DATABASE_DEFAULT_MARKER)
+        cleaned = text.str.replace('\x00', '', regex=False).to_numpy(dtype=object)
+        cleaned[nullish.to_numpy(dtype=bool)] = None
+        out[is_str] = cleaned
+
+    other = np.flatnonzero(~(na | is_str))
+    if len(other):
+        out[other] = [_to_param(v) for v in values[other]]
+    return out.tolist()
+
+def _default_marker_mask(series):
+    if series.dtype != object:
+        return np.zeros(len(series), dtype=bool)
+    return series.eq(DATABASE_DEFAULT_MARKER).to_numpy(dtype=bool)
+
+def _signature_groups(default_matrix):
+    """
+    Partisi baris berdasarkan pola kolom default dalam satu pass: setiap baris dipadatkan
+    menjadi key bytes (np.packbits), lalu dikelompokkan dengan np.unique pada key 1-D.
+    Returns list (signature bool per kolom, index baris) urut berdasarkan kemunculan pertama.
+    """
+    packed = np.packbits(default_matrix, axis=1)
+    keys = np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).reshape(-1)
+    _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind='stable')
+    members = np.split(order, np.cumsum(counts)[:-1])
+    groups = [(default_matrix[first[g]], members[g]) for g in np.argsort(first)]
+    return groups
+
+
+class BulkLoader:
+    """
+    Mesin bulk insert berbasis set untuk tabel template.
+
+    - Baris dikelompokkan berdasarkan signature kolom default database
+      (__USE_DATABASE_DEFAULT__), sehingga setiap kelompok memakai satu prepared statement.
+    - Jalur cepat: fast_executemany dengan parameter yang sudah bertipe, per batch.
+    - Jalur besar: executemany ke staging table (#temp) lalu satu INSERT ... SELECT.
+    - Batch yang gagal diulang per baris agar baris valid lainnya tetap masuk
+      (perilaku sama dengan insert per baris sebelumnya).
+
+    Semua batch berjalan dalam satu transaksi; commit()/rollback() dipanggil oleh pemanggil.
+    """
+
+    def __init__(self, table_name, periode_date=None, replace_existing=True, columns_info=None,
+                 batch_size=None, staging_threshold=None, maintain_stats=True):
+        self.table_name = table_name
+        self.periode_date = periode_date
+        self.replace_existing = replace_existing
+        self.columns_info = {k.lower(): v for k, v in (columns_info or {}).items()}
+        self.batch_size = batch_size or BULK_INSERT_BATCH_SIZE
+        self.staging_threshold = staging_threshold or BULK_INSERT_STAGING_THRESHOLD
+        self.maintain_stats = maintain_stats
+
+        self.conn = None
+        self.cursor = None
+        self.inserted_rows = 0
+        self.skipped_rows = 0
+        self.total_rows = 0
+        self.insert_seconds = 0.0
+        self.columns_seen = []
+        self.columns_with_defaults = []
+        self.modes_used = set()
+        self._staging_seq = 0
+
+    # ------------------------------------------------------------------
+    # Transaction lifecycle
+    # ------------------------------------------------------------------
+    def begin(self):
+        self.conn = get_db_connection()
+        self.cursor = self.conn.cursor()
+
+        if self.replace_existing and self.periode_date:
+            delete_query = f"DELETE FROM {self.table_name} WHERE period_date = ?"
+            self.cursor.execute(delete_query, (self.periode_date,))
+            logger.info(f"Data sebelumnya dengan periode {self.periode_date} telah dihapus dari {self.table_name}")
+        else:
+            # Pastikan transaksi implisit sudah aktif agar SAVE TRANSACTION bisa dipakai
+            self.cursor.execute(f"SELECT TOP 0 1 FROM {self.table_name}")
+        return self
+
+    def commit(self):
+        # Statistik periode (SSOT_TEMPLATE_PERIOD_STATS) diperbarui di transaksi yang sama
+        if self.maintain_stats:
+            refresh_period_stats_safely(self.cursor, self.table_name, self.periode_date)
+        self.conn.commit()
+
+    def rollback(self):
+        if self.conn:
+            try:
+                self.conn.rollback()
+            except Exception as e:
+                logger.warning(f"Rollback bulk insert gagal: {e}")
+
+    def close(self):
+        if self.cursor:
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
+            self.cursor = None
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.rollback()
+        self.close()
+        return False
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def load(self, df, default_masks=None):
+        """
+        Insert satu DataFrame (atau satu chunk). Mengembalikan jumlah baris yang berhasil.
+
+        default_masks: {kolom: array bool atau True untuk seluruh baris} dari validate_dataframe,
+        menandai sel yang diisi DEFAULT database. Bila None, sel default dicari dari
+        penanda string DATABASE_DEFAULT_MARKER di DataFrame.
+        """
+        n_rows = len(df)
+        if n_rows == 0:
+            return 0
+
+        started = time.perf_counter()
+        columns = [str(c) for c in df.columns]
+        for col in columns:
+            if col not in self.columns_seen:
+                self.columns_seen.append(col)
+
+        if default_masks is None:
+            default_matrix = np.column_stack([_default_marker_mask(df[c]) for c in df.columns])
+        else:
+            default_matrix = np.zeros((n_rows, len(columns)), dtype=bool)
+            for pos, col in enumerate(df.columns):
+                mask = default_masks.get(col)
+                if mask is not None:
+                    default_matrix[:, pos] = mask
+        for col, has_default in zip(columns, default_matrix.any(axis=0)):
+            if has_default and col not in self.columns_with_defaults:
+                self.columns_with_defaults.append(col)
+        if self.columns_with_defaults:
+            logger.info(f"Kolom dengan database default: {self.columns_with_defaults}")
+
+        params_by_column = [_column_params(df[c]) for c in df.columns]
+
+        # Kelompokkan baris berdasarkan pola kolom default (signature)
+        if default_matrix.any():
+            groups = _signature_groups(default_matrix)
+        else:
+            groups = [(default_matrix[0], None)]
+
+        inserted = 0
+        for signature, row_idx in groups:
+            keep = [i for i, is_default in enumerate(signature) if not is_default]
+            group_rows = n_rows if row_idx is None else len(row_idx)
+            inserted += self._load_group(columns, keep, params_by_column, row_idx, group_rows)
+
+        self.total_rows += n_rows
+        self.inserted_rows += inserted
+        self.skipped_rows += n_rows - inserted
+        self.insert_seconds += time.perf_counter() - started
+        return inserted
+
+    def _load_group(self, columns, keep, params_by_column, row_idx, n_rows):
+        insert_columns = [columns[i] for i in keep]
+        column_lists = [params_by_column[i] for i in keep]
+        if row_idx is not None:
+            column_lists = [[values[i] for i in row_idx] for values in column_lists]
+
+        placeholders = ['?'] * len(insert_columns)
+        input_sizes = [_input_size(self.columns_info.get(c.lower())) for c in insert_columns]
+
+        # Kolom otomatis (hindari duplikasi)
+        if 'period_date' not in insert_columns:
+            insert_columns.append('period_date')
+            placeholders.append('?')
+            column_lists.append([self.periode_date] * n_rows)
+            input_sizes.append((pyodbc.SQL_TYPE_DATE, 0, 0))
+        include_upload_date = 'upload_date' not in insert_columns
+
+        rows = list(zip(*column_lists))
+        if not rows:
+            logger.warning("Tidak ada kolom untuk diinsert, kelompok baris dilewati")
+            return 0
+
+        if n_rows >= self.staging_threshold:
+            try:
+                return self._load_via_staging(insert_columns, input_sizes, rows, include_upload_date)
+            except Exception as e:
+                logger.warning(f"Staging load gagal untuk {self.table_name}, fallback ke fast_executemany: {e}")
+
+        column_sql = ', '.join(f'[{c}]' for c in insert_columns)
+        value_sql = ', '.join(placeholders)
+        if include_upload_date:
+            column_sql += ', [upload_date]'
+            value_sql += ', GETDATE()'
+        insert_query = f"INSERT INTO {self.table_name} ({column_sql}) VALUES ({value_sql})"
+        logger.debug(f"Bulk insert query: {insert_query}")
+
+        inserted = 0
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            inserted += self._execute_batch(insert_query, input_sizes, batch, start)
+        self.modes_used.add('fast_executemany')
+        return inserted
+
+    def _execute_batch(self, insert_query, input_sizes, batch, offset):
+        self.cursor.execute("SAVE TRANSACTION ssot_bulk_batch")
+        try:
+            self.cursor.fast_executemany = True
+            self.cursor.setinputsizes(input_sizes)
+            self.cursor.executemany(insert_query, batch)
+            return len(batch)
+        except Exception as batch_error:
+            logger.warning(f"Batch insert gagal ({batch_error}), mengulang {len(batch)} baris satu per satu")
+            self.cursor.execute("ROLLBACK TRANSACTION ssot_bulk_batch")
+        finally:
+            self.cursor.fast_executemany = False
+            self.cursor.setinputsizes(None)
+
+        inserted = 0
+        for i, row in enumerate(batch):
+            try:
+                self.cursor.execute(insert_query, row)
+                inserted += 1
+            except Exception as row_error:
+                logger.error(f"Error inserting row {offset + i + 1}: {str(row_error)}")
+                continue
+        return inserted
+
+    def _load_via_staging(self, insert_columns, input_sizes, rows, include_upload_date):
+        self._staging_seq += 1
+        staging = f"#ssot_stage_{self._staging_seq}"
+        column_sql = ', '.join(f'[{c}]' for c in insert_columns)
+
+        self.cursor.execute("SAVE TRANSACTION ssot_bulk_stage")
+        try:
+            # Struktur staging mengikuti tipe kolom tabel tujuan
+            self.cursor.execute(f"SELECT TOP 0 {column_sql} INTO {staging} FROM {self.table_name}")
+            stage_insert = f"INSERT INTO {staging} ({column_sql}) VALUES ({', '.join(['?'] * len(insert_columns))})"
+            self.cursor.fast_executemany = True
+            self.cursor.setinputsizes(input_sizes)
+            for start in range(0, len(rows), self.batch_size):
+                self.cursor.executemany(stage_insert, rows[start:start + self.batch_size])
+            self.cursor.fast_executemany = False
+            self.cursor.setinputsizes(None)
+
+            select_sql = column_sql
+            target_sql = column_sql
+            if include_upload_date:
+                target_sql += ', [upload_date]'
+                select_sql += ', GETDATE()'
+            self.cursor.execute(f"INSERT INTO {self.table_name} ({target_sql}) SELECT {select_sql} FROM {staging}")
+            inserted = self.cursor.rowcount
+            self.cursor.execute(f"DROP TABLE {staging}")
+        except Exception:
+            self.cursor.fast_executemany = False
+            self.cursor.setinputsizes(None)
+            self.cursor.execute("ROLLBACK TRANSACTION ssot_bulk_stage")
+            raise
+
+        self.modes_used.add('staging')
+        return inserted if inserted is not None and inserted >= 0 else len(rows)
+
+    # ------------------------------------------------------------------
+    # Result
+    # ------------------------------------------------------------------
+    @property
+    def rows_per_sec(self):
+        if self.insert_seconds <= 0:
+            return 0.0
+        return round(self.inserted_rows / self.insert_seconds, 1)
+
+    def result(self, upload_date=None):
+        upload_date = upload_date or datetime.now()
+        return {
+            'success': True,
+            'message': f'Berhasil insert {self.inserted_rows} baris data',
+            'inserted_rows': self.inserted_rows,
+            'skipped_rows': self.skipped_rows,
+            'error_rows': 0,
+            'columns_used': [c for c in self.columns_seen if c not in self.columns_with_defaults],
+            'columns_with_defaults': list(self.columns_with_defaults),
+            'periode_date': self.periode_date,
+            'upload_date': upload_date.strftime('%Y-%m-%d %H:%M:%S'),
+            'insert_mode': '+'.join(sorted(self.modes_used)) or None,
+            'insert_seconds': round(self.insert_seconds, 3),
+            'rows_per_sec': self.rows_per_sec
+        }
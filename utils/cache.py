@@ -0,0 +1,82 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Cache in-process thread-safe dengan TTL dan batas jumlah entri (LRU).
+    on_evict(key, value) dipanggil ketika entri kedaluwarsa, dibuang karena penuh, atau dihapus.
+    """
+
+    def __init__(self, ttl, max_entries=None, on_evict=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None, touch=False):
+        evicted = []
+        with self._lock:
+            self._purge_locked(evicted)
+            item = self._data.get(key)
+            if item is None:
+                value = default
+            else:
+                value = item[1]
+                self._data.move_to_end(key)
+                if touch:
+                    self._data[key] = (time.monotonic() + self.ttl, value)
+        self._notify(evicted)
+        return value
+
+    def set(self, key, value, ttl=None):
+        evicted = []
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None and old[1] is not value:
+                evicted.append((key, old[1]))
+            self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._purge_locked(evicted)
+            while self.max_entries and len(self._data) > self.max_entries:
+                k, (_, v) = self._data.popitem(last=False)
+                evicted.append((k, v))
+        self._notify(evicted)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None:
+            return default
+        self._notify([(key, item[1])])
+        return item[1]
+
+    def clear(self):
+        with self._lock:
+            items = [(k, v) for k, (_, v) in self._data.items()]
+            self._data.clear()
+        self._notify(items)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def _purge_locked(self, evicted):
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _) in self._data.items() if expires_at <= now]
+        for k in expired:
+            evicted.append((k, self._data.pop(k)[1]))
+
+    def _notify(self, evicted):
+        if not self.on_evict:
+            return
+        for key, value in evicted:
+            try:
+                self.on_evict(key, value)
+            except Exception:
+                pass
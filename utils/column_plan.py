@@ -0,0 +1,211 @@
+import re
+import math
+import logging
+import threading
+from datetime import datetime, date
+
+from utils.helpers import DATABASE_DEFAULT_MARKER, NULL_TEXT_VALUES, handle_null_values_for_column
+from utils.db_utils import get_column_info
+from utils.schema_cache import schema_version
+from utils.column_validator import (
+    DATE_FORMATS, DATE_TYPES, INTEGER_TYPES, NUMERIC_TYPES, STRING_TYPES,
+    KIND_BIT, KIND_DATE, KIND_INTEGER, KIND_NUMERIC, KIND_OTHER, KIND_STRING
+)
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_NOISE = re.compile(r'[,\s]')
+_BIT_TRUE = frozenset(('1', 'true', 'yes', 'y', 'on'))
+_BIT_FALSE = frozenset(('0', 'false', 'no', 'n', 'off'))
+# Sama dengan handle_null_values_for_column (termasuk default na_values pandas)
+_NULL_TEXT = NULL_TEXT_VALUES
+
+
+def _is_null_cell(value):
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return math.isnan(value)
+    if isinstance(value, str):
+        return value.strip() in _NULL_TEXT
+    return False
+
+def _column_kind(col_type):
+    if col_type in STRING_TYPES:
+        return KIND_STRING
+    if col_type == 'BIT':
+        return KIND_BIT
+    if col_type in INTEGER_TYPES:
+        return KIND_INTEGER
+    if col_type in NUMERIC_TYPES:
+        return KIND_NUMERIC
+    if col_type in DATE_TYPES:
+        return KIND_DATE
+    return KIND_OTHER
+
+# ----------------------------------------------------------------------
+# Converter per tipe untuk nilai non-NULL; hasil (nilai, valid, pesan) identik dengan
+# validate_and_convert_value, tetapi dispatch tipe dilakukan sekali saat plan dibuat.
+# ----------------------------------------------------------------------
+def _string_converter(max_length):
+    limit = max_length if max_length and isinstance(max_length, int) else None
+
+    def convert(value):
+        s = str(value).strip()
+        if limit is not None and len(s) > limit:
+            return None, False, f"String length ({len(s)}) exceeds max {limit}"
+        return s, True, ''
+    return convert
+
+def _bit_converter():
+    def convert(value):
+        if isinstance(value, bool):
+            return value, True, ''
+        s = str(value).strip().lower()
+        if s in _BIT_TRUE:
+            return True, True, ''
+        if s in _BIT_FALSE:
+            return False, True, ''
+        return None, False, f"Invalid boolean: '{value}'"
+    return convert
+
+def _integer_converter():
+    def convert(value):
+        cleaned = _NUMBER_NOISE.sub('', value) if isinstance(value, str) else value
+        try:
+            return int(float(cleaned)), True, ''
+        except Exception:
+            return None, False, f"Invalid integer: '{value}'"
+    return convert
+
+def _numeric_converter():
+    def convert(value):
+        cleaned = _NUMBER_NOISE.sub('', value) if isinstance(value, str) else value
+        try:
+            f = float(cleaned)
+        except Exception:
+            return None, False, f"Invalid numeric: '{value}'"
+        if not math.isfinite(f):
+            return None, False, f"Invalid numeric (inf/NaN): '{value}'"
+        return f, True, ''
+    return convert
+
+def _date_converter(col_type):
+    as_date = col_type == 'DATE'
+    strptime = datetime.strptime
+
+    def convert(value):
+        if isinstance(value, (datetime, date)):
+            return value, True, ''
+        s = str(value).strip()
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = strptime(s, fmt)
+            except ValueError:
+                continue
+            return (parsed.date() if as_date else parsed), True, ''
+        return None, False, f"Invalid date format: '{value}'"
+    return convert
+
+def _other_converter():
+    def convert(value):
+        return str(value).strip(), True, ''
+    return convert
+
+
+class ColumnPlan:
+    """
+    Rencana validasi satu kolom yang dikompilasi sekali dari metadata kolom:
+    jenis kolom, hasil untuk sel NULL (NULL / DEFAULT / error) dan converter sel non-NULL.
+    """
+
+    __slots__ = ('name', 'info', 'col_type', 'kind', 'max_length', 'null_result', '_convert')
+
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+        self.col_type = (info.get('data_type') or '').upper()
+        self.kind = _column_kind(self.col_type)
+        self.max_length = info.get('max_length')
+
+        if self.kind == KIND_STRING:
+            self._convert = _string_converter(self.max_length)
+        elif self.kind == KIND_BIT:
+            self._convert = _bit_converter()
+        elif self.kind == KIND_INTEGER:
+            self._convert = _integer_converter()
+        elif self.kind == KIND_NUMERIC:
+            self._convert = _numeric_converter()
+        elif self.kind == KIND_DATE:
+            self._convert = _date_converter(self.col_type)
+        else:
+            self._convert = _other_converter()
+
+        self.null_result = self._resolve_null()
+
+    def _resolve_null(self):
+        """Hasil validasi sel NULL; sama untuk semua baris sehingga cukup dihitung sekali."""
+        try:
+            processed = handle_null_values_for_column(None, self.info)
+        except ValueError as ve:
+            return None, False, str(ve)
+        if isinstance(processed, str) and processed == DATABASE_DEFAULT_MARKER:
+            return processed, True, ''
+        if processed is None:
+            return None, True, ''
+        return self.convert(processed)
+
+    def validate(self, value):
+        """Validasi satu sel (termasuk NULL); setara validate_and_convert_value."""
+        if _is_null_cell(value):
+            return self.null_result
+        return self.convert(value)
+
+    def convert(self, value):
+        """Validasi + konversi satu sel non-NULL. Returns (nilai, valid, pesan error)."""
+        try:
+            return self._convert(value)
+        except ValueError as ve:
+            return None, False, str(ve)
+        except Exception as exc:
+            logger.exception("Conversion error for column %s: %s", self.name, exc)
+            return None, False, f"Type conversion error: {exc}"
+
+
+class TablePlan:
+    """Kumpulan ColumnPlan untuk satu set kolom (urutan mengikuti columns_info)."""
+
+    def __init__(self, columns_info):
+        self.columns = tuple(ColumnPlan(name, info) for name, info in columns_info.items())
+        self.by_name = {column.name: column for column in self.columns}
+
+    def get(self, name):
+        column = self.by_name.get(name)
+        if column is None:
+            # Kolom tanpa metadata divalidasi sebagai teks (sama dengan columns_info kosong)
+            column = ColumnPlan(name, {})
+            self.by_name[name] = column
+        return column
+
+
+def compile_table_plan(columns_info):
+    return TablePlan(columns_info)
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+def get_table_plan(table_name, exclude_automatic=True):
+    """
+    TablePlan untuk tabel dari get_column_info, di-cache per versi schema
+    (dibuat ulang otomatis setelah schema_version() berubah).
+    """
+    version = schema_version()
+    key = (table_name.lower(), exclude_automatic)
+    cached = _plans.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    plan = compile_table_plan(get_column_info(table_name, exclude_automatic=exclude_automatic))
+    with _plans_lock:
+        _plans[key] = (version, plan)
+    return plan
@@ -0,0 +1,354 @@
+import re
+import logging
+from collections import Counter
+from datetime import datetime, date
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.helpers import DATABASE_DEFAULT_MARKER, NULL_TEXT_VALUES
+
+logger = logging.getLogger(__name__)
+
+STRING_TYPES = ('VARCHAR', 'NVARCHAR', 'CHAR', 'NCHAR', 'TEXT')
+INTEGER_TYPES = ('INT', 'BIGINT', 'SMALLINT', 'TINYINT')
+NUMERIC_TYPES = ('DECIMAL', 'NUMERIC', 'FLOAT', 'REAL', 'MONEY')
+DATE_TYPES = ('DATE', 'DATETIME', 'DATETIME2', 'SMALLDATETIME')
+
+# Jenis kolom hasil kompilasi plan (utils.column_plan.ColumnPlan.kind)
+KIND_STRING = 'string'
+KIND_BIT = 'bit'
+KIND_INTEGER = 'integer'
+KIND_NUMERIC = 'numeric'
+KIND_DATE = 'date'
+KIND_OTHER = 'other'
+
+# Urutan harus sama dengan validate_and_convert_value agar hasil parse identik
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f',
+    '%d/%m/%Y', '%m/%d/%Y', '%Y/%m/%d',
+    '%d-%m-%Y', '%m-%d-%Y', '%Y%m%d',
+    '%d.%m.%Y', '%m.%d.%Y',
+    '%Y-%m-%d %H:%M', '%d/%m/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S', '%Y/%m/%d %H:%M:%S'
+]
+
+# Inferensi format tanggal: jumlah sel sampel per kolom dan porsi minimal format pemenang
+DATE_SAMPLE_SIZE = 64
+DATE_INFER_MIN_SHARE = 0.6
+# Sisa sel yang tidak cocok format hasil inferensi; bila tidak lebih dari ini langsung diproses per sel
+DATE_CELLWISE_STRAGGLERS = 256
+
+NULL_INDICATORS = sorted(NULL_TEXT_VALUES)
+
+BIT_VALUES = {
+    '1': True, 'true': True, 'yes': True, 'y': True, 'on': True,
+    '0': False, 'false': False, 'no': False, 'n': False, 'off': False,
+}
+
+# Batas aman konversi float -> int64 tanpa overflow
+_INT64_LIMIT = 9.2e18
+
+
+def _type_mask(values, types, exclude=()):
+    return np.fromiter(
+        (isinstance(v, types) and not isinstance(v, exclude) for v in values),
+        dtype=bool, count=len(values)
+    )
+
+def _null_mask(values, is_str):
+    """NaN/None/NaT atau string yang (setelah strip) termasuk NULL_INDICATORS."""
+    mask = pd.isna(values)
+    if is_str.any():
+        stripped = pd.Series(values[is_str], dtype=object).str.strip()
+        mask[is_str] |= stripped.isin(NULL_INDICATORS).to_numpy()
+    return mask
+
+def _validate_strings(values, column_info):
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    out = text.to_numpy(dtype=object)
+    max_len = column_info.get('max_length')
+    if max_len and isinstance(max_len, int):
+        lengths = text.str.len().to_numpy()
+        too_long = np.flatnonzero(lengths > max_len)
+        messages = [f"String length ({lengths[i]}) exceeds max {max_len}" for i in too_long]
+        out[too_long] = None
+        return out, too_long, messages
+    return out, np.empty(0, dtype=np.intp), []
+
+def _validate_bits(values):
+    mapped = pd.Series(values, dtype=object).astype(str).str.strip().str.lower().map(BIT_VALUES)
+    invalid = np.flatnonzero(mapped.isna().to_numpy())
+    out = mapped.to_numpy(dtype=object)
+    out[invalid] = None
+    messages = [f"Invalid boolean: '{values[i]}'" for i in invalid]
+    return out, invalid, messages
+
+def _parse_numbers(values):
+    """
+    Parse angka untuk satu kolom sekaligus. String dibersihkan dari koma/spasi seperti
+    re.sub(r'[,\\s]', '', ...). Mengembalikan (float array, mask sel yang berhasil).
+    Sel selain string/angka (datetime, bool, dll) dianggap gagal agar diproses cell-wise.
+    """
+    n = len(values)
+    numbers = np.full(n, np.nan)
+    is_str = _type_mask(values, str)
+    is_num = _type_mask(values, (int, float, np.number), (bool, np.bool_))
+
+    if is_num.any():
+        numbers[is_num] = pd.to_numeric(pd.Series(values[is_num], dtype=object), errors='coerce').to_numpy(dtype=float)
+    if is_str.any():
+        cleaned = pd.Series(values[is_str], dtype=object).str.replace(r'[,\s]', '', regex=True)
+        numbers[is_str] = pd.to_numeric(cleaned, errors='coerce').to_numpy(dtype=float)
+
+    ok = (is_str | is_num) & np.isfinite(numbers)
+    return numbers, ok
+
+def _validate_integers(values):
+    numbers, ok = _parse_numbers(values)
+    ok &= np.abs(numbers) < _INT64_LIMIT
+    out = np.empty(len(values), dtype=object)
+    out[ok] = np.trunc(numbers[ok]).astype(np.int64).tolist()
+    return out, ok
+
+def _validate_decimals(values):
+    numbers, ok = _parse_numbers(values)
+    out = np.empty(len(values), dtype=object)
+    out[ok] = numbers[ok].tolist()
+    return out, ok
+
+def _date_format_shape(fmt):
+    # Format dengan bentuk sama (mis. %d/%m/%Y dan %m/%d/%Y) bisa cocok untuk teks yang sama
+    return re.sub(r'%[dmHMS]', 'n', fmt)
+
+_DATE_FORMAT_SHAPES = {fmt: _date_format_shape(fmt) for fmt in DATE_FORMATS}
+
+def _matching_formats(text):
+    matches = []
+    for fmt in DATE_FORMATS:
+        try:
+            datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        matches.append(fmt)
+    return matches
+
+def infer_date_format(text):
+    """
+    Tebak format tanggal satu kolom dari sampel sel teks (tersebar merata, maksimal
+    DATE_SAMPLE_SIZE). Setiap format dihitung berapa sel sampel yang cocok; format yang cocok
+    paling banyak (seri: yang lebih awal di DATE_FORMATS) dipakai bila mencakup minimal
+    DATE_INFER_MIN_SHARE sampel. Dengan begitu kolom %m/%d/%Y tetap terdeteksi walaupun
+    sebagian tanggalnya juga valid sebagai %d/%m/%Y.
+    Returns None bila tidak ada format yang dominan (kolom campuran / bukan tanggal).
+    """
+    n = len(text)
+    if n == 0:
+        return None
+    picks = np.unique(np.linspace(0, n - 1, num=min(n, DATE_SAMPLE_SIZE)).astype(np.intp))
+    votes = Counter(fmt for i in picks for fmt in _matching_formats(text[i]))
+    if not votes:
+        return None
+    best = max(votes.values())
+    if best < DATE_INFER_MIN_SHARE * len(picks):
+        return None
+    return next(fmt for fmt in DATE_FORMATS if votes.get(fmt) == best)
+
+def _parse_dates(text, fmt):
+    parsed = pd.to_datetime(pd.Series(text, dtype=object), format=fmt, errors='coerce')
+    return parsed, parsed.notna().to_numpy()
+
+def _validate_dates(values, col_type):
+    """
+    Nilai datetime/date dipakai apa adanya. Untuk teks, format kolom ditebak dari sampel
+    (infer_date_format) lalu seluruh kolom di-parse sekali dengan format tersebut; sel yang
+    juga cocok dengan format sebentuk yang lebih awal di DATE_FORMATS tetap memakai format itu
+    (format pertama yang cocok menang, sama dengan validasi per sel). Sisa sel dicoba per format
+    secara berurutan, atau dikembalikan sebagai gagal agar diproses per sel bila jumlahnya sedikit.
+    """
+    n = len(values)
+    out = np.empty(n, dtype=object)
+    ok = _type_mask(values, (datetime, date))
+    out[ok] = values[ok]
+
+    pending = np.flatnonzero(~ok)
+    if len(pending) == 0:
+        return out, ok
+
+    def assign(stamps, rows):
+        stamps = pd.DatetimeIndex(stamps)
+        out[rows] = list(stamps.date if col_type == 'DATE' else stamps.to_pydatetime())
+        ok[rows] = True
+
+    text = pd.Series(values[pending], dtype=object).astype(str).str.strip().to_numpy(dtype=object)
+    inferred = infer_date_format(text)
+    if inferred is not None:
+        parsed, hit = _parse_dates(text, inferred)
+        stamps = parsed[hit].reset_index(drop=True)
+        hit_text = text[hit]
+        shape = _DATE_FORMAT_SHAPES[inferred]
+        earlier = [fmt for fmt in DATE_FORMATS[:DATE_FORMATS.index(inferred)] if _DATE_FORMAT_SHAPES[fmt] == shape]
+        for fmt in reversed(earlier):
+            alternative, _ = _parse_dates(hit_text, fmt)
+            stamps = alternative.where(alternative.notna(), stamps)
+        if hit.any():
+            assign(stamps, pending[hit])
+        pending = pending[~hit]
+        text = text[~hit]
+        if len(pending) <= DATE_CELLWISE_STRAGGLERS:
+            return out, ok
+
+    for fmt in DATE_FORMATS:
+        if len(pending) == 0:
+            break
+        parsed, hit = _parse_dates(text, fmt)
+        if not hit.any():
+            continue
+        assign(parsed[hit], pending[hit])
+        pending = pending[~hit]
+        text = text[~hit]
+    return out, ok
+
+def _is_default_marker(value):
+    return isinstance(value, str) and value == DATABASE_DEFAULT_MARKER
+
+def _validate_column(values, column):
+    """
+    Validasi satu kolom dengan ColumnPlan (utils.column_plan). Mengembalikan (nilai terkonversi,
+    index baris error, pesan error, mask default). Sel yang memakai DEFAULT database bernilai
+    None di hasil dan ditandai True pada mask default (None bila kolom tidak punya sel default).
+    Sel yang tidak bisa ditangani jalur vektor diproses ulang dengan column.convert
+    sehingga pesan error dan hasil konversi tetap sama dengan validasi per sel.
+    """
+    n = len(values)
+    out = np.empty(n, dtype=object)
+    err_idx: List[np.ndarray] = []
+    err_msgs: List[str] = []
+    default_mask = None
+
+    is_str = _type_mask(values, str)
+    null = _null_mask(values, is_str)
+
+    if null.any():
+        # Hasil untuk sel kosong sama untuk seluruh kolom: NULL, default, atau error (dihitung di plan)
+        null_value, null_ok, null_msg = column.null_result
+        null_idx = np.flatnonzero(null)
+        if null_ok and _is_default_marker(null_value):
+            default_mask = null.copy()
+        elif null_ok:
+            out[null_idx] = [null_value] * len(null_idx)
+        else:
+            err_idx.append(null_idx)
+            err_msgs.extend([null_msg] * len(null_idx))
+
+    rest = np.flatnonzero(~null)
+    if len(rest) == 0:
+        return out, _concat_idx(err_idx), err_msgs, default_mask
+
+    kind = column.kind
+    sub = values[rest]
+    fallback = None
+
+    if kind == KIND_STRING:
+        converted, bad, messages = _validate_strings(sub, column.info)
+        out[rest] = converted
+        if len(bad):
+            err_idx.append(rest[bad])
+            err_msgs.extend(messages)
+    elif kind == KIND_BIT:
+        converted, bad, messages = _validate_bits(sub)
+        out[rest] = converted
+        if len(bad):
+            err_idx.append(rest[bad])
+            err_msgs.extend(messages)
+    elif kind == KIND_INTEGER:
+        converted, ok = _validate_integers(sub)
+        out[rest] = converted
+        fallback = rest[~ok]
+    elif kind == KIND_NUMERIC:
+        converted, ok = _validate_decimals(sub)
+        out[rest] = converted
+        fallback = rest[~ok]
+    elif kind == KIND_DATE:
+        converted, ok = _validate_dates(sub, column.col_type)
+        out[rest] = converted
+        fallback = rest[~ok]
+    else:
+        out[rest] = pd.Series(sub, dtype=object).astype(str).str.strip().to_numpy(dtype=object)
+
+    # Straggler: sel yang gagal di jalur vektor diproses per sel untuk pesan yang persis sama
+    if fallback is not None and len(fallback):
+        bad_rows = []
+        convert = column.convert
+        for i in fallback:
+            value, is_valid, error_msg = convert(values[i])
+            if is_valid:
+                out[i] = value
+            else:
+                out[i] = None
+                bad_rows.append(i)
+                err_msgs.append(error_msg)
+        if bad_rows:
+            err_idx.append(np.asarray(bad_rows, dtype=np.intp))
+
+    return out, _concat_idx(err_idx), err_msgs, default_mask
+
+def _concat_idx(parts):
+    if not parts:
+        return np.empty(0, dtype=np.intp)
+    return np.concatenate(parts)
+
+def validate_dataframe(df: pd.DataFrame, plan, row_offset: int = 0
+                       ) -> Tuple[pd.DataFrame, List[str], Dict[str, np.ndarray]]:
+    """
+    Validasi dan konversi DataFrame per kolom (bukan per sel).
+    Dispatch tipe data sudah dilakukan sekali saat plan dikompilasi (utils.column_plan).
+
+    Args:
+        df: data hasil pembacaan Excel, kolom sudah memakai nama kolom database
+        plan: TablePlan dari get_table_plan / compile_table_plan
+        row_offset: offset nomor baris untuk pesan error (dipakai saat memproses per chunk)
+    Returns:
+        (DataFrame hasil konversi, daftar pesan error berurutan per baris lalu kolom,
+         mask default {kolom: array bool} untuk kolom yang memakai DEFAULT database;
+         sel default bernilai None di DataFrame dan diteruskan ke BulkLoader.load)
+    """
+    converted = {}
+    default_masks = {}
+    error_positions = []  # (row, col_pos, message) - mask error yang sparse
+
+    for col_pos, col in enumerate(df.columns):
+        column = plan.get(col)
+        values = df[col].to_numpy(dtype=object)
+        try:
+            out, err_idx, err_msgs, default_mask = _validate_column(values, column)
+        except Exception as exc:
+            logger.warning(f"Validasi vektor kolom '{col}' gagal ({exc}), fallback per sel")
+            out = np.empty(len(values), dtype=object)
+            default_mask = np.zeros(len(values), dtype=bool)
+            err_rows = []
+            err_msgs = []
+            for i, value in enumerate(values):
+                value, is_valid, error_msg = column.validate(value)
+                if is_valid and _is_default_marker(value):
+                    default_mask[i] = True
+                    value = None
+                out[i] = value if is_valid else None
+                if not is_valid:
+                    err_rows.append(i)
+                    err_msgs.append(error_msg)
+            err_idx = np.asarray(err_rows, dtype=np.intp)
+
+        converted[col] = out
+        if default_mask is not None and default_mask.any():
+            default_masks[col] = default_mask
+        for row, msg in zip(err_idx.tolist(), err_msgs):
+            error_positions.append((row, col_pos, msg))
+
+    error_positions.sort(key=lambda e: (e[0], e[1]))
+    columns = list(df.columns)
+    errors = [f"Row {row + row_offset + 1}, Column '{columns[col_pos]}': {msg}"
+              for row, col_pos, msg in error_positions]
+
+    return pd.DataFrame(converted, index=range(len(df)), columns=columns), errors, default_masks
@@ -3,7 +3,9 @@ import logging
 from datetime import date, datetime
 
 from config.config import get_db_connection
-from utils.helpers import normalize_value
+from utils.bulk_insert import BulkLoader
+from utils.period_stats import get_recent_period_counts
+from utils.schema_cache import get_table_columns
 
 logger = logging.getLogger(__name__)
 
@@ -20,28 +22,9 @@ def get_column_info(table_name, exclude_automatic=True):
         table_name: Nama tabel
         exclude_automatic: True untuk mengecualikan kolom otomatis (period_date, upload_date)
     """
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT 
-            c.COLUMN_NAME,
-            c.DATA_TYPE,
-            c.CHARACTER_MAXIMUM_LENGTH,
-            c.NUMERIC_PRECISION,
-            c.NUMERIC_SCALE,
-            c.IS_NULLABLE,
-            c.COLUMN_DEFAULT
-        FROM INFORMATION_SCHEMA.COLUMNS c
-        WHERE c.TABLE_NAME = ? AND c.TABLE_SCHEMA = 'dbo'
-        ORDER BY c.ORDINAL_POSITION
-        """
-        
-        cursor.execute(query, (table_name,))
-        columns = cursor.fetchall()
+        # Metadata dari schema cache (di-invalidate saat create/delete/duplicate table dan polling modify_date)
+        columns = get_table_columns(table_name)
         
         if not columns:
             raise ValueError(f"Tabel '{table_name}' tidak ditemukan atau tidak memiliki kolom")
@@ -49,33 +32,18 @@ def get_column_info(table_name, exclude_automatic=True):
         columns_info = {}
         automatic_columns = ['period_date', 'upload_date', 'id']  # Kolom yang otomatis ditambahkan
         
-        for col in columns:
-            column_name = col[0]
-            
+        for column_name, descriptor in columns.items():
             # Skip kolom otomatis jika diminta
             if exclude_automatic and column_name.lower() in automatic_columns:
                 continue
                 
-            columns_info[column_name] = {
-                'name': column_name,  # Tambahkan nama kolom untuk error messages
-                'data_type': col[1],
-                'max_length': col[2],
-                'precision': col[3],
-                'scale': col[4],
-                'is_nullable': col[5] == 'YES',
-                'default_value': col[6]
-            }
+            columns_info[column_name] = descriptor
         
         return columns_info
         
     except Exception as e:
         logger.error(f"Error getting column info: {str(e)}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 def convert_value_for_sql_server(value):
     """
@@ -158,114 +126,31 @@ def safe_insert_single_record(table_name, columns, values):
         if conn:
             conn.close()
 
-def insert_to_database(df, table_name, periode_date=None, replace_existing=True):
+def insert_to_database(df, table_name, periode_date=None, replace_existing=True, columns_info=None):
     """
     Insert dataframe ke SQL Server table - data sudah tervalidasi
     Includes period_date and upload_date automatic columns
     PERBAIKAN: Handle database default values
+    Menggunakan BulkLoader (fast_executemany / staging table), baris dikelompokkan
+    per pola kolom __USE_DATABASE_DEFAULT__.
     """
-    conn = None
-    cursor = None
-
+    if columns_info is None:
+        try:
+            columns_info = get_column_info(table_name, exclude_automatic=False)
+        except Exception as e:
+            logger.warning(f"Metadata kolom {table_name} tidak tersedia untuk bulk insert: {e}")
+            columns_info = {}
+
+    loader = BulkLoader(table_name, periode_date, replace_existing, columns_info=columns_info)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # PERBAIKAN: Filter kolom yang menggunakan database default
-        # Check which columns have database defaults
-        columns_with_defaults = {}
-        for col in df.columns:
-            # Check if any row in this column has the database default marker
-            has_default_marker = df[col].astype(str).str.contains('__USE_DATABASE_DEFAULT__').any()
-            if has_default_marker:
-                columns_with_defaults[col] = True
-
-        logger.info(f"Kolom dengan database default: {list(columns_with_defaults.keys())}")
-
-        # PERBAIKAN: Build dynamic column list per row
-        successful_inserts = 0
-        current_datetime = datetime.now()
-        
-        # Delete existing data if replace_existing is True
-        if replace_existing and periode_date:
-            delete_query = f"DELETE FROM {table_name} WHERE period_date = ?"
-            cursor.execute(delete_query, (periode_date,))
-            logger.info(f"Data sebelumnya dengan periode {periode_date} telah dihapus dari {table_name}")
-
-        # PERBAIKAN: Process each row individually to handle different column sets
-        for idx, row in df.iterrows():
-            try:
-                # Build column list and values for this specific row
-                insert_columns = []
-                insert_values = []
-                placeholders = []
-
-                # Process data columns
-                for col in df.columns:
-                    raw_value = row[col]
-                    
-                    # PERBAIKAN: Skip kolom jika menggunakan database default
-                    if str(raw_value) == '__USE_DATABASE_DEFAULT__':
-                        logger.debug(f"Row {idx + 1}: Skipping column '{col}' - using database default")
-                        continue
-                    
-                    # Include column in insert
-                    insert_columns.append(f'[{col}]')
-                    placeholders.append('?')
-                    
-                    # Normalize value
-                    dtype = str(df[col].dtype)
-                    value = normalize_value(raw_value, dtype)
-                    insert_values.append(value)
+        with loader:
+            loader.load(df)
+            loader.commit()
 
-                # Add automatic columns safely (avoid duplication)
-                existing_columns = [c.strip('[]') for c in insert_columns]
-
-                if 'period_date' not in existing_columns:
-                    insert_columns.append('[period_date]')
-                    placeholders.append('?')
-                    insert_values.append(periode_date)
-
-                if 'upload_date' not in existing_columns:
-                    insert_columns.append('[upload_date]')
-                    placeholders.append('GETDATE()')
-
-                if not insert_columns:
-                    logger.warning(f"Row {idx + 1}: No columns to insert, skipping")
-                    continue
-
-                # Build and execute query for this row
-                insert_query = f"INSERT INTO {table_name} ({', '.join(insert_columns)}) VALUES ({', '.join(placeholders)})"
-                
-                logger.debug(f"Row {idx + 1} Query: {insert_query}")
-                logger.debug(f"Row {idx + 1} Values: {insert_values}")
-                
-                cursor.execute(insert_query, insert_values)
-                successful_inserts += 1
-
-            except Exception as row_error:
-                logger.error(f"Error inserting row {idx + 1}: {str(row_error)}")
-                # Continue with next row instead of failing completely
-                continue
-
-        conn.commit()
-        logger.info(f"Berhasil insert {successful_inserts} dari {len(df)} baris")
-
-        return {
-            'success': True,
-            'message': f'Berhasil insert {successful_inserts} baris data',
-            'inserted_rows': successful_inserts,
-            'skipped_rows': len(df) - successful_inserts,
-            'error_rows': 0,
-            'columns_used': [col for col in df.columns.tolist() if col not in columns_with_defaults],
-            'columns_with_defaults': list(columns_with_defaults.keys()),
-            'periode_date': periode_date,
-            'upload_date': current_datetime.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        logger.info(f"Berhasil insert {loader.inserted_rows} dari {len(df)} baris ({loader.rows_per_sec} baris/detik)")
+        return loader.result()
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Error inserting to database: {str(e)}")
         return {
             'success': False,
@@ -274,11 +159,6 @@ def insert_to_database(df, table_name, periode_date=None, replace_existing=True)
             'skipped_rows': 0,
             'error_rows': len(df) if 'df' in locals() else 0
         }
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 def get_template_tables(role_access=None, division=None):
     """
@@ -328,30 +208,26 @@ def get_data_count_by_period(table_name):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Check if table exists and has period_date column
-        check_query = """
-        SELECT COUNT(*) 
-        FROM INFORMATION_SCHEMA.COLUMNS 
-        WHERE TABLE_NAME = ? AND COLUMN_NAME = 'period_date' AND TABLE_SCHEMA = 'dbo'
-        """
-        cursor.execute(check_query, (table_name,))
-        has_period_date = cursor.fetchone()[0] > 0
+        # Check if table exists and has period_date column (dari schema cache)
+        has_period_date = any(name.lower() == 'period_date' for name in get_table_columns(table_name))
         
         if not has_period_date:
             return []
         
-        # Get data count grouped by period_date
-        query = f"""
-        SELECT TOP 5
-            period_date,
-            COUNT(*) as total_records
-        FROM [{table_name}]
-        GROUP BY period_date
-        ORDER BY period_date DESC
-        """
-        
-        cursor.execute(query)
-        results = cursor.fetchall()
+        # Ambil dari SSOT_TEMPLATE_PERIOD_STATS; fallback ke GROUP BY langsung bila belum tersedia
+        results = get_recent_period_counts(cursor, table_name, limit=5)
+        if results is None:
+            query = f"""
+            SELECT TOP 5
+                period_date,
+                COUNT(*) as total_records
+            FROM [{table_name}]
+            GROUP BY period_date
+            ORDER BY period_date DESC
+            """
+            
+            cursor.execute(query)
+            results = cursor.fetchall()
         
         data_counts = []
         for row in results:
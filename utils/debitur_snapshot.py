@@ -0,0 +1,351 @@
+import os
+import glob
+import time
+import uuid
+import hashlib
+import logging
+import threading
+
+from config.config import get_db_connection
+from utils.cache import TTLCache
+from utils.xlsx_stream import EXPORT_FETCH_SIZE, stream_xlsx
+
+logger = logging.getLogger(__name__)
+
+# Interval minimal (detik) antar pengecekan PBK_EOD_DATE terbaru ke linked server
+DEBITUR_SNAPSHOT_CHECK_INTERVAL = int(os.getenv('DEBITUR_SNAPSHOT_CHECK_INTERVAL', 300))
+DEBITUR_FETCH_SIZE = int(os.getenv('DEBITUR_FETCH_SIZE', 5000))
+# Jumlah perubahan per halaman respons /api/sync-debitur dan /api/sync-debitur/changes
+DEBITUR_SYNC_PAGE_SIZE = int(os.getenv('DEBITUR_SYNC_PAGE_SIZE', 1000))
+# Lama (detik) daftar perubahan hasil sync disimpan untuk paging
+DEBITUR_SYNC_TTL = int(os.getenv('DEBITUR_SYNC_TTL', 3600))
+
+# Lokasi artefak Excel debitur per EOD dan jumlah file EOD lama yang disimpan
+DEBITUR_EXPORT_DIR = os.getenv('DEBITUR_EXPORT_DIR', os.path.join('exports', 'debitur'))
+DEBITUR_EXPORT_KEEP = int(os.getenv('DEBITUR_EXPORT_KEEP', 3))
+DEBITUR_EXPORT_COLUMNS = ['Tanggal Data', 'Kode Debitur', 'Nama Debitur', 'Nomor Fasilitas']
+
+CHANGE_ADDED = 'added'
+CHANGE_REMOVED = 'removed'
+CHANGE_CHANGED = 'changed'
+
+_LATEST_EOD_QUERY = """
+    SELECT MAX(PBK_EOD_DATE) FROM [10.10.4.12].SMIDWHARIUM.dbo.PBK_T_INF_COR_FACILITY_ACCOUNT
+    WHERE FACILITY_STATUS = 'AC'
+"""
+
+_CUSTOMER_QUERY = """
+    SELECT
+        PBK_EOD_DATE,
+        NOMOR_CIF,
+        CUST_NAME,
+        FACILITY_NO
+    FROM Func_GetCustomerData(?)
+    ORDER BY NOMOR_CIF
+"""
+
+
+def _date_text(value):
+    return value.strftime('%Y-%m-%d') if value else None
+
+
+class DebiturSnapshot:
+    """
+    Hasil Func_GetCustomerData untuk satu PBK_EOD_DATE (immutable setelah dibuat).
+    rows: tuple (tanggal data 'YYYY-MM-DD', NOMOR_CIF, CUST_NAME, FACILITY_NO), urut NOMOR_CIF.
+    """
+
+    def __init__(self, eod_date, rows):
+        self.eod_date = eod_date
+        self.eod_text = _date_text(eod_date)
+        self.loaded_at = time.monotonic()
+        self.loaded_at_wall = time.time()
+
+        # strftime sekali per tanggal berbeda, bukan tiga kali per baris
+        date_texts = {}
+        materialized = []
+        for row in rows:
+            row_date = row[0]
+            text = date_texts.get(row_date)
+            if text is None and row_date not in date_texts:
+                text = date_texts[row_date] = _date_text(row_date)
+            materialized.append((text, row[1], row[2], row[3]))
+        self.rows = tuple(materialized)
+        self.row_count = len(self.rows)
+        # Setara COUNT(DISTINCT NOMOR_CIF): NULL tidak dihitung
+        self.cif_count = len({row[1] for row in self.rows if row[1] is not None})
+        self._keyed = None
+
+    def keyed(self):
+        """
+        {(NOMOR_CIF, FACILITY_NO): (hash kolom non-key, baris)}, dihitung sekali per snapshot.
+        Tanggal data tidak ikut di-hash karena selalu berubah antar EOD.
+        """
+        if self._keyed is None:
+            self._keyed = {(row[1], row[3]): (hash(row[2]), row) for row in self.rows}
+        return self._keyed
+
+    @staticmethod
+    def to_record(row):
+        """Format baris untuk respons API debitur (sama dengan format sebelumnya)."""
+        return {
+            'pbk_eod_date': row[0],
+            'kode_debitur': row[1],
+            'nama_debitur': row[2],
+            'facility_no': row[3],
+            'status': 'AKTIF',
+            'tanggal_dibuat': row[0],
+            'last_update': row[0],
+        }
+
+    def records(self, limit=None):
+        rows = self.rows if limit is None else self.rows[:limit]
+        return [self.to_record(row) for row in rows]
+
+    def stats(self, total=None):
+        total = self.cif_count if total is None else total
+        return {
+            'total': total,
+            'active': total,
+            'last_update': self.eod_text
+        }
+
+
+class DebiturDelta:
+    """
+    Perubahan snapshot terhadap snapshot yang terakhir di-sync: key (NOMOR_CIF, FACILITY_NO) yang
+    bertambah, hilang, atau berubah isinya. full=True bila belum ada sync sebelumnya di proses ini
+    (semua baris dianggap baru; client sebaiknya melakukan full resync).
+    """
+
+    def __init__(self, previous, current):
+        self.sync_id = uuid.uuid4().hex
+        self.previous_eod = previous.eod_text if previous is not None else None
+        self.eod = current.eod_text
+        self.full = previous is None
+
+        before = previous.keyed() if previous is not None else {}
+        after = current.keyed()
+        changes = []
+        counts = {CHANGE_ADDED: 0, CHANGE_REMOVED: 0, CHANGE_CHANGED: 0}
+        for key, (digest, row) in after.items():
+            old = before.get(key)
+            if old is None:
+                changes.append((CHANGE_ADDED, row))
+            elif old[0] != digest:
+                changes.append((CHANGE_CHANGED, row))
+        for key, (_, row) in before.items():
+            if key not in after:
+                changes.append((CHANGE_REMOVED, row))
+        for kind, _ in changes:
+            counts[kind] += 1
+
+        self.changes = changes
+        self.counts = counts
+        self.counts['unchanged'] = len(after) - counts[CHANGE_ADDED] - counts[CHANGE_CHANGED]
+
+    def summary(self):
+        return {
+            'sync_id': self.sync_id,
+            'previous_eod': self.previous_eod,
+            'eod': self.eod,
+            'full': self.full,
+            'total_changes': len(self.changes),
+            **self.counts
+        }
+
+    def page(self, offset=0, limit=None):
+        """Satu halaman perubahan mulai dari offset. Returns (records, offset berikutnya atau None)."""
+        limit = limit or DEBITUR_SYNC_PAGE_SIZE
+        end = offset + limit
+        records = []
+        for kind, row in self.changes[offset:end]:
+            record = DebiturSnapshot.to_record(row)
+            record['change'] = kind
+            records.append(record)
+        return records, (end if end < len(self.changes) else None)
+
+
+_snapshot = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+def _load(cursor, eod_date):
+    started = time.perf_counter()
+    cursor.execute(_CUSTOMER_QUERY, (eod_date,))
+    rows = []
+    while True:
+        batch = cursor.fetchmany(DEBITUR_FETCH_SIZE)
+        if not batch:
+            break
+        rows.extend(batch)
+    snapshot = DebiturSnapshot(eod_date, rows)
+    logger.info(f"Snapshot debitur aktif EOD {snapshot.eod_text} dimuat: {snapshot.row_count} baris, "
+                f"{snapshot.cif_count} CIF ({time.perf_counter() - started:.1f} detik)")
+    return snapshot
+
+def get_debitur_snapshot(force_refresh=False):
+    """
+    Snapshot debitur aktif in-process per PBK_EOD_DATE.
+    - PBK_EOD_DATE terbaru dicek ke linked server paling sering sekali per DEBITUR_SNAPSHOT_CHECK_INTERVAL;
+      Func_GetCustomerData hanya dijalankan ulang bila EOD berubah.
+    - Request bersamaan digabung: hanya satu pemanggil yang query ke linked server, lainnya
+      menunggu lock lalu memakai snapshot hasilnya.
+    - force_refresh=True (/api/sync-debitur) selalu memuat ulang, kecuali refresh lain selesai
+      selama pemanggil menunggu.
+    """
+    global _snapshot, _last_check
+    requested_at = time.monotonic()
+    snapshot = _snapshot
+    if not force_refresh and snapshot is not None and requested_at - _last_check < DEBITUR_SNAPSHOT_CHECK_INTERVAL:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None:
+            if force_refresh and snapshot.loaded_at >= requested_at:
+                return snapshot
+            if not force_refresh and time.monotonic() - _last_check < DEBITUR_SNAPSHOT_CHECK_INTERVAL:
+                return snapshot
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(_LATEST_EOD_QUERY)
+            eod_date = cursor.fetchone()[0]
+
+            if not force_refresh and snapshot is not None and snapshot.eod_date == eod_date:
+                _last_check = time.monotonic()
+                return snapshot
+
+            _snapshot = _load(cursor, eod_date)
+            _last_check = time.monotonic()
+            return _snapshot
+        except Exception as e:
+            if snapshot is not None and not force_refresh:
+                logger.warning(f"Refresh snapshot debitur gagal, memakai snapshot EOD {snapshot.eod_text}: {e}")
+                _last_check = time.monotonic()
+                return snapshot
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+def invalidate_debitur_snapshot():
+    """Paksa pengecekan EOD pada pemanggilan berikutnya."""
+    global _last_check
+    _last_check = 0.0
+
+_synced = None
+_sync_lock = threading.Lock()
+_deltas = TTLCache(DEBITUR_SYNC_TTL, max_entries=20)
+
+def record_sync(snapshot):
+    """Catat snapshot sebagai hasil sync terbaru dan hitung delta terhadap sync sebelumnya."""
+    global _synced
+    with _sync_lock:
+        delta = DebiturDelta(_synced, snapshot)
+        _synced = snapshot
+    _deltas.set(delta.sync_id, delta)
+    logger.info(f"Sync debitur EOD {delta.eod}: {delta.counts}")
+    return delta
+
+def get_sync_delta(sync_id):
+    return _deltas.get(sync_id) if sync_id else None
+
+
+class DebiturExport:
+    """Artefak Excel debitur aktif untuk satu EOD di disk; etag = sha1 isi file."""
+
+    def __init__(self, path, filename, etag, rows=None):
+        self.path = path
+        self.filename = filename
+        self.etag = etag
+        self.rows = rows
+
+
+_exports = {}  # eod_text -> DebiturExport
+_export_lock = threading.Lock()
+
+def _export_filename(snapshot):
+    """Nama file untuk download (tanpa hash)."""
+    if snapshot.eod_date:
+        return f"debitur_aktif_{snapshot.eod_date.strftime('%Y%m%d')}.xlsx"
+    return "debitur_aktif.xlsx"
+
+def _export_batches(rows):
+    for start in range(0, len(rows), EXPORT_FETCH_SIZE):
+        yield [[row[0] or '', row[1], row[2], row[3]] for row in rows[start:start + EXPORT_FETCH_SIZE]]
+
+def _write_export(snapshot, filename):
+    """
+    Tulis workbook secara streaming ke file sementara sambil menghitung sha1, lalu rename ke
+    nama file yang memuat hash isi (debitur_aktif_YYYYMMDD_<sha1[:12]>.xlsx). File yang sudah
+    ada tidak pernah ditimpa, sehingga download yang masih membaca versi lama tidak terganggu
+    (Windows menolak replace file yang sedang dibuka).
+    """
+    started = time.perf_counter()
+    os.makedirs(DEBITUR_EXPORT_DIR, exist_ok=True)
+    stem = os.path.splitext(filename)[0]
+    tmp_path = os.path.join(DEBITUR_EXPORT_DIR, f"{stem}.{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha1()
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in stream_xlsx(DEBITUR_EXPORT_COLUMNS, _export_batches(snapshot.rows), sheet_title="Debitur Aktif"):
+                if chunk:
+                    f.write(chunk)
+                    digest.update(chunk)
+        etag = digest.hexdigest()
+        path = os.path.join(DEBITUR_EXPORT_DIR, f"{stem}_{etag[:12]}.xlsx")
+        if os.path.exists(path):
+            # Isi identik dengan file yang sudah ada: pakai file tersebut
+            os.remove(tmp_path)
+        else:
+            os.rename(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    logger.info(f"Export debitur EOD {snapshot.eod_text} dibuat: {path} ({time.perf_counter() - started:.1f} detik)")
+    return DebiturExport(path, filename, etag, snapshot.rows)
+
+def _cleanup_exports(keep_path):
+    """Hapus versi lama; file yang masih dibuka (download berjalan) dilewati dan dicoba lagi nanti."""
+    files = sorted(glob.glob(os.path.join(DEBITUR_EXPORT_DIR, 'debitur_aktif*.xlsx')), key=os.path.getmtime, reverse=True)
+    for path in files[DEBITUR_EXPORT_KEEP:]:
+        if os.path.abspath(path) == os.path.abspath(keep_path):
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.info(f"Export debitur lama {path} belum bisa dihapus: {e}")
+
+def get_debitur_export(snapshot):
+    """
+    Artefak Excel untuk snapshot, dibuat sekali per EOD lalu dipakai ulang untuk download
+    berikutnya. Dibuat ulang bila isi snapshot EOD yang sama berubah (setelah sync) atau
+    setelah restart (isi file lama tidak bisa dicocokkan tanpa membuat ulang).
+    """
+    key = snapshot.eod_text
+    export = _exports.get(key)
+    if export is not None and export.rows is snapshot.rows and os.path.exists(export.path):
+        return export
+
+    with _export_lock:
+        export = _exports.get(key)
+        if export is not None and os.path.exists(export.path):
+            if export.rows is snapshot.rows or export.rows == snapshot.rows:
+                export.rows = snapshot.rows
+                return export
+
+        export = _write_export(snapshot, _export_filename(snapshot))
+        _cleanup_exports(export.path)
+        _exports.clear()
+        _exports[key] = export
+        return export
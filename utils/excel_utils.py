@@ -1,17 +1,34 @@
 import os
 import re
-import math
 import logging
-from datetime import datetime, date
 from typing import List, Tuple, Dict, Any, Optional
 
+import itertools
+
+import numpy as np
+import openpyxl
 import pandas as pd
 
-from utils.db_utils import get_column_info, insert_to_database
+from utils.db_utils import get_column_info
+from utils.bulk_insert import BulkLoader
 from utils.helpers import handle_null_values_for_column, process_default_value
+from utils.column_validator import validate_dataframe
+from utils.column_plan import ColumnPlan, compile_table_plan, get_table_plan
 
 logger = logging.getLogger(__name__)
 
+# Jumlah baris teratas yang dibaca untuk deteksi header
+HEADER_SCAN_ROWS = 50
+# Baris teratas yang dinilai oleh auto-detection header (baris 0..20) dan fallback (baris 0..10)
+HEADER_AUTO_SCAN_ROWS = 21
+HEADER_FALLBACK_SCAN_ROWS = 11
+# Batas pencarian baris awal data bila header diikuti banyak baris kosong
+DATA_START_SCAN_LIMIT = 5000
+# Ukuran chunk baris data untuk validasi + bulk insert
+EXCEL_CHUNK_SIZE = int(os.getenv('EXCEL_CHUNK_SIZE', 5000))
+# Jumlah pesan validasi yang dikembalikan ke client
+MAX_REPORTED_ERRORS = 20
+
 def normalize_column_name(col_name: Any) -> str:
     if pd.isna(col_name):
         return ''
@@ -38,124 +55,147 @@ def get_excel_sheets(file_path):
         logger.error(f"Error reading Excel sheets: {str(e)}")
         return None
 
-def find_primary_header_row(df, primary_header_pattern=None):
-    def normalize_text(text):
-        if pd.isna(text):
-            return ""
-        return str(text).lower().strip()
-
-    def is_likely_header_row(row_values):
-        non_empty_count = 0
-        text_count = 0
-        numeric_count = 0
-
-        for val in row_values:
-            if pd.notna(val) and str(val).strip():
-                non_empty_count += 1
-                try:
-                    float(str(val))
-                    numeric_count += 1
-                except ValueError:
-                    text_count += 1
+_HEADER_KEYWORDS = [
+    'number', 'name', 'id', 'code', 'facility', 'location', 'type',
+    'date', 'status', 'description', 'value', 'amount', 'quantity',
+    'column', 'field', 'data', 'info'
+]
+_HEADER_INDICATORS = ['col', 'field', 'data', 'info', 'value', 'item']
+_PRIMARY_KEYWORDS = ['number', 'id', 'column']
 
-        if non_empty_count < 2:
-            return False
-
-        if numeric_count == non_empty_count:
-            return False
 
+def _is_float_text(text):
+    try:
+        float(text)
         return True
+    except ValueError:
+        return False
 
-    def check_column_pattern(row_values):
-        text_values = [normalize_text(val) for val in row_values if pd.notna(val) and str(val).strip()]
-        column_pattern_count = sum(1 for val in text_values if val.startswith('column_'))
-        if column_pattern_count >= 2:
-            return 10
+def _count_substring_hits(values, patterns):
+    """
+    Jumlah pattern berbeda yang muncul sebagai substring di setiap nilai.
+    Dihitung per pattern dengan str.contains pada nilai unik (bukan satu regex alternation,
+    yang tidak menghitung pattern yang saling tumpang tindih seperti 'data'/'date').
+    """
+    unique = pd.Series(pd.unique(values), dtype=object)
+    hits = np.zeros(len(unique), dtype=np.int64)
+    for pattern in patterns:
+        hits += unique.str.contains(pattern, regex=False).to_numpy(dtype=np.int64)
+    return pd.Series(hits, index=unique).reindex(values).to_numpy()
+
+class _HeaderBlock:
+    """
+    Fitur sel blok teratas sheet untuk deteksi header: dihitung sekali dengan operasi
+    vektor pandas/NumPy, biaya tidak bergantung pada panjang sheet.
+    """
+
+    def __init__(self, df, max_rows):
+        block = df.iloc[:max_rows].to_numpy(dtype=object)
+        self.n_rows = block.shape[0]
+        self.width = block.shape[1] if block.ndim == 2 else 0
+
+        notna = pd.notna(block)
+        self.cell_rows, self.cell_cols = np.nonzero(notna)
+        raw = pd.Series(block[notna], dtype=object).astype(str)
+        self.raw = raw.to_numpy(dtype=object)          # str(val) sel non-NA, urut baris lalu kolom
+        self.lower = raw.str.lower().to_numpy(dtype=object)
+        self.norm = raw.str.lower().str.strip().to_numpy(dtype=object)
+        self.non_empty = raw.str.strip().ne('').to_numpy()
+
+        unique = pd.unique(self.raw[self.non_empty])
+        numeric_unique = {val for val in unique if _is_float_text(val)}
+        self.numeric = self.non_empty & np.fromiter(
+            (val in numeric_unique for val in self.raw), dtype=bool, count=len(self.raw)
+        )
+
+        self.non_empty_count = self._per_row(self.non_empty)
+        numeric_count = self._per_row(self.numeric)
+        # Baris kandidat header: minimal 2 sel terisi dan tidak seluruhnya angka
+        self.likely = (self.non_empty_count >= 2) & (numeric_count < self.non_empty_count)
+
+    def _per_row(self, values):
+        return np.bincount(self.cell_rows, weights=values, minlength=self.n_rows).astype(np.int64)
+
+    def _first_cell_index(self, mask):
+        """Index sel pertama (urut kolom) per baris yang memenuhi mask, -1 bila tidak ada."""
+        first = np.full(self.n_rows, -1, dtype=np.int64)
+        positions = np.flatnonzero(mask)
+        rows, offsets = np.unique(self.cell_rows[positions], return_index=True)
+        first[rows] = positions[offsets]
+        return first
+
+    def pattern_matches(self, pattern):
+        """Baris dengan sel yang mengandung pattern atau merupakan bagian dari pattern (sel kosong selalu cocok)."""
+        norm = pd.Series(self.norm, dtype=object)
+        unique = pd.unique(self.norm)
+        inside_pattern = {val for val in unique if val in pattern}
+        cell_match = norm.str.contains(pattern, regex=False).to_numpy(dtype=bool) | np.fromiter(
+            (val in inside_pattern for val in self.norm), dtype=bool, count=len(self.norm)
+        )
+        matched = self._per_row(cell_match) > 0
+        # Sel NA dinormalisasi menjadi '' yang selalu merupakan bagian dari pattern
+        matched |= self._per_row(np.ones(len(self.norm), dtype=bool)) < self.width
+        return matched
+
+    def scores(self):
+        """Skor auto-detection per baris dan primary candidate per baris."""
+        keyword_hits = _count_substring_hits(self.lower, _HEADER_KEYWORDS)
+        score = self._per_row(keyword_hits)
+        score[:1] += 5
+
+        column_pattern = self._per_row(self.non_empty & pd.Series(self.norm, dtype=object)
+                                       .str.startswith('column_').to_numpy(dtype=bool))
+        indicator_hits = _count_substring_hits(self.norm, _HEADER_INDICATORS) * self.non_empty
+        score += np.where(column_pattern >= 2, 10, self._per_row(indicator_hits))
+        score += np.where(self.non_empty_count >= 3, 2, 0)
+
+        primary_cell = self._first_cell_index(_count_substring_hits(self.lower, _PRIMARY_KEYWORDS) > 0)
+        first_cell = self._first_cell_index(np.ones(len(self.raw), dtype=bool))
+        return score, primary_cell, first_cell
 
-        header_indicators = ['col', 'field', 'data', 'info', 'value', 'item']
-        score = 0
-        for val in text_values:
-            for indicator in header_indicators:
-                if indicator in val:
-                    score += 1
-        return score
+def find_primary_header_row(df, primary_header_pattern=None):
+    """
+    Deteksi baris header dari blok teratas sheet. Returns (index baris, primary header).
+    Dengan primary_header_pattern: baris kandidat pertama (dalam HEADER_SCAN_ROWS baris) yang
+    memuat pattern. Tanpa pattern: skor tertinggi di HEADER_AUTO_SCAN_ROWS baris pertama
+    (keyword header, pola column_, jumlah sel terisi, bonus baris pertama).
+    """
+    scan_rows = HEADER_SCAN_ROWS if primary_header_pattern else HEADER_AUTO_SCAN_ROWS
+    block = _HeaderBlock(df, max(scan_rows, HEADER_AUTO_SCAN_ROWS))
 
     # Step 1: jika diberikan primary_header_pattern
     if primary_header_pattern:
-        pattern_normalized = normalize_text(primary_header_pattern)
-        for idx, row in df.iterrows():
-            row_values = [normalize_text(val) for val in row]
-            for val in row_values:
-                if pattern_normalized in val or val in pattern_normalized:
-                    if is_likely_header_row(row.values):
-                        logger.info(f"Header row ditemukan di baris {idx + 1} berdasarkan pattern '{primary_header_pattern}'")
-                        return idx, primary_header_pattern
+        pattern_normalized = str(primary_header_pattern).lower().strip()
+        candidates = np.flatnonzero(block.pattern_matches(pattern_normalized) & block.likely)
+        candidates = candidates[candidates < scan_rows]
+        if len(candidates):
+            idx = int(candidates[0])
+            logger.info(f"Header row ditemukan di baris {idx + 1} berdasarkan pattern '{primary_header_pattern}'")
+            return idx, primary_header_pattern
 
     # Step 2: auto-detection
-    best_header_row = None
-    best_score = -1
-    detected_primary = None
-
-    common_header_keywords = [
-        'number', 'name', 'id', 'code', 'facility', 'location', 'type', 
-        'date', 'status', 'description', 'value', 'amount', 'quantity',
-        'column', 'field', 'data', 'info'
-    ]
-
-    for idx, row in df.iterrows():
-        if idx > 20:
-            break
-
-        if not is_likely_header_row(row.values):
-            continue
-
-        score = 0
-        primary_candidate = None
-        row_values = [str(val) for val in row if pd.notna(val)]
-
-        # Penambahan: beri preferensi lebih tinggi jika ini baris pertama
-        if idx == 0:
-            score += 5  # penalti negatif untuk baris bukan pertama
-
-        # Skor berdasarkan keyword
-        for val in row_values:
-            val_norm = normalize_text(val)
-            for keyword in common_header_keywords:
-                if keyword in val_norm:
-                    score += 1
-                    if not primary_candidate and (
-                        'number' in val_norm or 'id' in val_norm or 'column' in val_norm
-                    ):
-                        primary_candidate = str(val).strip()
-
-        # Skor berdasarkan pola column_
-        score += check_column_pattern(row.values)
-
-        # Tambahan bonus untuk jumlah kolom
-        non_empty_count = sum(1 for val in row_values if str(val).strip())
-        if non_empty_count >= 3:
-            score += 2
-
-        if score > best_score:
-            best_score = score
-            best_header_row = idx
-            detected_primary = primary_candidate or str(row_values[0]).strip()
-
-    if best_header_row is not None:
+    score, primary_cell, first_cell = block.scores()
+    auto_rows = min(block.n_rows, HEADER_AUTO_SCAN_ROWS)
+    likely = block.likely[:auto_rows]
+    if likely.any():
+        masked = np.where(likely, score[:auto_rows], -1)
+        best_header_row = int(np.argmax(masked))
+        best_score = int(masked[best_header_row])
+        if primary_cell[best_header_row] >= 0:
+            detected_primary = block.raw[primary_cell[best_header_row]].strip()
+        else:
+            detected_primary = block.raw[first_cell[best_header_row]].strip()
         logger.info(f"Header row auto-detected di baris {best_header_row + 1}, primary header: '{detected_primary}', score: {best_score}")
         return best_header_row, detected_primary
 
     # Fallback
     logger.warning("Menggunakan fallback detection...")
-    for idx, row in df.iterrows():
-        if idx > 10:
-            break
-        if is_likely_header_row(row.values):
-            row_values = [str(val) for val in row if pd.notna(val)]
-            if row_values:
-                detected_primary = str(row_values[0]).strip()
-                logger.info(f"Header row fallback detected di baris {idx + 1}, primary header: '{detected_primary}'")
-                return idx, detected_primary
+    fallback = np.flatnonzero(block.likely[:HEADER_FALLBACK_SCAN_ROWS])
+    if len(fallback):
+        idx = int(fallback[0])
+        detected_primary = block.raw[first_cell[idx]].strip()
+        logger.info(f"Header row fallback detected di baris {idx + 1}, primary header: '{detected_primary}'")
+        return idx, detected_primary
 
     raise ValueError("Tidak dapat menemukan baris header. Pastikan file Excel memiliki baris header yang jelas.")
 
@@ -226,10 +266,7 @@ def strict_column_match(excel_headers: List[str], required_headers: List[str]) -
 
     return [(ex, dbm) for ex, dbm in mapping], []
 
-def find_header_row_and_validate(df: pd.DataFrame,
-                                 required_headers: List[str],
-                                 primary_header_pattern: Optional[str] = None
-                                 ) -> Tuple[int, List[Tuple[str, str]], List[str], str]:
+def detect_header_row(df: pd.DataFrame, primary_header_pattern: Optional[str] = None) -> Tuple[int, str]:
     header_row, detected_primary = None, ''
     if primary_header_pattern:
         try:
@@ -240,7 +277,10 @@ def find_header_row_and_validate(df: pd.DataFrame,
 
     if header_row is None:
         header_row, detected_primary = find_primary_header_row(df)
+    return header_row, detected_primary
 
+def validate_header_row(df: pd.DataFrame, header_row: int,
+                        required_headers: List[str]) -> Tuple[List[Tuple[str, str]], List[str]]:
     excel_headers = [normalize_column_name(v) for v in df.iloc[header_row]]
     while excel_headers and excel_headers[-1] == '':
         excel_headers.pop()
@@ -248,11 +288,45 @@ def find_header_row_and_validate(df: pd.DataFrame,
     try:
         valid_mapping, missing = strict_column_match(excel_headers, required_headers)
         logger.info('Header validated at row %s. Matched %s columns.', header_row + 1, len(valid_mapping))
-        return header_row, valid_mapping, missing, detected_primary
+        return valid_mapping, missing
     except ValueError as e:
         logger.error('Header validation failed: %s', e)
         raise
 
+def find_header_row_and_validate(df: pd.DataFrame,
+                                 required_headers: List[str],
+                                 primary_header_pattern: Optional[str] = None
+                                 ) -> Tuple[int, List[Tuple[str, str]], List[str], str]:
+    header_row, detected_primary = detect_header_row(df, primary_header_pattern)
+    valid_mapping, missing = validate_header_row(df, header_row, required_headers)
+    return header_row, valid_mapping, missing, detected_primary
+
+# Teks yang dianggap kosong pada kolom primary saat mencari baris awal data
+_NULL_TEXT = frozenset(['nan', 'none', '', 'null'])
+
+def blank_cell_mask(df: pd.DataFrame) -> np.ndarray:
+    """
+    Mask sel kosong (NA atau string berisi whitespace saja) berukuran (baris, kolom).
+    Dihitung per kolom dengan operasi vektor tanpa membuat salinan string seluruh frame.
+    """
+    mask = df.isna().to_numpy(dtype=bool)
+    for pos in range(df.shape[1]):
+        col = df.iloc[:, pos]
+        if col.dtype != object:
+            continue
+        try:
+            text = col.str
+        except AttributeError:
+            # Kolom object tanpa nilai string (mis. datetime/Decimal)
+            continue
+        whitespace = text.isspace().eq(True).to_numpy(dtype=bool) | col.eq('').to_numpy(dtype=bool)
+        mask[:, pos] |= whitespace
+    return mask
+
+def row_emptiness_mask(df: pd.DataFrame) -> np.ndarray:
+    """True untuk baris yang seluruh selnya kosong (NA atau whitespace)."""
+    return blank_cell_mask(df).all(axis=1)
+
 def find_data_start_row(df: pd.DataFrame, header_row: int, detected_primary_header: str) -> int:
     excel_headers = [str(v).strip() if pd.notna(v) else '' for v in df.iloc[header_row]]
     primary_col_index = None
@@ -276,17 +350,21 @@ def find_data_start_row(df: pd.DataFrame, header_row: int, detected_primary_head
     if primary_col_index is None:
         raise ValueError('Tidak dapat menentukan kolom primary untuk mencari data')
 
-    data_start_row = None
-    for ridx in range(header_row + 1, len(df)):
+    # Baris data pertama: sel primary berisi nilai (bukan placeholder kosong) dan minimal 2 sel terisi
+    blank = blank_cell_mask(df)
+    filled_count = (~blank).sum(axis=1)
+    has_primary = ~blank[:, primary_col_index]
+    primary_col = df.iloc[:, primary_col_index]
+    if primary_col.dtype == object:
         try:
-            cell_val = df.iloc[ridx, primary_col_index]
-        except Exception:
-            cell_val = None
-        if pd.notna(cell_val) and str(cell_val).strip().lower() not in ['nan', 'none', '', 'null']:
-            row_data = [str(v).strip() for v in df.iloc[ridx] if pd.notna(v) and str(v).strip() != '']
-            if len(row_data) >= 2:
-                data_start_row = ridx
-                break
+            placeholder = primary_col.str.strip().str.lower().isin(_NULL_TEXT).to_numpy(dtype=bool)
+            has_primary &= ~placeholder
+        except AttributeError:
+            pass
+
+    candidates = np.flatnonzero(has_primary & (filled_count >= 2))
+    candidates = candidates[candidates > header_row]
+    data_start_row = int(candidates[0]) if len(candidates) else None
 
     if data_start_row is None:
         raise ValueError(f"Tidak ditemukan data setelah header pada kolom '{detected_primary_header}'")
@@ -295,77 +373,237 @@ def find_data_start_row(df: pd.DataFrame, header_row: int, detected_primary_head
     return data_start_row
 
 def validate_and_convert_value(value: Any, column_info: Dict[str, Any], column_name: str) -> Tuple[Any, bool, str]:
+    """Validasi + konversi satu sel; memakai converter yang sama dengan validasi kolom (utils.column_plan)."""
+    return ColumnPlan(column_name, column_info).validate(value)
+
+def open_sheet_stream(file_path, sheet_name=None):
+    """
+    Generator baris (tuple nilai) dari satu sheet tanpa memuat seluruh sheet ke memori.
+    File .xlsx/.xlsm dibaca dengan openpyxl read_only + iter_rows(values_only=True);
+    format lain (.xls) fallback ke pandas karena openpyxl tidak mendukungnya.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in ('.xlsx', '.xlsm'):
+        df = pd.read_excel(file_path, sheet_name=sheet_name or 0, header=None)
+        for row in df.itertuples(index=False, name=None):
+            yield row
+        return
+
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     try:
-        processed = handle_null_values_for_column(value, column_info)
-        if processed == '__USE_DATABASE_DEFAULT__':
-            return processed, True, ''
-        if processed is None:
-            return None, True, ''
-        col_type = column_info.get('data_type', '').upper()
-        if col_type in ('VARCHAR','NVARCHAR','CHAR','NCHAR','TEXT'):
-            s = str(processed).strip()
-            max_len = column_info.get('max_length')
-            if max_len and isinstance(max_len, int) and len(s) > max_len:
-                return None, False, f"String length ({len(s)}) exceeds max {max_len}"
-            return s, True, ''
-        if col_type == 'BIT':
-            if isinstance(processed, bool):
-                return processed, True, ''
-            s = str(processed).strip().lower()
-            if s in ('1','true','yes','y','on'):
-                return True, True, ''
-            if s in ('0','false','no','n','off'):
-                return False, True, ''
-            return None, False, f"Invalid boolean: '{processed}'"
-        if col_type in ('INT','BIGINT','SMALLINT','TINYINT'):
-            if isinstance(processed, str):
-                cleaned = re.sub(r'[,\s]', '', processed)
-            else:
-                cleaned = processed
-            try:
-                intval = int(float(cleaned))
-                return intval, True, ''
-            except Exception:
-                return None, False, f"Invalid integer: '{processed}'"
-        if col_type in ('DECIMAL','NUMERIC','FLOAT','REAL','MONEY'):
-            if isinstance(processed, str):
-                cleaned = re.sub(r'[,\s]', '', processed)
-            else:
-                cleaned = processed
-            try:
-                f = float(cleaned)
-                if not math.isfinite(f):
-                    return None, False, f"Invalid numeric (inf/NaN): '{processed}'"
-                return f, True, ''
-            except Exception:
-                return None, False, f"Invalid numeric: '{processed}'"
-        if col_type in ('DATE','DATETIME','DATETIME2','SMALLDATETIME'):
-            if isinstance(processed, (datetime, date)):
-                return processed, True, ''
-            s = str(processed).strip()
-            date_formats = [
-                '%Y-%m-%d','%Y-%m-%d %H:%M:%S','%Y-%m-%d %H:%M:%S.%f',
-                '%d/%m/%Y','%m/%d/%Y','%Y/%m/%d',
-                '%d-%m-%Y','%m-%d-%Y','%Y%m%d',
-                '%d.%m.%Y','%m.%d.%Y',
-                '%Y-%m-%d %H:%M','%d/%m/%Y %H:%M:%S',
-                '%m/%d/%Y %H:%M:%S','%Y/%m/%d %H:%M:%S'
-            ]
-            for fmt in date_formats:
-                try:
-                    parsed = datetime.strptime(s, fmt)
-                    if col_type == 'DATE':
-                        return parsed.date(), True, ''
-                    return parsed, True, ''
-                except Exception:
-                    continue
-            return None, False, f"Invalid date format: '{processed}'"
-        return str(processed).strip(), True, ''
-    except ValueError as ve:
-        return None, False, str(ve)
-    except Exception as exc:
-        logger.exception("Conversion error for column %s: %s", column_name, exc)
-        return None, False, f"Type conversion error: {exc}"
+        if sheet_name:
+            if sheet_name not in wb.sheetnames:
+                raise ValueError(f"Worksheet named '{sheet_name}' not found")
+            ws = wb[sheet_name]
+        else:
+            ws = wb.worksheets[0]
+        for row in ws.iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+def read_rows(rows_iter, limit):
+    """Ambil maksimal `limit` baris berikutnya dari stream."""
+    return list(itertools.islice(rows_iter, limit))
+
+def rows_to_frame(rows, width=None):
+    """Bangun DataFrame (header=None) dari list baris; baris dipad/dipotong ke `width` kolom."""
+    if width is None:
+        width = max((len(r) for r in rows), default=0)
+    normalized = [tuple(r[:width]) + (None,) * (width - len(r)) for r in rows]
+    return pd.DataFrame(normalized, columns=range(width))
+
+def iter_row_chunks(rows_iter, chunk_size, leading_rows=()):
+    """Gabungkan baris yang sudah dibaca (leading_rows) dengan sisa stream, dipotong per chunk_size."""
+    chunk = list(leading_rows)
+    while len(chunk) >= chunk_size:
+        yield chunk[:chunk_size]
+        chunk = chunk[chunk_size:]
+    for row in rows_iter:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def locate_data_start(rows_iter, head_rows, header_row, detected_primary):
+    """
+    Tentukan data start row dari blok atas sheet. Blok diperluas per HEADER_SCAN_ROWS baris
+    dari stream bila data belum ditemukan (maks DATA_START_SCAN_LIMIT baris).
+    Returns (head_rows, head_df, data_start_row)
+    """
+    head_df = rows_to_frame(head_rows)
+    while True:
+        try:
+            data_start_row = find_data_start_row(head_df, header_row, detected_primary)
+            return head_rows, head_df, data_start_row
+        except ValueError:
+            more = read_rows(rows_iter, HEADER_SCAN_ROWS) if len(head_rows) < DATA_START_SCAN_LIMIT else []
+            if not more:
+                raise
+            head_rows = head_rows + more
+            head_df = rows_to_frame(head_rows)
+
+def _header_error_info(head_rows):
+    excel_headers_for_error = []
+    for row in head_rows[:10]:
+        row_data = [str(val).strip() if pd.notna(val) else "" for val in row]
+        non_empty = [v for v in row_data if v]
+        if len(non_empty) >= 2:
+            excel_headers_for_error = row_data
+            break
+    if not excel_headers_for_error and head_rows:
+        excel_headers_for_error = [str(val).strip() for val in head_rows[0]]
+    return excel_headers_for_error
+
+def _build_chunk_frame(rows, width, col_index_mapping, missing_headers, columns_info):
+    chunk_df = rows_to_frame(rows, width)
+
+    filtered_data = {}
+    for col_idx, db_header in col_index_mapping.items():
+        if col_idx < width:
+            filtered_data[db_header] = chunk_df.iloc[:, col_idx]
+
+    # Tambahkan default untuk kolom hilang
+    for missing_col in missing_headers:
+        col_info = columns_info.get(missing_col, {})
+        if col_info.get('default_value') is not None:
+            filtered_data[missing_col] = [
+                process_default_value(col_info['default_value'], col_info)
+            ] * len(chunk_df)
+        elif col_info.get('is_nullable', False):
+            filtered_data[missing_col] = [None] * len(chunk_df)
+
+    final_df = pd.DataFrame(filtered_data)
+    final_df = final_df[~row_emptiness_mask(final_df)].reset_index(drop=True)
+    return final_df
+
+def prepare_sheet_layout(file_path, sheet_name, columns_info, primary_header=None, sheet_cache=None):
+    """
+    Baca blok atas sheet, deteksi dan validasi header, lalu tentukan data start row.
+    Returns (layout, rows_iter, error_response); error_response berisi respons gagal
+    dengan format process_excel_file bila sheet tidak bisa diproses.
+    """
+    required_headers = list(columns_info.keys())
+
+    # Layout hasil analisis sebelumnya (upload session) hanya dipakai bila tidak ada pattern header khusus
+    cached = sheet_cache.layout if sheet_cache is not None and not primary_header else None
+
+    try:
+        if cached:
+            head_rows = cached['head_rows']
+            rows_iter = sheet_cache.iter_rows(len(head_rows))
+        else:
+            rows_iter = open_sheet_stream(file_path, sheet_name)
+            head_rows = read_rows(rows_iter, HEADER_SCAN_ROWS)
+    except ValueError as e:
+        if "Worksheet named" in str(e):
+            return None, None, {'success': False, 'message': f'Sheet "{sheet_name}" tidak ditemukan dalam file Excel'}
+        return None, None, {'success': False, 'message': f'Error membaca sheet: {str(e)}'}
+
+    if not head_rows:
+        return None, None, {'success': False, 'message': f'Sheet "{sheet_name}" kosong atau tidak memiliki data'}
+
+    # --- Deteksi header otomatis dan validasi struktur dari blok atas sheet ---
+    head_df = rows_to_frame(head_rows)
+    try:
+        if cached:
+            header_row, detected_primary = cached['header_row'], cached['detected_primary']
+        else:
+            header_row, detected_primary = detect_header_row(head_df, primary_header)
+        valid_headers_mapping, missing_headers = validate_header_row(head_df, header_row, required_headers)
+    except ValueError as validation_error:
+        return None, None, {
+            'success': False,
+            'message': str(validation_error),
+            'validation_type': 'column_structure',
+            'header_info': {
+                'required_headers': required_headers,
+                'excel_headers': _header_error_info(head_rows)
+            }
+        }
+
+    # --- Tentukan data mulai dari baris header ---
+    if cached:
+        data_start_row = cached['data_start_row']
+    else:
+        head_rows, head_df, data_start_row = locate_data_start(rows_iter, head_rows, header_row, detected_primary)
+
+    excel_headers = [normalize_column_name(val) for val in head_df.iloc[header_row]]
+
+    # Buat mapping index kolom
+    col_index_mapping = {}
+    for excel_header, db_header in valid_headers_mapping:
+        for idx, header in enumerate(excel_headers):
+            if header == excel_header:
+                col_index_mapping[idx] = db_header
+                break
+
+    layout = {
+        'head_rows': head_rows,
+        'header_row': header_row,
+        'detected_primary': detected_primary,
+        'data_start_row': data_start_row,
+        'width': len(head_df.columns),
+        'col_index_mapping': col_index_mapping,
+        'missing_headers': missing_headers,
+    }
+    return layout, rows_iter, None
+
+def iter_validated_chunks(layout, rows_iter, columns_info, chunk_size=None, stats=None, plan=None):
+    """
+    Validasi data sheet per chunk. Yields (validated_df, chunk_errors, default_masks); nomor baris
+    pada pesan error berlanjut antar chunk.
+    stats: dict opsional; stats['rows_read'] diisi jumlah baris mentah yang sudah dibaca.
+    plan: TablePlan (get_table_plan); bila None dikompilasi sekali dari columns_info untuk sheet ini.
+    """
+    if plan is None:
+        plan = compile_table_plan(columns_info)
+    rows_processed = 0
+    chunks = iter_row_chunks(rows_iter, chunk_size or EXCEL_CHUNK_SIZE,
+                             layout['head_rows'][layout['data_start_row']:])
+    for rows in chunks:
+        if stats is not None:
+            stats['rows_read'] = stats.get('rows_read', 0) + len(rows)
+        final_df = _build_chunk_frame(rows, layout['width'], layout['col_index_mapping'],
+                                      layout['missing_headers'], columns_info)
+        if len(final_df) == 0:
+            continue
+
+        validated_df, chunk_errors, default_masks = validate_dataframe(
+            final_df, plan, row_offset=rows_processed
+        )
+        rows_processed += len(final_df)
+        yield validated_df, chunk_errors, default_masks
+
+def validation_failure(layout, sheet_name, rows_processed, column_count, total_errors, validation_errors):
+    """Respons gagal bila tidak ada data valid atau tingkat kesalahan > 10%, selain itu None."""
+    if rows_processed == 0:
+        return {
+            'success': False,
+            'message': 'Tidak ada data valid ditemukan untuk diinsert',
+            'header_info': {
+                'header_row': layout['header_row'] + 1,
+                'data_start_row': layout['data_start_row'] + 1,
+                'detected_primary': layout['detected_primary'],
+                'missing_headers': layout['missing_headers'],
+                'sheet_used': sheet_name
+            }
+        }
+
+    # Hitung error rate
+    if total_errors:
+        error_rate = total_errors / (rows_processed * column_count)
+        if error_rate > 0.1:
+            return {
+                'success': False,
+                'message': f'Validasi data gagal. Tingkat kesalahan: {error_rate:.1%}',
+                'validation_errors': validation_errors,
+                'total_errors': total_errors,
+                'rows_processed': rows_processed
+            }
+    return None
 
 def process_excel_file(
     file_path,
@@ -373,22 +611,98 @@ def process_excel_file(
     primary_header=None,
     sheet_name=None,
     periode_date=None,
-    strict_mode=True
+    strict_mode=True,
+    sheet_cache=None,
+    progress=None
 ):
     """
     Hybrid Excel file processor:
     - strict_mode=True: perform full validation (header detection, type checking, DB insert)
+      Sheet dibaca secara streaming: header dideteksi dari blok atas, lalu data diproses
+      per EXCEL_CHUNK_SIZE baris langsung ke validasi dan bulk insert (satu transaksi).
     - strict_mode=False: lightweight validation (direct header usage, no DB insert)
+    sheet_cache: SheetCache dari upload session; bila ada, layout dan data sheet diambil dari cache
+    progress: callback opsional progress(phase, parsed_rows=..., validated_rows=..., inserted_rows=...)
     """
-    result = {"success": False, "message": "", "data": [], "errors": []}
-
     if not os.path.exists(file_path):
         return {"success": False, "message": f"File tidak ditemukan: {file_path}"}
 
+    if not strict_mode:
+        return _process_excel_file_light(file_path, table_name, primary_header, sheet_name, periode_date)
+
+    try:
+        # --- Ambil metadata kolom dari database ---
+        columns_info = get_column_info(table_name)
+        if not columns_info:
+            return {'success': False, 'message': f"Tabel '{table_name}' tidak ditemukan di database."}
+
+        if progress:
+            progress('parsing')
+        layout, rows_iter, error = prepare_sheet_layout(file_path, sheet_name, columns_info,
+                                                        primary_header, sheet_cache)
+        if error:
+            return error
+
+        period_value = periode_date or process_default_value("date")
+        rows_processed = 0
+        column_count = 0
+        total_errors = 0
+        validation_errors = []
+
+        # --- Validasi dan insert per chunk dalam satu transaksi ---
+        loader = BulkLoader(table_name, periode_date, replace_existing=True,
+                            columns_info=get_column_info(table_name, exclude_automatic=False))
+        read_stats = {}
+        with loader:
+            chunks = iter_validated_chunks(layout, rows_iter, columns_info, stats=read_stats,
+                                           plan=get_table_plan(table_name))
+            for validated_df, chunk_errors, default_masks in chunks:
+                rows_processed += len(validated_df)
+                column_count = len(validated_df.columns)
+                total_errors += len(chunk_errors)
+                if len(validation_errors) < MAX_REPORTED_ERRORS:
+                    validation_errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(validation_errors)])
+
+                # Tambahkan kolom tambahan
+                validated_df["period_date"] = period_value
+                validated_df["upload_date"] = None
+                default_masks["upload_date"] = True
+                loader.load(validated_df, default_masks)
+                if progress:
+                    progress('loading', parsed_rows=read_stats.get('rows_read', 0),
+                             validated_rows=rows_processed, inserted_rows=loader.inserted_rows)
+
+            failure = validation_failure(layout, sheet_name, rows_processed, column_count,
+                                         total_errors, validation_errors)
+            if failure:
+                loader.rollback()
+                return failure
+
+            if progress:
+                progress('committing', parsed_rows=read_stats.get('rows_read', 0),
+                         validated_rows=rows_processed, inserted_rows=loader.inserted_rows)
+            loader.commit()
+
+        logger.info(f"Berhasil insert {loader.inserted_rows} dari {rows_processed} baris ({loader.rows_per_sec} baris/detik)")
+        insert_result = loader.result()
+        insert_result["rows_processed"] = rows_processed
+        insert_result["validation_warnings"] = total_errors
+        insert_result["mode"] = "strict"
+
+        return insert_result
+
+    except Exception as e:
+        logger.exception("process_excel_file error: %s", e)
+        return {'success': False, 'message': f'Gagal memproses file Excel: {e}'}
+
+def _process_excel_file_light(file_path, table_name, primary_header=None, sheet_name=None, periode_date=None):
+    """Lightweight validation (direct header usage, no DB insert)"""
+    result = {"success": False, "message": "", "data": [], "errors": []}
+
     try:
         # --- Load Excel file ---
         try:
-            df = pd.read_excel(file_path, sheet_name=sheet_name or 0, header=None if strict_mode else 0)
+            df = pd.read_excel(file_path, sheet_name=sheet_name or 0, header=0)
         except ValueError as e:
             if "Worksheet named" in str(e):
                 return {'success': False, 'message': f'Sheet "{sheet_name}" tidak ditemukan dalam file Excel'}
@@ -403,178 +717,52 @@ def process_excel_file(
         if not columns_info:
             return {'success': False, 'message': f"Tabel '{table_name}' tidak ditemukan di database."}
 
-        required_headers = list(columns_info.keys())
-
-        # ========== STRICT MODE ==========
-        if strict_mode:
-            # --- Deteksi header otomatis dan validasi struktur ---
-            try:
-                header_row, valid_headers_mapping, missing_headers, detected_primary = find_header_row_and_validate(
-                    df, required_headers, primary_header
-                )
-            except ValueError as validation_error:
-                excel_headers_for_error = []
-                for idx in range(min(10, len(df))):
-                    row_data = [str(val).strip() if pd.notna(val) else "" for val in df.iloc[idx]]
-                    non_empty = [v for v in row_data if v]
-                    if len(non_empty) >= 2:
-                        excel_headers_for_error = row_data
-                        break
-                if not excel_headers_for_error:
-                    excel_headers_for_error = [str(val).strip() for val in df.iloc[0]]
-
-                return {
-                    'success': False,
-                    'message': str(validation_error),
-                    'validation_type': 'column_structure',
-                    'header_info': {
-                        'required_headers': required_headers,
-                        'excel_headers': excel_headers_for_error
-                    }
-                }
-
-            # --- Tentukan data mulai dari baris header ---
-            data_start_row = find_data_start_row(df, header_row, detected_primary)
-
-            excel_headers = [normalize_column_name(val) for val in df.iloc[header_row]]
-            data_df = df.iloc[data_start_row:].copy()
-            data_df.columns = range(len(data_df.columns))
-
-            # Buat mapping index kolom
-            col_index_mapping = {}
-            for excel_header, db_header in valid_headers_mapping:
-                for idx, header in enumerate(excel_headers):
-                    if header == excel_header:
-                        col_index_mapping[idx] = db_header
-                        break
+        # --- Gunakan nama kolom langsung ---
+        if primary_header and isinstance(primary_header, int):
+            df.columns = df.iloc[primary_header].tolist()
+            df = df.drop(range(primary_header + 1))
+        else:
+            df.columns = df.columns.astype(str)
 
-            # Ekstraksi data terfilter
-            filtered_data = {}
-            for col_idx, db_header in col_index_mapping.items():
-                if col_idx < len(data_df.columns):
-                    filtered_data[db_header] = data_df.iloc[:, col_idx]
-
-            # Tambahkan default untuk kolom hilang
-            for missing_col in missing_headers:
-                col_info = columns_info.get(missing_col, {})
-                if col_info.get('default_value') is not None:
-                    filtered_data[missing_col] = [
-                        process_default_value(col_info['default_value'], col_info)
-                    ] * len(data_df)
-                elif col_info.get('is_nullable', False):
-                    filtered_data[missing_col] = [None] * len(data_df)
-
-            final_df = pd.DataFrame(filtered_data)
-            final_df = final_df.dropna(how='all')
-            final_df = final_df[
-                ~final_df.astype(str).apply(lambda x: x.str.strip().eq('').all(), axis=1)
-            ].reset_index(drop=True)
-
-            if len(final_df) == 0:
-                return {
-                    'success': False,
-                    'message': 'Tidak ada data valid ditemukan untuk diinsert',
-                    'header_info': {
-                        'header_row': header_row + 1,
-                        'data_start_row': data_start_row + 1,
-                        'detected_primary': detected_primary,
-                        'missing_headers': missing_headers,
-                        'sheet_used': sheet_name
-                    }
-                }
-
-            # --- Validasi isi data ---
-            validation_errors = []
-            validated_rows = []
-
-            for idx, row in final_df.iterrows():
-                record = {}
-                for col in final_df.columns:
-                    col_info = columns_info.get(col)
-                    value = row[col]
-                    converted, is_valid, error_msg = validate_and_convert_value(value, col_info, col)
-                    if not is_valid:
-                        validation_errors.append(f"Row {idx + 1}, Column '{col}': {error_msg}")
-                        record[col] = None
-                    else:
-                        record[col] = converted
+        db_columns = columns_info
+        valid_data, error_rows = [], []
 
-                # Tambahkan kolom tambahan
-                record["period_date"] = periode_date or process_default_value("date")
-                record["upload_date"] = "__USE_DATABASE_DEFAULT__"
-                validated_rows.append(record)
-
-            # Hitung error rate
-            if validation_errors:
-                error_rate = len(validation_errors) / (len(final_df) * len(final_df.columns))
-                if error_rate > 0.1:
-                    return {
-                        'success': False,
-                        'message': f'Validasi data gagal. Tingkat kesalahan: {error_rate:.1%}',
-                        'validation_errors': validation_errors[:20],
-                        'total_errors': len(validation_errors),
-                        'rows_processed': len(final_df)
-                    }
-
-            validated_df = pd.DataFrame(validated_rows)
-
-            # Insert ke database
-            insert_result = insert_to_database(validated_df, table_name, periode_date, replace_existing=True)
-            insert_result["rows_processed"] = len(validated_df)
-            insert_result["validation_warnings"] = len(validation_errors)
-            insert_result["mode"] = "strict"
-
-            return insert_result
-
-        # ========== LIGHT MODE ==========
+        for idx, row in df.iterrows():
+            record, row_error = {}, []
+            for col_name, value in row.items():
+                col_name_db = col_name.strip()
+                col_meta = db_columns.get(col_name_db)
+                if not col_meta:
+                    continue
+                if pd.isna(value):
+                    record[col_name_db] = handle_null_values_for_column(col_name_db, None, col_meta['data_type'])
+                    continue
+
+                try:
+                    converted_value = validate_and_convert_value(value, col_meta['data_type'])
+                    record[col_name_db] = converted_value
+                except Exception as e:
+                    row_error.append(f"{col_name_db}: {e}")
+                    record[col_name_db] = None
+
+            record["period_date"] = periode_date or process_default_value("date")
+            record["upload_date"] = "__USE_DATABASE_DEFAULT__"
+
+            if row_error:
+                error_rows.append({"row": int(idx + 2), "errors": row_error})
+            valid_data.append(record)
+
+        result["data"] = valid_data
+        if error_rows:
+            result["message"] = f"Ada {len(error_rows)} baris error."
+            result["errors"] = error_rows
         else:
-            # --- Gunakan nama kolom langsung ---
-            if primary_header and isinstance(primary_header, int):
-                df.columns = df.iloc[primary_header].tolist()
-                df = df.drop(range(primary_header + 1))
-            else:
-                df.columns = df.columns.astype(str)
-
-            db_columns = columns_info
-            valid_data, error_rows = [], []
-
-            for idx, row in df.iterrows():
-                record, row_error = {}, []
-                for col_name, value in row.items():
-                    col_name_db = col_name.strip()
-                    col_meta = db_columns.get(col_name_db)
-                    if not col_meta:
-                        continue
-                    if pd.isna(value):
-                        record[col_name_db] = handle_null_values_for_column(col_name_db, None, col_meta['data_type'])
-                        continue
-
-                    try:
-                        converted_value = validate_and_convert_value(value, col_meta['data_type'])
-                        record[col_name_db] = converted_value
-                    except Exception as e:
-                        row_error.append(f"{col_name_db}: {e}")
-                        record[col_name_db] = None
-
-                record["period_date"] = periode_date or process_default_value("date")
-                record["upload_date"] = "__USE_DATABASE_DEFAULT__"
-
-                if row_error:
-                    error_rows.append({"row": int(idx + 2), "errors": row_error})
-                valid_data.append(record)
-
-            result["data"] = valid_data
-            if error_rows:
-                result["message"] = f"Ada {len(error_rows)} baris error."
-                result["errors"] = error_rows
-            else:
-                result["message"] = f"{len(valid_data)} baris berhasil divalidasi."
-                result["success"] = True
+            result["message"] = f"{len(valid_data)} baris berhasil divalidasi."
+            result["success"] = True
 
-            result["mode"] = "light"
-            return result
+        result["mode"] = "light"
+        return result
 
     except Exception as e:
         logger.exception("process_excel_file error: %s", e)
         return {'success': False, 'message': f'Gagal memproses file Excel: {e}'}
-    
\ No newline at end of file
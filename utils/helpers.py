@@ -3,6 +3,17 @@ from datetime import datetime
 
 import pandas as pd
 
+# Penanda nilai yang diisi oleh DEFAULT kolom di database (kolom tidak ikut di INSERT)
+DATABASE_DEFAULT_MARKER = '__USE_DATABASE_DEFAULT__'
+
+# Teks sel yang dianggap NULL: indikator aplikasi ('Null', 'na') ditambah default na_values
+# pandas (STR_NA_VALUES) yang dulu otomatis menjadi NaN saat sheet dibaca pd.read_excel
+NULL_TEXT_VALUES = frozenset((
+    '', 'NULL', 'null', 'Null', 'N/A', 'n/a', 'NA', 'na', '#N/A',
+    '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '1.#IND', '1.#QNAN',
+    '<NA>', 'NaN', '-NaN', 'nan', '-nan', 'None',
+))
+
 def normalize_value(value, dtype=None):
     """
     Normalisasi nilai untuk insert ke SQL Server:
@@ -12,7 +23,7 @@ def normalize_value(value, dtype=None):
     PERBAIKAN: Handle database default marker
     """
     # PERBAIKAN: Handle database default marker - return as-is tanpa processing
-    if str(value) == '__USE_DATABASE_DEFAULT__':
+    if isinstance(value, str) and value == DATABASE_DEFAULT_MARKER:
         return value
     
     if pd.isna(value):
@@ -140,13 +151,10 @@ def handle_null_values_for_column(value, column_info):
     Improved version with better type handling and default value processing
     """
     # Check if value is considered "null" in various formats
-    null_indicators = [None, '', 'NULL', 'null', 'Null', 'N/A', 'n/a', 'NA', 'na', '#N/A']
-    
     # Handle pandas NaN and empty strings more thoroughly
-    is_null = (value in null_indicators or 
+    is_null = (value is None or
                (isinstance(value, float) and pd.isna(value)) or
-               (isinstance(value, str) and value.strip() in [''] + null_indicators) or
-               value is None)
+               (isinstance(value, str) and value.strip() in NULL_TEXT_VALUES))
     
     if is_null:
         if column_info.get('is_nullable', False):
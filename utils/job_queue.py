@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Lokasi file SQLite antrean job (persisten antar restart aplikasi)
+JOB_QUEUE_DB = os.getenv('JOB_QUEUE_DB', os.path.join('logs', 'jobs.sqlite3'))
+# Jumlah worker thread yang mengeksekusi job
+JOB_QUEUE_WORKERS = int(os.getenv('JOB_QUEUE_WORKERS', 2))
+# Interval polling antrean bila tidak ada notifikasi job baru (detik)
+JOB_QUEUE_POLL_INTERVAL = float(os.getenv('JOB_QUEUE_POLL_INTERVAL', 2))
+# Interval minimal penulisan progress ke SQLite per job (detik)
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', 0.5))
+# Job selesai yang lebih tua dari ini (hari) dihapus saat worker start
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))
+# Job yang sudah dimulai sebanyak ini dan terputus lagi (aplikasi mati) ditandai failed, tidak diulang
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    phase TEXT,
+    payload TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    created_by TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    checkpoints TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at);
+"""
+
+_handlers = {}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default) if value is not None else None
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else None
+
+def register_job_handler(kind, handler):
+    """Daftarkan handler(payload, progress) untuk jenis job; nilai return disimpan sebagai result."""
+    _handlers[kind] = handler
+
+
+class JobProgress:
+    """
+    Callback progress untuk handler: progress(phase, **counters). Penulisan ke SQLite di-throttle.
+    Handler juga mencatat langkah yang sudah selesai lewat checkpoint(step, value); saat job
+    diulang setelah restart, completed(step) mengembalikan nilai tersebut agar langkah yang
+    sudah commit (insert data, catatan MasterUploader) tidak dijalankan dua kali.
+    """
+
+    def __init__(self, queue, job_id, checkpoints=None):
+        self.queue = queue
+        self.job_id = job_id
+        self.phase = None
+        self.counters = {}
+        self.checkpoints = dict(checkpoints or {})
+        self._last_write = 0.0
+
+    def completed(self, step):
+        """Nilai checkpoint langkah dari attempt sebelumnya, atau None bila belum selesai."""
+        return self.checkpoints.get(step)
+
+    def checkpoint(self, step, value=True):
+        """Catat langkah selesai; langsung ditulis (tidak di-throttle)."""
+        self.checkpoints[step] = value
+        self.queue._update(self.job_id, checkpoints=_dumps(self.checkpoints))
+
+    def __call__(self, phase=None, **counters):
+        changed_phase = phase is not None and phase != self.phase
+        if phase is not None:
+            self.phase = phase
+        self.counters.update(counters)
+        now = time.monotonic()
+        if changed_phase or now - self._last_write >= JOB_PROGRESS_INTERVAL:
+            self._last_write = now
+            self.queue._update(self.job_id, phase=self.phase, progress=_dumps(self.counters))
+
+
+class JobQueue:
+    """
+    Antrean job persisten berbasis SQLite dengan worker thread di proses aplikasi.
+    Job yang masih berstatus running saat aplikasi mati dikembalikan ke antrean saat start.
+    """
+
+    def __init__(self, db_path=JOB_QUEUE_DB, workers=JOB_QUEUE_WORKERS):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)").fetchall()}
+        if 'checkpoints' not in columns:
+            # Database antrean dari versi sebelumnya
+            conn.execute("ALTER TABLE jobs ADD COLUMN checkpoints TEXT")
+        conn.commit()
+
+    def _conn(self):
+        # Satu koneksi SQLite per thread; autocommit dikelola manual
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Producer / reader
+    # ------------------------------------------------------------------
+    def enqueue(self, kind, payload, created_by=None):
+        if kind not in _handlers:
+            raise ValueError(f"Handler job '{kind}' belum terdaftar")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, status, phase, payload, created_by, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, STATUS_QUEUED, STATUS_QUEUED, _dumps(payload), created_by, now, now)
+        )
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        position = None
+        if row['status'] == STATUS_QUEUED:
+            position = self._conn().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at <= ?",
+                (STATUS_QUEUED, row['created_at'])
+            ).fetchone()[0]
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'phase': row['phase'],
+            'progress': json.loads(row['progress']) if row['progress'] else {},
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_by': row['created_by'],
+            'queue_position': position,
+            'created_at': _iso(row['created_at']),
+            'started_at': _iso(row['started_at']),
+            'updated_at': _iso(row['updated_at']),
+            'finished_at': _iso(row['finished_at']),
+        }
+
+    def stats(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {row[0]: row[1] for row in rows}
+        counts['workers'] = len([t for t in self._threads if t.is_alive()])
+        return counts
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        try:
+            self._conn().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        except sqlite3.Error as e:
+            logger.warning(f"Gagal update job {job_id}: {e}")
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            self._recover()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.shutdown)
+            logger.info(f"Job queue aktif: {self.workers} worker, db={self.db_path}")
+
+    def shutdown(self):
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _recover(self):
+        """
+        Kembalikan job running (aplikasi mati di tengah proses) ke antrean dan bersihkan job lama.
+        Job yang sudah mencapai JOB_MAX_ATTEMPTS ditandai failed (mis. job yang membuat proses crash).
+        """
+        conn = self._conn()
+        now = time.time()
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, phase = ?, error = ?, updated_at = ?, finished_at = ? "
+            "WHERE status = ? AND attempts >= ?",
+            (STATUS_FAILED, 'done', f"Job terputus {JOB_MAX_ATTEMPTS} kali, tidak diulang lagi",
+             now, now, STATUS_RUNNING, JOB_MAX_ATTEMPTS)
+        )
+        if cursor.rowcount:
+            logger.warning(f"{cursor.rowcount} job terputus melebihi batas attempt, ditandai failed")
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, phase = ?, updated_at = ? WHERE status = ?",
+            (STATUS_QUEUED, STATUS_QUEUED, now, STATUS_RUNNING)
+        )
+        if cursor.rowcount:
+            logger.warning(f"{cursor.rowcount} job yang terputus dikembalikan ke antrean")
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (STATUS_SUCCEEDED, STATUS_FAILED, time.time() - JOB_RETENTION_DAYS * 86400)
+        )
+
+    def _claim(self):
+        """Ambil job queued tertua secara atomik (BEGIN IMMEDIATE mengunci penulis lain)."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, checkpoints FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (STATUS_QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, phase = ?, attempts = attempts + 1, started_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (STATUS_RUNNING, 'starting', now, now, row['id'])
+            )
+            conn.execute('COMMIT')
+            checkpoints = json.loads(row['checkpoints']) if row['checkpoints'] else {}
+            return row['id'], row['kind'], json.loads(row['payload']), checkpoints
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                logger.warning(f"Gagal mengambil job dari antrean: {e}")
+                claimed = None
+
+            if claimed is None:
+                with self._wakeup:
+                    self._wakeup.wait(JOB_QUEUE_POLL_INTERVAL)
+                continue
+
+            self._execute(*claimed)
+
+    def _execute(self, job_id, kind, payload, checkpoints=None):
+        handler = _handlers.get(kind)
+        progress = JobProgress(self, job_id, checkpoints)
+        if checkpoints:
+            logger.info(f"Job {job_id} ({kind}) dilanjutkan, langkah selesai: {', '.join(checkpoints)}")
+        started = time.monotonic()
+        try:
+            if handler is None:
+                raise ValueError(f"Handler job '{kind}' tidak ditemukan")
+            result = handler(payload, progress)
+            status = STATUS_SUCCEEDED
+            if isinstance(result, dict) and result.get('success') is False:
+                status = STATUS_FAILED
+            self._update(job_id, status=status, phase='done', progress=_dumps(progress.counters),
+                         result=_dumps(result), finished_at=time.time())
+            logger.info(f"Job {job_id} ({kind}) {status} dalam {time.monotonic() - started:.1f} detik")
+        except Exception as e:
+            logger.exception("Job %s (%s) gagal: %s", job_id, kind, e)
+            self._update(job_id, status=STATUS_FAILED, phase='done', progress=_dumps(progress.counters),
+                         error=str(e), finished_at=time.time())
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+def init_job_queue():
+    """Start worker saat aplikasi start agar job yang tertunda dari proses sebelumnya dilanjutkan."""
+    try:
+        get_job_queue().start()
+    except Exception as e:
+        logger.warning(f"Job queue gagal dijalankan: {e}")
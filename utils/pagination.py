@@ -0,0 +1,80 @@
+import os
+import json
+import base64
+import hashlib
+from datetime import date, datetime
+
+from utils.cache import TTLCache
+
+COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 300))
+
+_count_cache = TTLCache(COUNT_CACHE_TTL, max_entries=1000)
+
+
+def month_range(value):
+    """'YYYY-MM' -> (awal bulan, awal bulan berikutnya) untuk predikat range [start, end)."""
+    start = datetime.strptime(value, '%Y-%m').date()
+    if start.month == 12:
+        end = date(start.year + 1, 1, 1)
+    else:
+        end = date(start.year, start.month + 1, 1)
+    return start, end
+
+def date_filter(column, value):
+    """
+    Predikat filter tanggal yang sargable (index pada kolom tetap terpakai).
+    'YYYY-MM' menjadi range [awal bulan, awal bulan berikutnya), selain itu perbandingan langsung.
+    Returns (klausa SQL tanpa WHERE, params)
+    """
+    if not value:
+        return '', []
+    if len(value) == 7:
+        start, end = month_range(value)
+        return f"{column} >= ? AND {column} < ?", [start, end]
+    return f"{column} = ?", [value]
+
+def filter_signature(*parts):
+    """Sidik filter untuk key cache count dan pengikat cursor ke filter yang sama."""
+    raw = json.dumps(parts, default=str, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return {'v': value}
+
+def _decode_value(item):
+    if 'dt' in item:
+        return datetime.fromisoformat(item['dt'])
+    if 'd' in item:
+        return date.fromisoformat(item['d'])
+    return item['v']
+
+def encode_cursor(values, signature):
+    """Token cursor opaque (base64 JSON) dari nilai key baris terakhir."""
+    payload = {'k': [_encode_value(v) for v in values], 's': signature}
+    raw = json.dumps(payload, default=str, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token, signature):
+    """Kembalikan nilai key dari token. ValueError bila token rusak atau dibuat untuk filter lain."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(item) for item in payload['k']]
+    except Exception:
+        raise ValueError('Cursor tidak valid')
+    if payload.get('s') != signature:
+        raise ValueError('Cursor tidak sesuai dengan filter yang digunakan')
+    return values
+
+def cached_count(cursor, key, count_query, params):
+    """COUNT(*) dengan cache per filter (TTL COUNT_CACHE_TTL detik)."""
+    total = _count_cache.get(key)
+    if total is None:
+        cursor.execute(count_query, params)
+        total = cursor.fetchone()[0]
+        _count_cache.set(key, total)
+    return total
@@ -0,0 +1,259 @@
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+from config.config import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+PERIOD_STATS_TABLE = 'SSOT_TEMPLATE_PERIOD_STATS'
+# Batas jumlah parameter IN (...) per query (SQL Server maks 2100 parameter)
+_IN_CHUNK = 500
+
+_state_lock = threading.Lock()
+_ddl_lock = threading.Lock()
+_table_ready = False
+# Template yang statistiknya sudah dipastikan ada (di-backfill/di-refresh) di proses ini
+_known_templates = set()
+# Template yang refresh statistiknya gagal; dibaca langsung dari tabel sampai di-backfill ulang
+_dirty_templates = set()
+
+
+def _key(table_name):
+    return table_name.lower()
+
+def _chunks(items, size=_IN_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    if len(value) == 7:
+        value += '-01'
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+def ensure_stats_table(cursor=None):
+    """
+    Buat SSOT_TEMPLATE_PERIOD_STATS bila belum ada (sekali per proses). DDL dijalankan di
+    koneksi dan transaksi tersendiri lalu di-commit, sehingga rollback transaksi pemanggil
+    (upload / backfill) tidak ikut membatalkan pembuatan tabel; flag baru diset setelah commit.
+    """
+    global _table_ready
+    if _table_ready:
+        return
+    with _ddl_lock:
+        if _table_ready:
+            return
+        conn = get_db_connection()
+        ddl_cursor = None
+        try:
+            ddl_cursor = conn.cursor()
+            ddl_cursor.execute(f"""
+                IF OBJECT_ID('dbo.{PERIOD_STATS_TABLE}', 'U') IS NULL
+                BEGIN
+                    CREATE TABLE dbo.{PERIOD_STATS_TABLE} (
+                        template NVARCHAR(128) NOT NULL,
+                        period_date DATE NULL,
+                        row_count BIGINT NOT NULL,
+                        last_upload_date DATETIME NULL,
+                        checksum INT NULL,
+                        refreshed_at DATETIME NOT NULL DEFAULT GETDATE()
+                    );
+                    CREATE UNIQUE CLUSTERED INDEX UX_{PERIOD_STATS_TABLE}
+                        ON dbo.{PERIOD_STATS_TABLE} (template, period_date);
+                END
+            """)
+            conn.commit()
+            _table_ready = True
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            if ddl_cursor: ddl_cursor.close()
+            conn.close()
+
+def _has_upload_date(cursor, table_name):
+    cursor.execute("""
+        SELECT COUNT(*) FROM sys.columns
+        WHERE object_id = OBJECT_ID(?) AND name = 'upload_date'
+    """, (f"dbo.[{table_name}]",))
+    return cursor.fetchone()[0] > 0
+
+def refresh_period_stats(cursor, table_name, period_date=None):
+    """
+    Hitung ulang statistik template dari tabel sumber, untuk satu periode atau semua periode.
+    Dijalankan di transaksi pemanggil (tidak commit sendiri).
+    """
+    ensure_stats_table(cursor)
+    last_upload = 'MAX(upload_date)' if _has_upload_date(cursor, table_name) else 'NULL'
+    select_sql = f"""
+        INSERT INTO {PERIOD_STATS_TABLE} (template, period_date, row_count, last_upload_date, checksum)
+        SELECT ?, CAST(period_date AS DATE), COUNT_BIG(*), {last_upload}, CHECKSUM_AGG(BINARY_CHECKSUM(*))
+        FROM [{table_name}]
+    """
+
+    if period_date is not None:
+        day = _as_date(period_date)
+        cursor.execute(f"DELETE FROM {PERIOD_STATS_TABLE} WHERE template = ? AND period_date = ?", (table_name, day))
+        cursor.execute(
+            select_sql + " WHERE period_date >= ? AND period_date < ? GROUP BY CAST(period_date AS DATE)",
+            (table_name, day, day + timedelta(days=1))
+        )
+    else:
+        cursor.execute(f"DELETE FROM {PERIOD_STATS_TABLE} WHERE template = ?", (table_name,))
+        cursor.execute(select_sql + " GROUP BY CAST(period_date AS DATE)", (table_name,))
+
+def refresh_period_stats_safely(cursor, table_name, period_date=None):
+    """
+    Refresh statistik di dalam transaksi upload memakai savepoint. Bila gagal, hanya perubahan
+    statistik yang dibatalkan dan template ditandai dirty (dibaca langsung sampai di-backfill).
+    """
+    try:
+        cursor.execute("SAVE TRANSACTION ssot_period_stats")
+        ensure_stats_table(cursor)
+        if period_date is not None and _key(table_name) not in _known_templates:
+            # Baris statistik pertama sebuah template selalu dari refresh penuh, sehingga
+            # template yang sudah punya baris statistik dianggap lengkap untuk periode lain
+            cursor.execute(f"SELECT TOP 1 1 FROM {PERIOD_STATS_TABLE} WHERE template = ?", (table_name,))
+            if cursor.fetchone() is None:
+                period_date = None
+        refresh_period_stats(cursor, table_name, period_date)
+        with _state_lock:
+            _dirty_templates.discard(_key(table_name))
+            _known_templates.add(_key(table_name))
+        return True
+    except Exception as e:
+        logger.warning(f"Gagal refresh {PERIOD_STATS_TABLE} untuk {table_name}: {e}")
+        try:
+            cursor.execute("ROLLBACK TRANSACTION ssot_period_stats")
+        except Exception:
+            pass
+        with _state_lock:
+            _dirty_templates.add(_key(table_name))
+            _known_templates.discard(_key(table_name))
+        return False
+
+def delete_period_stats(cursor, table_name):
+    """Hapus statistik template (dipanggil di transaksi delete_table)."""
+    global _table_ready
+    if _key(table_name) == _key(PERIOD_STATS_TABLE):
+        _table_ready = False
+        return
+    ensure_stats_table(cursor)
+    cursor.execute(f"DELETE FROM {PERIOD_STATS_TABLE} WHERE template = ?", (table_name,))
+    with _state_lock:
+        _known_templates.discard(_key(table_name))
+        _dirty_templates.discard(_key(table_name))
+
+def _ensure_backfilled(cursor, table_names):
+    """
+    Backfill lazy: template yang belum punya baris statistik dihitung sekali dari tabel sumber.
+    Returns set template yang tidak bisa dilayani dari tabel statistik.
+    """
+    with _state_lock:
+        pending = [t for t in table_names if _key(t) not in _known_templates or _key(t) in _dirty_templates]
+    if not pending:
+        return set()
+
+    present = set()
+    try:
+        ensure_stats_table(cursor)
+        for chunk in _chunks(pending):
+            placeholders = ', '.join(['?'] * len(chunk))
+            cursor.execute(
+                f"SELECT DISTINCT template FROM {PERIOD_STATS_TABLE} WHERE template IN ({placeholders})",
+                chunk
+            )
+            present.update(_key(row[0]) for row in cursor.fetchall())
+    except Exception as e:
+        logger.warning(f"{PERIOD_STATS_TABLE} tidak bisa dibaca, data dihitung langsung: {e}")
+        return set(table_names)
+
+    unavailable = set()
+    for table_name in pending:
+        key = _key(table_name)
+        if key in present and key not in _dirty_templates:
+            with _state_lock:
+                _known_templates.add(key)
+            continue
+        try:
+            refresh_period_stats(cursor, table_name)
+            cursor.connection.commit()
+            with _state_lock:
+                _known_templates.add(key)
+                _dirty_templates.discard(key)
+            logger.info(f"Backfill {PERIOD_STATS_TABLE} untuk {table_name} selesai")
+        except Exception as e:
+            logger.warning(f"Backfill {PERIOD_STATS_TABLE} untuk {table_name} gagal: {e}")
+            try:
+                cursor.connection.rollback()
+            except Exception:
+                pass
+            unavailable.add(table_name)
+    return unavailable
+
+def get_recent_period_counts(cursor, table_name, limit=5):
+    """Jumlah baris per period_date (terbaru dulu). Returns list (period_date, row_count) atau None."""
+    if _ensure_backfilled(cursor, [table_name]):
+        return None
+    cursor.execute(f"""
+        SELECT TOP {int(limit)} period_date, row_count
+        FROM {PERIOD_STATS_TABLE}
+        WHERE template = ?
+        ORDER BY period_date DESC
+    """, (table_name,))
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+
+def get_period_counts(cursor, table_names, period_date):
+    """
+    Jumlah baris untuk satu periode bagi banyak template (point lookup ke tabel statistik).
+    Returns (dict {template: row_count}, set template yang harus dihitung langsung).
+    """
+    table_names = list(table_names)
+    unavailable = _ensure_backfilled(cursor, table_names)
+    served = [t for t in table_names if t not in unavailable]
+    by_key = {_key(t): t for t in served}
+    day = _as_date(period_date)
+
+    counts = {t: 0 for t in served}
+    for chunk in _chunks(served):
+        placeholders = ', '.join(['?'] * len(chunk))
+        cursor.execute(f"""
+            SELECT template, SUM(row_count)
+            FROM {PERIOD_STATS_TABLE}
+            WHERE period_date = ? AND template IN ({placeholders})
+            GROUP BY template
+        """, [day] + chunk)
+        for template, row_count in cursor.fetchall():
+            name = by_key.get(_key(template))
+            if name is not None:
+                counts[name] = int(row_count or 0)
+    return counts, unavailable
+
+def get_latest_period(cursor, table_names):
+    """
+    MAX(period_date) dari tabel statistik. Returns (date atau None, set template yang harus dihitung langsung).
+    """
+    table_names = list(table_names)
+    unavailable = _ensure_backfilled(cursor, table_names)
+    served = [t for t in table_names if t not in unavailable]
+
+    latest = None
+    for chunk in _chunks(served):
+        placeholders = ', '.join(['?'] * len(chunk))
+        cursor.execute(f"""
+            SELECT MAX(period_date)
+            FROM {PERIOD_STATS_TABLE}
+            WHERE row_count > 0 AND template IN ({placeholders})
+        """, chunk)
+        row = cursor.fetchone()
+        if row and row[0] and (latest is None or row[0] > latest):
+            latest = row[0]
+    return latest, unavailable
@@ -0,0 +1,137 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Interval minimal (detik) antar pengecekan perubahan tabel master reference rate
+REFERENCE_RATE_CHECK_INTERVAL = int(os.getenv('REFERENCE_RATE_CHECK_INTERVAL', 60))
+
+_SIGNATURE_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM MasterInterestReferenceRateKonven),
+        (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM MasterInterestReferenceRateKonven),
+        (SELECT COUNT(*) FROM MasterInterestReferenceRateSyariah),
+        (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM MasterInterestReferenceRateSyariah)
+"""
+
+
+def _despaced(value):
+    """Setara REPLACE(value, ' ', '') dengan collation case-insensitive."""
+    return value.replace(' ', '').upper()
+
+def _padded(value):
+    """Setara perbandingan '=' SQL Server: spasi di akhir diabaikan, case-insensitive."""
+    return value.rstrip(' ').upper()
+
+
+class ReferenceRateMapping:
+    """
+    Snapshot mapping reference rate (immutable setelah dibuat).
+    Konven : cocok bila REPLACE(rate) = REPLACE(k.interest_reference_rate)
+             atau rate = k.interest_reference_rate_group
+    Syariah: cocok bila REPLACE(rate) = REPLACE(s.interest_reference_rate_group)
+             atau rate = s.interest_reference_rate_group
+    """
+
+    def __init__(self, konven_rows, syariah_rows, signature=None):
+        self.signature = signature
+        self._konven_by_rate = {}
+        self._konven_by_group = {}
+        for rate, group, ssot in konven_rows:
+            entry = (rate, group, ssot)
+            if rate is not None:
+                self._konven_by_rate.setdefault(_despaced(rate), entry)
+            if group is not None:
+                self._konven_by_group.setdefault(_padded(group), entry)
+
+        self._syariah = {}
+        for group, ssot in syariah_rows:
+            if group is not None:
+                self._syariah.setdefault(_despaced(group), (group, ssot))
+
+        self._resolved = {}
+
+    def _konven(self, rate):
+        if rate is None:
+            return None
+        return self._konven_by_rate.get(_despaced(rate)) or self._konven_by_group.get(_padded(rate))
+
+    def resolve(self, is_syariah, rate):
+        """
+        Hitung (Interest_Reference_Rate_Group, Interest_Reference_Rate_SSOT) dengan semantik
+        CASE pada query monthly data sebelumnya.
+        """
+        key = (is_syariah, rate)
+        result = self._resolved.get(key)
+        if result is not None:
+            return result
+
+        flag = _padded(is_syariah) if isinstance(is_syariah, str) else None
+        rate_text = rate if rate is None or isinstance(rate, str) else str(rate)
+
+        if flag == 'N':
+            match = self._konven(rate_text)
+            k_rate, k_group, k_ssot = match if match else (None, None, None)
+            group = 'FIXED' if k_rate is None else k_group
+            ssot = 'FIXED' if k_ssot is None else k_ssot
+        elif flag == 'Y':
+            match = self._syariah.get(_despaced(rate_text)) if rate_text is not None else None
+            s_group, s_ssot = match if match else (None, None)
+            group = s_group
+            ssot = s_ssot if s_ssot is not None else (s_group if s_group is not None else rate)
+        else:
+            group = None
+            ssot = None
+
+        if group is None:
+            group = rate
+        result = (group, ssot)
+        if len(self._resolved) < 100000:
+            self._resolved[key] = result
+        return result
+
+
+_mapping = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+def _load(cursor, signature):
+    cursor.execute("""
+        SELECT interest_reference_rate, interest_reference_rate_group, interest_reference_rate_ssot
+        FROM MasterInterestReferenceRateKonven
+    """)
+    konven_rows = [tuple(row) for row in cursor.fetchall()]
+    cursor.execute("""
+        SELECT interest_reference_rate_group, interest_reference_rate_ssot
+        FROM MasterInterestReferenceRateSyariah
+    """)
+    syariah_rows = [tuple(row) for row in cursor.fetchall()]
+    logger.info(f"Mapping reference rate dimuat: {len(konven_rows)} konven, {len(syariah_rows)} syariah")
+    return ReferenceRateMapping(konven_rows, syariah_rows, signature)
+
+def get_reference_rate_mapping(cursor):
+    """
+    Mapping reference rate in-process. Perubahan tabel master dicek lewat signature
+    COUNT/CHECKSUM_AGG paling sering sekali per REFERENCE_RATE_CHECK_INTERVAL detik.
+    Harus dipanggil sebelum query utama dieksekusi pada cursor yang sama.
+    """
+    global _mapping, _last_check
+    now = time.monotonic()
+    if _mapping is not None and now - _last_check < REFERENCE_RATE_CHECK_INTERVAL:
+        return _mapping
+
+    with _lock:
+        if _mapping is not None and time.monotonic() - _last_check < REFERENCE_RATE_CHECK_INTERVAL:
+            return _mapping
+        cursor.execute(_SIGNATURE_QUERY)
+        signature = tuple(cursor.fetchone())
+        if _mapping is None or _mapping.signature != signature:
+            _mapping = _load(cursor, signature)
+        _last_check = time.monotonic()
+        return _mapping
+
+def invalidate_reference_rate_mapping():
+    global _last_check
+    _last_check = 0.0
@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import threading
+from types import MappingProxyType
+
+from config.config import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Interval (detik) polling sys.tables.modify_date untuk mendeteksi perubahan schema di luar aplikasi
+SCHEMA_CACHE_POLL_INTERVAL = int(os.getenv('SCHEMA_CACHE_POLL_INTERVAL', 30))
+
+_lock = threading.Lock()
+_entries = {}          # nama tabel (lower) -> (dict kolom -> MappingProxyType, modify_date)
+_schema_version = 0
+_last_poll = 0.0
+
+
+def schema_version():
+    """Nomor versi schema; naik setiap ada tabel yang di-invalidate."""
+    _poll_modify_dates()
+    return _schema_version
+
+def invalidate_table(table_name=None):
+    """Buang cache metadata satu tabel (atau semua bila table_name None)."""
+    global _schema_version
+    with _lock:
+        if table_name is None:
+            _entries.clear()
+        else:
+            _entries.pop(table_name.lower(), None)
+        _schema_version += 1
+
+def _poll_modify_dates():
+    """Bandingkan sys.tables.modify_date dengan cache, paling sering sekali per interval."""
+    global _last_poll, _schema_version
+    if time.monotonic() - _last_poll < SCHEMA_CACHE_POLL_INTERVAL:
+        return
+    _last_poll = time.monotonic()
+    if not _entries:
+        return
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.name, t.modify_date
+            FROM sys.tables t
+            JOIN sys.schemas s ON s.schema_id = t.schema_id
+            WHERE s.name = 'dbo'
+        """)
+        current = {row[0].lower(): row[1] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.warning(f"Polling schema gagal: {e}")
+        return
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+    with _lock:
+        stale = [name for name, (_, modified) in _entries.items() if current.get(name) != modified]
+        for name in stale:
+            _entries.pop(name, None)
+        if stale:
+            _schema_version += 1
+            logger.info(f"Schema cache invalidated: {', '.join(stale)}")
+
+def _fetch_columns(table_name):
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        query = """
+        SELECT
+            c.COLUMN_NAME,
+            c.DATA_TYPE,
+            c.CHARACTER_MAXIMUM_LENGTH,
+            c.NUMERIC_PRECISION,
+            c.NUMERIC_SCALE,
+            c.IS_NULLABLE,
+            c.COLUMN_DEFAULT
+        FROM INFORMATION_SCHEMA.COLUMNS c
+        WHERE c.TABLE_NAME = ? AND c.TABLE_SCHEMA = 'dbo'
+        ORDER BY c.ORDINAL_POSITION
+        """
+
+        cursor.execute(query, (table_name,))
+        columns = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT t.modify_date
+            FROM sys.tables t
+            JOIN sys.schemas s ON s.schema_id = t.schema_id
+            WHERE t.name = ? AND s.name = 'dbo'
+        """, (table_name,))
+        row = cursor.fetchone()
+        modify_date = row[0] if row else None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+    descriptors = {}
+    for col in columns:
+        descriptors[col[0]] = MappingProxyType({
+            'name': col[0],
+            'data_type': col[1],
+            'max_length': col[2],
+            'precision': col[3],
+            'scale': col[4],
+            'is_nullable': col[5] == 'YES',
+            'default_value': col[6]
+        })
+    return descriptors, modify_date
+
+def get_table_columns(table_name):
+    """
+    Metadata kolom tabel (urut ORDINAL_POSITION) dari cache proses.
+    Dict luar selalu baru per pemanggilan; deskriptor kolom (MappingProxyType) dipakai bersama
+    dan tidak bisa diubah. Tabel yang tidak ditemukan tidak di-cache.
+    """
+    _poll_modify_dates()
+    key = table_name.lower()
+    entry = _entries.get(key)
+    if entry is None:
+        version = _schema_version
+        descriptors, modify_date = _fetch_columns(table_name)
+        if not descriptors:
+            return {}
+        entry = (descriptors, modify_date)
+        with _lock:
+            # Jangan simpan hasil yang mungkin basi bila ada invalidasi selama fetch
+            if version == _schema_version:
+                entry = _entries.setdefault(key, entry)
+    return dict(entry[0])
+
+def get_numeric_columns(table_name, data_types=('numeric',)):
+    """Nama kolom dengan DATA_TYPE tertentu (default 'numeric'), dari cache schema."""
+    types = {t.lower() for t in data_types}
+    return {name for name, info in get_table_columns(table_name).items()
+            if (info['data_type'] or '').lower() in types}
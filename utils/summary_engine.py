@@ -0,0 +1,118 @@
+import logging
+from datetime import date, datetime, timedelta
+
+from utils.period_stats import get_latest_period, get_period_counts
+
+logger = logging.getLogger(__name__)
+
+# Jumlah tabel per statement UNION ALL
+SUMMARY_UNION_CHUNK = 100
+
+
+def _chunks(items, size=SUMMARY_UNION_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def to_period_day(value):
+    """Konversi 'YYYY-MM-DD' / 'YYYY-MM' / date / datetime menjadi date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    if len(value) == 7:
+        value += '-01'
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+def get_template_catalog(cursor, table_names):
+    """
+    Cek keberadaan tabel template dalam satu query katalog.
+    Returns dict {nama template: True bila tabel punya kolom PERIOD_DATE, False bila tidak}
+    hanya untuk tabel yang ada di schema dbo.
+    """
+    cursor.execute("""
+        SELECT t.name, MAX(CASE WHEN c.name IS NOT NULL THEN 1 ELSE 0 END)
+        FROM sys.tables t
+        JOIN sys.schemas s ON s.schema_id = t.schema_id
+        LEFT JOIN sys.columns c ON c.object_id = t.object_id AND c.name = 'PERIOD_DATE'
+        WHERE s.name = 'dbo'
+        GROUP BY t.name
+    """)
+    existing = {row[0].lower(): bool(row[1]) for row in cursor.fetchall()}
+
+    catalog = {}
+    for name in table_names:
+        has_period = existing.get(name.lower())
+        if has_period is not None:
+            catalog[name] = has_period
+    return catalog
+
+def _union_scalar(cursor, tables, select_template, params_per_table, combine):
+    """
+    Jalankan satu statement UNION ALL per chunk tabel. Bila satu chunk gagal (mis. tabel
+    bermasalah), chunk itu diulang per tabel agar tabel lain tetap terhitung.
+    select_template diformat dengan idx dan table; hasil dikembalikan {table: value}.
+    """
+    results = {}
+    for chunk in _chunks(tables):
+        parts = [select_template.format(idx=i, table=t) for i, t in enumerate(chunk)]
+        params = [p for _ in chunk for p in params_per_table]
+        try:
+            cursor.execute(' UNION ALL '.join(parts), params)
+            for idx, value in cursor.fetchall():
+                results[chunk[idx]] = value
+        except Exception as e:
+            logger.warning(f"Query gabungan summary gagal ({e}), fallback per tabel")
+            for t in chunk:
+                try:
+                    cursor.execute(select_template.format(idx=0, table=t), list(params_per_table))
+                    row = cursor.fetchone()
+                    results[t] = row[1] if row else None
+                except Exception as table_error:
+                    logger.warning(f"Error checking template {t}: {str(table_error)}")
+    return {t: combine(v) for t, v in results.items()}
+
+def _live_latest_period_date(cursor, tables):
+    """MAX(PERIOD_DATE) langsung dari tabel sumber, dihitung dengan UNION ALL per chunk."""
+    maxima = _union_scalar(
+        cursor, list(tables),
+        "SELECT {idx}, MAX(CAST(PERIOD_DATE AS DATE)) FROM [{table}] WHERE PERIOD_DATE IS NOT NULL",
+        (), lambda v: v
+    )
+    values = [v for v in maxima.values() if v]
+    return max(values) if values else None
+
+def _live_counts_for_period(cursor, tables, day):
+    """
+    COUNT(*) langsung dari tabel sumber. Predikat range [hari, hari+1) menggantikan
+    CAST(PERIOD_DATE AS DATE) = ? agar index pada PERIOD_DATE bisa dipakai.
+    """
+    return _union_scalar(
+        cursor, list(tables),
+        "SELECT {idx}, COUNT(*) FROM [{table}] WHERE PERIOD_DATE >= ? AND PERIOD_DATE < ?",
+        (day, day + timedelta(days=1)), lambda v: v or 0
+    )
+
+def get_latest_period_date(cursor, tables):
+    """
+    Periode terbaru dari semua tabel. Dibaca dari SSOT_TEMPLATE_PERIOD_STATS; tabel yang
+    statistiknya belum tersedia dihitung langsung dengan UNION ALL.
+    """
+    if not tables:
+        return None
+    latest, unavailable = get_latest_period(cursor, tables)
+    if unavailable:
+        live = _live_latest_period_date(cursor, sorted(unavailable))
+        if live and (latest is None or live > latest):
+            latest = live
+    return latest
+
+def count_rows_for_period(cursor, tables, period_day):
+    """Jumlah baris per tabel untuk satu hari periode (statistik dulu, fallback hitung langsung)."""
+    if not tables:
+        return {}
+    day = to_period_day(period_day)
+    counts, unavailable = get_period_counts(cursor, tables, day)
+    if unavailable:
+        counts.update(_live_counts_for_period(cursor, sorted(unavailable), day))
+    return counts
@@ -0,0 +1,300 @@
+import os
+import shutil
+import hashlib
+import logging
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from werkzeug.utils import secure_filename
+
+from utils.cache import TTLCache
+from utils.file_utils import allowed_file
+from utils.excel_utils import (
+    HEADER_SCAN_ROWS, find_primary_header_row, get_excel_sheets,
+    locate_data_start, open_sheet_stream, read_rows, rows_to_frame
+)
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 1800))
+UPLOAD_SESSION_MAX_ENTRIES = int(os.getenv('UPLOAD_SESSION_MAX_ENTRIES', 50))
+# Sheet dengan sel lebih banyak dari ini tidak disimpan kolomnya (hanya layout)
+UPLOAD_CACHE_MAX_CELLS = int(os.getenv('UPLOAD_CACHE_MAX_CELLS', 2000000))
+# Batas total sel cache kolumnar untuk semua session di proses ini; bila terlampaui, cache
+# kolom sheet yang paling lama tidak dipakai dibuang (layout tetap, data dibaca ulang dari file)
+UPLOAD_CACHE_TOTAL_CELLS = int(os.getenv('UPLOAD_CACHE_TOTAL_CELLS', 6000000))
+
+# SheetCache yang memegang cache kolumnar, urutan LRU: id(cache) -> cache
+_column_caches = OrderedDict()
+_column_cells = 0
+_budget_lock = threading.Lock()
+
+
+def _register_columns(cache):
+    """Catat cache kolumnar baru ke budget proses lalu buang cache paling lama bila melebihi budget."""
+    global _column_cells
+    with _budget_lock:
+        _column_caches[id(cache)] = cache
+        _column_cells += cache.cached_cells
+        while _column_cells > UPLOAD_CACHE_TOTAL_CELLS and len(_column_caches) > 1:
+            _, oldest = _column_caches.popitem(last=False)
+            _column_cells -= oldest.cached_cells
+            logger.info(f"Budget cache upload terlampaui, cache kolom sheet '{oldest.sheet_name}' dibuang")
+            oldest.columns = None
+            oldest.cached_cells = 0
+
+def _touch_columns(cache):
+    with _budget_lock:
+        if id(cache) in _column_caches:
+            _column_caches.move_to_end(id(cache))
+
+def _release_columns(cache):
+    global _column_cells
+    with _budget_lock:
+        if _column_caches.pop(id(cache), None) is not None:
+            _column_cells -= cache.cached_cells
+        cache.columns = None
+        cache.cached_cells = 0
+
+
+class SheetCache:
+    """
+    Hasil parse satu sheet: layout header (header row, data start row, primary header)
+    dan cache kolumnar isi sheet. Dipakai ulang oleh /analyze-excel dan /upload.
+    """
+
+    def __init__(self, file_path, sheet_name):
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.layout = None
+        self.layout_error = None
+        self.total_rows = 0
+        self.total_columns = 0
+        self.columns = None
+        self.cached_cells = 0
+
+    def iter_rows(self, start=0):
+        """Iterator baris mulai dari index `start`; dari cache kolumnar bila ada, jika tidak dari file."""
+        columns = self.columns
+        if columns is not None:
+            _touch_columns(self)
+            return itertools.islice(zip(*columns), start, None)
+        return itertools.islice(open_sheet_stream(self.file_path, self.sheet_name), start, None)
+
+    def header_values(self):
+        row = list(self.layout['head_rows'][self.layout['header_row']])
+        row += [None] * (self.total_columns - len(row))
+        return row[:self.total_columns]
+
+    def analysis(self):
+        """Ringkasan struktur sheet dengan format respons /analyze-excel."""
+        layout = self.layout
+        data_start_row = layout['data_start_row']
+        excel_headers = [str(val).strip() if pd.notna(val) else "" for val in self.header_values()]
+
+        sample_data = []
+        for row in itertools.islice(self.iter_rows(data_start_row), 3):
+            row_sample = []
+            for j in range(min(len(excel_headers), self.total_columns)):
+                val = row[j] if j < len(row) else None
+                row_sample.append(str(val) if pd.notna(val) else "")
+            sample_data.append(row_sample)
+
+        return {
+            'total_rows': self.total_rows - data_start_row,
+            'total_columns': self.total_columns,
+            'header_row': layout['header_row'] + 1,
+            'data_start_row': data_start_row + 1,
+            'detected_primary_header': layout['detected_primary'],
+            'headers': excel_headers,
+            'sample_data': sample_data,
+            'data_rows_available': self.total_rows - data_start_row,
+        }
+
+
+def _row_extent(row):
+    """Jumlah kolom sampai sel terakhir yang tidak kosong (0 bila baris kosong)."""
+    for i in range(len(row) - 1, -1, -1):
+        if row[i] is not None and not (isinstance(row[i], str) and row[i] == ''):
+            return i + 1
+    return 0
+
+def build_sheet_cache(file_path, sheet_name, max_cells=UPLOAD_CACHE_MAX_CELLS):
+    """
+    Parse sheet sekali: deteksi layout dari blok atas lalu stream sisa baris ke cache kolumnar.
+    Cache kolumnar ikut dihitung ke budget proses (UPLOAD_CACHE_TOTAL_CELLS).
+    """
+    max_cells = min(max_cells, UPLOAD_CACHE_TOTAL_CELLS)
+    cache = SheetCache(file_path, sheet_name)
+    rows_iter = open_sheet_stream(file_path, sheet_name)
+    head_rows = read_rows(rows_iter, HEADER_SCAN_ROWS)
+    if not head_rows:
+        cache.layout_error = 'Sheet kosong atau tidak memiliki data'
+        return cache
+
+    try:
+        header_row, detected_primary = find_primary_header_row(rows_to_frame(head_rows))
+        head_rows, _, data_start_row = locate_data_start(rows_iter, head_rows, header_row, detected_primary)
+        cache.layout = {
+            'head_rows': head_rows,
+            'header_row': header_row,
+            'detected_primary': detected_primary,
+            'data_start_row': data_start_row,
+        }
+    except ValueError as e:
+        cache.layout_error = str(e)
+
+    columns = []
+    stored_cells = 0
+    row_count = 0
+    last_non_empty = -1
+    width = 0
+
+    for row in itertools.chain(head_rows, rows_iter):
+        extent = _row_extent(row)
+        if extent:
+            last_non_empty = row_count
+            width = max(width, extent)
+
+        if columns is not None:
+            if len(row) > len(columns):
+                columns.extend([None] * row_count for _ in range(len(row) - len(columns)))
+            for j, col in enumerate(columns):
+                col.append(row[j] if j < len(row) else None)
+            stored_cells += len(columns)
+            if stored_cells > max_cells:
+                logger.info(f"Sheet '{sheet_name}' terlalu besar untuk cache kolumnar, hanya layout yang disimpan")
+                columns = None
+        row_count += 1
+
+    cache.total_rows = last_non_empty + 1
+    cache.total_columns = width
+    if columns is not None:
+        cache.columns = [col[:cache.total_rows] for col in columns[:width]]
+        cache.cached_cells = cache.total_rows * width
+        _register_columns(cache)
+    return cache
+
+
+class UploadSession:
+    """File upload yang disimpan sekali, dikunci oleh hash konten (sha256)."""
+
+    def __init__(self, token, file_path, filename, size):
+        self.token = token
+        self.file_path = file_path
+        self.filename = filename
+        self.size = size
+        self.sheets = []
+        self.created_at = time.time()
+        self._sheet_caches = {}
+        self._lock = threading.Lock()
+
+    def resolve_sheet(self, sheet_name=None):
+        if sheet_name:
+            return sheet_name
+        return self.sheets[0] if self.sheets else None
+
+    def cached_sheet(self, sheet_name=None):
+        """SheetCache yang sudah ada (tanpa parse ulang), atau None."""
+        return self._sheet_caches.get(self.resolve_sheet(sheet_name))
+
+    def sheet(self, sheet_name=None):
+        """SheetCache untuk sheet; parse hanya dilakukan sekali per sheet per session."""
+        name = self.resolve_sheet(sheet_name)
+        with self._lock:
+            cache = self._sheet_caches.get(name)
+            if cache is None:
+                cache = build_sheet_cache(self.file_path, name)
+                self._sheet_caches[name] = cache
+            return cache
+
+
+def _remove_session_file(token, upload_session):
+    for cache in list(upload_session._sheet_caches.values()):
+        _release_columns(cache)
+    try:
+        os.remove(upload_session.file_path)
+    except OSError:
+        pass
+
+_sessions = TTLCache(UPLOAD_SESSION_TTL, max_entries=UPLOAD_SESSION_MAX_ENTRIES, on_evict=_remove_session_file)
+_register_lock = threading.Lock()
+
+def _content_hash(stream):
+    digest = hashlib.sha256()
+    stream.seek(0)
+    size = 0
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+def register_upload(file_storage, upload_folder):
+    """
+    Simpan file upload sekali per konten. Upload ulang file yang sama (dari /get-excel-sheets,
+    /analyze-excel, /upload) mengembalikan session yang sama beserta hasil parse sebelumnya.
+    """
+    token, size = _content_hash(file_storage.stream)
+
+    with _register_lock:
+        upload_session = _sessions.get(token, touch=True)
+        if upload_session is not None and os.path.exists(upload_session.file_path):
+            logger.info(f"Upload session cache hit: {token[:12]}")
+            return upload_session
+
+        os.makedirs(upload_folder, exist_ok=True)
+        filename = secure_filename(file_storage.filename)
+        file_path = os.path.join(upload_folder, f"session_{token[:16]}_{filename}")
+        file_storage.save(file_path)
+
+        sheets = get_excel_sheets(file_path)
+        if sheets is None:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            raise ValueError('Gagal membaca daftar sheet dari file Excel')
+
+        upload_session = UploadSession(token, file_path, filename, size)
+        upload_session.sheets = sheets
+        _sessions.set(token, upload_session)
+        return upload_session
+
+def get_upload_session(token):
+    return _sessions.get(token, touch=True) if token else None
+
+def promote_upload(upload_session, dest_path):
+    """Salin file session ke lokasi permanen (hard link bila memungkinkan, tanpa parse ulang)."""
+    os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+    try:
+        os.link(upload_session.file_path, dest_path)
+    except OSError:
+        shutil.copyfile(upload_session.file_path, dest_path)
+    return dest_path
+
+def upload_session_from_request(req, upload_folder):
+    """
+    Ambil upload session dari request: pakai `upload_token` dari request sebelumnya bila masih
+    berlaku, jika tidak simpan file baru. Mengembalikan (upload_session, pesan error).
+    """
+    token = req.form.get('upload_token', '').strip()
+    upload_session = get_upload_session(token)
+    if upload_session is not None and os.path.exists(upload_session.file_path):
+        return upload_session, None
+
+    if 'file' not in req.files:
+        if token:
+            return None, 'Sesi upload sudah kedaluwarsa, silakan pilih file kembali'
+        return None, 'Tidak ada file yang dipilih'
+
+    file = req.files['file']
+    if file.filename == '':
+        return None, 'Tidak ada file yang dipilih'
+    if not allowed_file(file.filename):
+        return None, 'File harus berformat Excel (.xlsx atau .xls)'
+
+    return register_upload(file, upload_folder), None
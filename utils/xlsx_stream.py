@@ -0,0 +1,220 @@
+import os
+import math
+import re
+import zipfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import get_column_letter
+
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', 5000))
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Index style di styles.xml (cellXfs)
+STYLE_DEFAULT = 0
+STYLE_NUMBER_COMMA = 1   # '#,##0.00' (builtin numFmtId 4, sama dengan FORMAT_NUMBER_COMMA_SEPARATED1)
+STYLE_DATE = 2           # 'yyyy-mm-dd'
+STYLE_DATETIME = 3       # 'yyyy-mm-dd h:mm:ss'
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd h:mm:ss"/>'
+    '</numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+class _StreamBuffer:
+    """File-like write-only (tidak seekable) untuk zipfile; isi diambil per chunk lewat drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _text(value):
+    return escape(_ILLEGAL_XML_CHARS.sub('', value))
+
+def _cell_xml(ref, value, numeric_style):
+    """XML satu sel (kosong untuk None / NaN)."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        if isinstance(value, float) and not math.isfinite(value):
+            return ''
+        style = f' s="{numeric_style}"' if numeric_style else ''
+        return f'<c r="{ref}"{style}><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        serial = (value.replace(tzinfo=None) - _EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c r="{ref}" s="{STYLE_DATETIME}"><v>{serial!r}</v></c>'
+    if isinstance(value, date):
+        return f'<c r="{ref}" s="{STYLE_DATE}"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    if isinstance(value, time):
+        value = value.isoformat()
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{_text(str(value))}</t></is></c>'
+
+def estimate_column_widths(columns, sample_rows, max_width=50):
+    """Lebar kolom dari header dan sampel baris (bukan seluruh data): min(panjang maks + 2, max_width)."""
+    widths = []
+    for idx, col_name in enumerate(columns):
+        max_len = len(str(col_name))
+        for row in sample_rows:
+            val = row[idx]
+            if val:
+                max_len = max(max_len, len(str(val)))
+        widths.append(min(max_len + 2, max_width))
+    return widths
+
+def stream_xlsx(columns, row_batches, sheet_title='Sheet1', numeric_columns=(),
+                width_sample_rows=1000, max_width=50, zip64=False):
+    """
+    Generator file .xlsx (satu sheet) dalam potongan bytes, memori konstan terhadap jumlah baris.
+
+    Args:
+        columns: nama kolom (baris header)
+        row_batches: iterable batch baris (mis. hasil cursor.fetchmany berulang)
+        numeric_columns: nama kolom yang diberi format angka '#,##0.00'
+        width_sample_rows: jumlah baris awal yang dipakai untuk estimasi lebar kolom
+        zip64: aktifkan ZIP64 untuk sheet yang XML-nya bisa melebihi 2 GB
+    """
+    buffer = _StreamBuffer()
+    refs = [get_column_letter(i) for i in range(1, len(columns) + 1)]
+    styles = [STYLE_NUMBER_COMMA if col in numeric_columns else STYLE_DEFAULT for col in columns]
+
+    # Lebar kolom harus ditulis sebelum <sheetData>, jadi ambil sampel dari batch awal
+    batches = iter(row_batches)
+    sample = []
+    pending_batches = []
+    for batch in batches:
+        pending_batches.append(batch)
+        sample.extend(batch[:width_sample_rows - len(sample)])
+        if len(sample) >= width_sample_rows:
+            break
+    widths = estimate_column_widths(columns, sample, max_width)
+    del sample
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _ROOT_RELS)
+        zf.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{_text(sheet_title[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        zf.writestr('xl/styles.xml', _STYLES)
+        yield buffer.drain()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=zip64) as sheet:
+            cols_xml = ''.join(
+                f'<col min="{i}" max="{i}" width="{w}" customWidth="1"/>'
+                for i, w in enumerate(widths, start=1)
+            )
+            header_xml = ''.join(
+                f'<c r="{ref}1" t="inlineStr"><is><t>{_text(str(col))}</t></is></c>'
+                for ref, col in zip(refs, columns)
+            )
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<cols>{cols_xml}</cols><sheetData><row r="1">{header_xml}</row>'
+            ).encode('utf-8'))
+
+            row_number = 1
+            for batch in _chain_batches(pending_batches, batches):
+                parts = []
+                for row in batch:
+                    row_number += 1
+                    cells = ''.join(
+                        _cell_xml(f'{refs[i]}{row_number}', value, styles[i])
+                        for i, value in enumerate(row)
+                    )
+                    parts.append(f'<row r="{row_number}">{cells}</row>')
+                sheet.write(''.join(parts).encode('utf-8'))
+                yield buffer.drain()
+
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+def _chain_batches(first, rest):
+    while first:
+        yield first.pop(0)
+    yield from rest
+
+def iter_cursor_batches(cursor, size, transform=None):
+    """Ambil hasil query per batch dengan fetchmany; transform(row) opsional per baris."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield [transform(row) for row in rows] if transform else rows